@@ -0,0 +1,159 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+bench.parser_bench
+~~~~~~~~~~~~~~~~~
+
+Microbenchmark of the request framing: the incremental
+:class:`RequestParser <daemon.parser.RequestParser>` against the previous read
+loop of ``HttpAdapter.read_request`` (``bytes`` concatenation, a new search for
+the end of the header block after every ``recv``, a decode and a line split of
+the head, the body decoded to ``str``), reproduced here as :func:`old_read`.
+
+Both read the same keep-alive stream of identical requests, cut in
+``RECV_SIZE`` chunks as a socket would hand them out, and decode every body
+(route handlers read ``req.body``).
+
+Usage Example:
+--------------
+$ python bench/parser_bench.py
+$ python bench/parser_bench.py --body-size 0 65536 1048576 --requests 20000
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daemon.parser import RequestParser
+
+#: Bytes handed out by each recv of the simulated socket.
+RECV_SIZE = 4096
+
+#: Browser-like head, about 600 bytes.
+HEAD = (
+    "POST /submit-info HTTP/1.1\r\n"
+    "Host: app1.local\r\n"
+    "User-Agent: Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/128.0\r\n"
+    "Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n"
+    "Accept-Language: en-US,en;q=0.5\r\n"
+    "Accept-Encoding: gzip, deflate, br\r\n"
+    "Content-Type: application/json\r\n"
+    "Content-Length: {}\r\n"
+    "Origin: http://app1.local\r\n"
+    "Connection: keep-alive\r\n"
+    "Referer: http://app1.local/submit-info\r\n"
+    "Cookie: auth=true; session=abcdef0123456789\r\n"
+    "\r\n"
+)
+
+class Stream:
+    """A keep-alive connection carrying ``count`` times the same request."""
+
+    def __init__(self, request, count):
+        self.chunks = [request[i:i + RECV_SIZE] for i in range(0, len(request), RECV_SIZE)]
+        self.total = len(self.chunks) * count
+        self.i = 0
+
+    def recv(self, size):
+        if self.i >= self.total:
+            return b""
+        chunk = self.chunks[self.i % len(self.chunks)]
+        self.i += 1
+        return chunk
+
+def old_read(conn, buf):
+    """
+    The read loop before :mod:`daemon.parser`.
+
+    :rtype tuple: (remaining bytes, headers, body), body None at the end.
+    """
+    while b"\r\n\r\n" not in buf:
+        chunk = conn.recv(RECV_SIZE)
+        if not chunk:
+            return b"", None, None
+        buf += chunk
+    header_end = buf.find(b"\r\n\r\n")
+    text = buf[:header_end + 4].decode("utf-8", errors="replace")
+    method, path, version = text.splitlines()[0].split()
+    headers = {}
+    for line in text.split("\r\n")[1:]:
+        if ": " in line:
+            key, val = line.split(": ", 1)
+            headers[key.lower()] = val
+    body_end = header_end + 4 + int(headers.get("content-length", 0))
+    while len(buf) < body_end:
+        chunk = conn.recv(RECV_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+    body = buf[header_end + 4:body_end].decode("utf-8", errors="replace")
+    return buf[body_end:], headers, body
+
+def new_read(conn, parser):
+    """
+    The read loop over :class:`RequestParser <daemon.parser.RequestParser>`.
+
+    :rtype tuple: (head, body), body None at the end.
+    """
+    head = parser.parse_head()
+    while head is None:
+        chunk = conn.recv(RECV_SIZE)
+        if not chunk:
+            return None, None
+        parser.feed(chunk)
+        head = parser.parse_head()
+    while not parser.body_complete():
+        chunk = conn.recv(RECV_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+    body = str(parser.take_body(), "utf-8", "replace")
+    return head, body
+
+def run_old(request, count):
+    conn, buf = Stream(request, count), b""
+    start = time.perf_counter()
+    for _ in range(count):
+        buf, headers, body = old_read(conn, buf)
+    return count / (time.perf_counter() - start)
+
+def run_new(request, count):
+    conn, parser = Stream(request, count), RequestParser()
+    start = time.perf_counter()
+    for _ in range(count):
+        head, body = new_read(conn, parser)
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Request framing microbenchmark")
+    parser.add_argument("--body-size", type=int, nargs="+", default=[64, 65536, 1048576],
+                        help="Body sizes to measure, in bytes.")
+    parser.add_argument("--requests", type=int, default=30000,
+                        help="Requests per run, scaled down for large bodies.")
+    args = parser.parse_args()
+
+    print("{:>10} {:>10} {:>14} {:>14} {:>8}".format("body", "requests", "old req/s", "new req/s", "ratio"))
+    for size in args.body_size:
+        request = HEAD.format(size).encode("ascii") + b"x" * size
+        # Keep each run to about 128 MiB of input
+        count = max(10, min(args.requests, 128 * 1024 ** 2 // len(request)))
+        old = run_old(request, count)
+        new = run_new(request, count)
+        print("{:>10} {:>10} {:>14.0f} {:>14.0f} {:>7.1f}x".format(size, count, old, new, new / old))
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,246 @@ import http.client
 import json
 import time
 import os
+import queue
+import selectors
+import struct
+import itertools
+import math
+import random
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+# Thoi gian cho toi da giua hai su kien cua /watch-list (tracker gui heartbeat moi 15s)
+WATCH_TIMEOUT = 40
+# Thoi gian cho truoc khi ket noi lai /watch-list
+WATCH_RETRY = 3
+# Tracker tra cac ma nay cho /watch-list (chay --mode pool, ban cu):
+# khong theo doi nua, danh ba lay qua /get-list
+WATCH_UNSUPPORTED = (404, 405, 501)
+# Chu ky gui /heartbeat toi cac tracker (tracker xoa peer sau 90s khong heartbeat)
+HEARTBEAT_INTERVAL = 30
+# So thread gui tin song song khi broadcast / gui kenh
+FANOUT_WORKERS = 32
+# Thoi gian toi da de ket noi / gui tin toi mot peer
+CONNECT_TIMEOUT = 2
+SEND_TIMEOUT = 2
+# Giao thuc P2P: moi ket noi bat dau bang PEER_MAGIC, sau do la cac frame
+# [do dai payload: 4 byte][loai: 1 byte][id tin: 8 byte][payload].
+# FRAME_ACK voi id N xac nhan moi tin co id <= N tren ket noi (ack tich luy).
+PEER_MAGIC = b"\x89P2P"
+FRAME_HEADER = struct.Struct("!IBQ")
+FRAME_MSG = 1
+FRAME_ACK = 2
+# Tin broadcast chuyen tiep qua overlay gossip, payload la JSON
+# {"id", "ttl", "origin", "via", "channel", "text"}
+FRAME_RELAY = 3
+# Payload lon nhat cua mot frame, lon hon thi dong ket noi
+MAX_FRAME = 1024 * 1024
+# Kich thuoc moi lan doc socket P2P
+RECV_SIZE = 64 * 1024
+# Ket noi gui khong dung trong LINK_IDLE giay thi dong
+LINK_IDLE = 60
+# Hang doi ket noi P2P cho accept (listen backlog)
+LISTEN_BACKLOG = 128
+# So tin P2P da nhan cho hien thi; day thi ngung doc (va ngung ack) cho toi khi co cho
+INBOX_SIZE = 1024
+# Overlay gossip: moi peer chuyen tiep tin cho GOSSIP_FANOUT peer ngau nhien
+# cua kenh, qua toi da log_fanout(N) + GOSSIP_EXTRA_HOPS buoc
+GOSSIP_FANOUT = 6
+GOSSIP_EXTRA_HOPS = 3
+# So id tin da nhan duoc nho de bo tin trung
+SEEN_SIZE = 4096
+# Thoi gian toi da cho mot request toi tracker
+TRACKER_TIMEOUT = 3
+# Danh ba cua kenh khong theo doi duoc (/watch-list) duoc dung lai trong LIST_TTL giay
+LIST_TTL = 10
+
+def encode_frame(kind, msg_id, payload=b""):
+    return FRAME_HEADER.pack(len(payload), kind, msg_id) + payload
+
+def decode_frames(buffer):
+    """
+    Tach cac frame day du o dau buffer.
+    Tra ve (danh sach (loai, id, payload), so byte da dung).
+    Frame lon hon MAX_FRAME: ValueError.
+    """
+    frames = []
+    pos = 0
+    while len(buffer) - pos >= FRAME_HEADER.size:
+        length, kind, msg_id = FRAME_HEADER.unpack_from(buffer, pos)
+        if length > MAX_FRAME:
+            raise ValueError(f"frame {length} byte vuot qua gioi han {MAX_FRAME}")
+        end = pos + FRAME_HEADER.size + length
+        if len(buffer) < end:
+            break
+        frames.append((kind, msg_id, bytes(buffer[pos + FRAME_HEADER.size:end])))
+        pos = end
+    return frames, pos
+
+class PeerLink:
+    """
+    Ket noi giu lai toi mot peer. Nhieu tin duoc gui noi tiep tren cung ket noi
+    (khong cho ack cua tin truoc), cac frame dang cho duoc gop vao mot lan
+    sendall. Ack cua peer duoc doc boi vong lap selectors cua
+    ChatClient.start_server, hoac boi thread read_acks khi client khong lang
+    nghe. Chi ben doc ack dong socket: close() chi shutdown, ben doc thay EOF.
+    """
+    def __init__(self, address):
+        self.address = address
+        self.sock = socket.create_connection(address, timeout=CONNECT_TIMEOUT)
+        try:
+            self.sock.settimeout(SEND_TIMEOUT)
+            self.sock.sendall(PEER_MAGIC)
+        except OSError:
+            self.sock.close()
+            raise
+        # self.lock bao ve outbox, flushing, pending, closed va last_used
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.outbox = bytearray()
+        self.flushing = False
+        # id tin -> Future, theo thu tu id
+        self.pending = {}
+        self.closed = False
+        self.last_used = time.monotonic()
+        # Byte ack da nhan chua du frame
+        self.inbuf = bytearray()
+
+    def send(self, payload, kind=FRAME_MSG):
+        """
+        Dua mot tin vao hang gui. Tra ve Future hoan thanh khi peer ack,
+        hoac loi ConnectionError khi ket noi dong truoc do.
+        """
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise ConnectionError(f"ket noi toi {self.address[0]}:{self.address[1]} da dong")
+            msg_id = next(self.ids)
+            self.pending[msg_id] = future
+            self.outbox += encode_frame(kind, msg_id, payload)
+            self.last_used = time.monotonic()
+            if self.flushing:
+                # Thread dang gui se gui luon frame nay
+                return future
+            self.flushing = True
+        self.flush()
+        return future
+
+    def flush(self):
+        while True:
+            with self.lock:
+                data = bytes(self.outbox)
+                self.outbox.clear()
+                if not data or self.closed:
+                    self.flushing = False
+                    return
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                self.close(e)
+                return
+
+    def on_readable(self):
+        """
+        Doc mot lan tu socket va xu ly cac ack.
+        Tra ve False khi ket noi da dong, ben goi dong socket.
+        """
+        try:
+            chunk = self.sock.recv(RECV_SIZE)
+        except socket.timeout:
+            return not self.closed
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError as e:
+            self.close(e)
+            return False
+        if not chunk:
+            self.close("peer da dong ket noi")
+            return False
+        self.inbuf += chunk
+        try:
+            frames, used = decode_frames(self.inbuf)
+        except ValueError as e:
+            self.close(e)
+            return False
+        del self.inbuf[:used]
+        for kind, msg_id, _ in frames:
+            if kind == FRAME_ACK:
+                self.acked(msg_id)
+        return True
+
+    def read_acks(self):
+        """Doc ack tren thread rieng, khi khong co vong lap selectors."""
+        while self.on_readable():
+            if self.idle(time.monotonic()):
+                self.close("khong dung qua lau")
+        self.sock.close()
+
+    def acked(self, last_id):
+        done = []
+        with self.lock:
+            for msg_id in list(self.pending):
+                if msg_id > last_id:
+                    break
+                done.append(self.pending.pop(msg_id))
+        for future in done:
+            future.set_result(None)
+
+    def idle(self, now):
+        """Khong con tin cho ack va khong gui gi trong LINK_IDLE giay."""
+        with self.lock:
+            return not self.pending and not self.flushing and now - self.last_used >= LINK_IDLE
+
+    def close(self, error=None):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            pending = list(self.pending.values())
+            self.pending.clear()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        for future in pending:
+            future.set_exception(ConnectionError(str(error) if error else "ket noi da dong"))
+
+class InboundPeer:
+    """Trang thai mot ket noi P2P den trong vong lap selectors."""
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        # Byte da nhan chua tach thanh tin
+        self.buffer = bytearray()
+        # True: ket noi dung frame, False: ban cu (tin ket thuc bang "\n"), None: chua biet
+        self.framed = None
+        # Tin da tach nhung chua vao inbox (inbox day): (loai, id hoac None, payload)
+        self.frames = []
+        # Ack chua gui het
+        self.outbox = bytearray()
+        self.eof = False
+        self.paused = False
+        self.events = 0
 
 class ChatClient:
-    def __init__(self, username, client_port):
+    def __init__(self, username, client_port, overlay="direct", fanout=GOSSIP_FANOUT,
+                 backlog=LISTEN_BACKLOG, inbox_size=INBOX_SIZE):
         self.username = username
         self.client_port = client_port
+        self.backlog = backlog
+        # Tin P2P nhan duoc, (addr, loai frame, payload), hien thi boi thread display_loop
+        self.inbox = queue.Queue(maxsize=inbox_size)
+        # Socket danh thuc vong lap selectors khi inbox co cho cho ket noi dang ngung
+        self.wakeup = socket.socketpair()
+        self.listener_paused = False
+        # Ket noi gui (PeerLink) moi, cho vong lap selectors doc ack
+        self.new_links = queue.SimpleQueue()
+        self.listening = False
+        # "direct": gui broadcast / tin kenh toi tung peer,
+        # "gossip": chi gui toi fanout peer, cac peer chuyen tiep cho nhau
+        self.overlay = overlay
+        self.fanout = fanout
         
         # --- THAY DOI ---
         # self.peer_list se luu tru du lieu kieu long (nested)
@@ -18,6 +253,28 @@ class ChatClient:
         #           "127.0.0.1:8002": {"David": {...}} }
         self.peer_list = {} 
         self.channels = {}
+        # Danh ba duoc cap nhat lien tuc boi cac thread watch_channel,
+        # self.lock bao ve self.peer_list va self.synced
+        self.lock = threading.Lock()
+        # Cac kenh co danh ba dang dong bo voi tracker (qua /watch-list)
+        self.synced = set()
+        self.watchers = {}
+        # Version danh ba cua moi kenh, gui lai trong /get-list?since= va If-None-Match
+        self.list_versions = {}
+        # Gui tin P2P: pool thread gui song song va cac ket noi giu lai theo dia chi
+        # peer, (ip, port) -> [PeerLink, lock].
+        self.executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS)
+        self.peer_sockets = {}
+        self.sockets_lock = threading.Lock()
+        # Ket noi HTTP keep-alive toi moi tracker, location -> [HTTPConnection, lock]
+        self.tracker_conns = {}
+        # Thoi diem lay danh ba cua moi kenh qua /get-list (time.monotonic)
+        self.list_fetched = {}
+        # Id cac tin gossip da nhan, cu nhat truoc (bao ve boi self.lock)
+        self.seen_messages = OrderedDict()
+        # Dinh danh tracker cua moi kenh (truong "tracker" cua /get-list), dung
+        # trong tin gossip thay cho dia chi ma moi peer dung de goi tracker
+        self.tracker_ids = {}
         
         self.channel_file = f"{username}_channels.json" 
         
@@ -52,98 +309,725 @@ class ChatClient:
         except Exception as e:
             print(f"[Client] Loi khi luu file channel: {e}")
 
+    #
+    # --- GOI TRACKER (keep-alive, song song) ---
+    #
+    def tracker_request(self, location, info, method, path, payload=None, headers=None):
+        """
+        Gui mot request toi tracker qua ket noi HTTP giu lai (keep-alive) cua kenh.
+        Ket noi cu bi tracker dong thi thu lai mot lan voi ket noi moi.
+        Tra ve (status, body).
+        """
+        with self.sockets_lock:
+            entry = self.tracker_conns.get(location)
+            if entry is None:
+                entry = [None, threading.Lock()]
+                self.tracker_conns[location] = entry
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-type"] = "application/json"
+        with entry[1]:
+            for attempt in range(2):
+                fresh = entry[0] is None
+                if fresh:
+                    entry[0] = http.client.HTTPConnection(info['ip'], info['port'], timeout=TRACKER_TIMEOUT)
+                try:
+                    entry[0].request(method, path, body, headers)
+                    response = entry[0].getresponse()
+                    data = response.read()
+                    if response.will_close:
+                        entry[0].close()
+                        entry[0] = None
+                    return response.status, data
+                except (http.client.HTTPException, OSError) as e:
+                    entry[0].close()
+                    entry[0] = None
+                    # Tracker cham (timeout) thi khong thu lai, chi ket noi cu da bi dong
+                    if fresh or attempt == 1 or isinstance(e, socket.timeout):
+                        raise
+
+    def drop_tracker(self, location):
+        """Dong ket noi keep-alive va quen thoi diem lay danh ba, dinh danh cua mot kenh da roi."""
+        with self.sockets_lock:
+            entry = self.tracker_conns.pop(location, None)
+        if entry is not None and entry[0] is not None:
+            entry[0].close()
+        with self.lock:
+            self.list_fetched.pop(location, None)
+            self.tracker_ids.pop(location, None)
+
+    def for_each_tracker(self, action, locations=None):
+        """
+        Chay action(location, info) cho moi kenh song song, thoi gian cho bang
+        tracker cham nhat thay vi tong cac tracker.
+        """
+        channels = [(location, self.channels[location]) for location in (locations or list(self.channels))
+                    if location in self.channels]
+        futures = [self.executor.submit(action, location, info) for location, info in channels]
+        wait(futures)
+
     def register_with_all_trackers(self):
         print("[Client] Dang ky voi tat ca cac kenh...")
         if not self.channels:
             print("[Client] Ban chua tham gia kenh nao. Dung lenh: /join <ip:port>")
             return
+        self.for_each_tracker(self.register_with_tracker)
+
+    def register_with_tracker(self, location, info):
         payload = {"username": self.username, "ip": self.client_ip, "port": self.client_port}
-        headers = {"Content-type": "application/json"}
-        for location, info in self.channels.items():
-            try:
-                conn = http.client.HTTPConnection(info['ip'], info['port'], timeout=3)
-                conn.request("POST", "/submit-info", json.dumps(payload).encode('utf-8'), headers)
-                response = conn.getresponse()
-                if response.status == 200:
-                    print(f"[Client] Dang ky thanh cong voi kenh: {location}")
-                else:
-                    print(f"[Client] Loi dang ky voi {location}: {response.status} {response.reason}")
-                conn.close()
-            except Exception as e:
-                print(f"[Client] Khong the ket noi duoc kenh {location}: {e}")
+        try:
+            status, _ = self.tracker_request(location, info, "POST", "/submit-info", payload)
+            if status == 200:
+                print(f"[Client] Dang ky thanh cong voi kenh: {location}")
+            else:
+                print(f"[Client] Loi dang ky voi {location}: {status}")
+        except Exception as e:
+            print(f"[Client] Khong the ket noi duoc kenh {location}: {e}")
+
+    def heartbeat_loop(self):
+        """
+        Gui /heartbeat toi moi tracker sau moi HEARTBEAT_INTERVAL giay.
+        Tracker da xoa minh (het TTL, tracker khoi dong lai) tra 400: dang ky lai.
+        """
+        while self.running:
+            time.sleep(HEARTBEAT_INTERVAL)
+            self.for_each_tracker(self.send_heartbeat)
+
+    def send_heartbeat(self, location, info):
+        try:
+            status, _ = self.tracker_request(location, info, "POST", "/heartbeat",
+                                             {"username": self.username})
+            if status == 400:
+                self.register_with_tracker(location, info)
+        except Exception:
+            # Tracker tam thoi khong truy cap duoc, thu lai o chu ky sau
+            pass
 
     def logout_from_all_trackers(self):
         print(f"[Client] Dang thong bao thoat cho tat ca cac kenh...")
-        payload = {"username": self.username}
-        headers = {"Content-type": "application/json"}
-        for location, info in self.channels.items():
-            try:
-                conn = http.client.HTTPConnection(info['ip'], info['port'], timeout=3)
-                conn.request("POST", "/logout", json.dumps(payload).encode('utf-8'), headers)
-                response = conn.getresponse()
-                if response.status == 200:
-                    print(f"[Client] Da logout khoi kenh {location}")
-                else:
-                    print(f"[Client] Loi khi logout khoi {location}: {response.status} {response.reason}")
-                conn.close()
-            except Exception as e:
-                print(f"[Client] Khong the ket noi tracker {location} de logout: {e}")
+        self.for_each_tracker(self.logout_from_tracker)
+
+    def logout_from_tracker(self, location, info):
+        try:
+            status, _ = self.tracker_request(location, info, "POST", "/logout",
+                                             {"username": self.username})
+            if status == 200:
+                print(f"[Client] Da logout khoi kenh {location}")
+            else:
+                print(f"[Client] Loi khi logout khoi {location}: {status}")
+        except Exception as e:
+            print(f"[Client] Khong the ket noi tracker {location} de logout: {e}")
 
     #
     # --- HAM GET_PEER_LIST (DA CAP NHAT) ---
     #
     def get_peer_list(self):
         """
-        Lay danh sach peer tu TAT CA cac kenh va luu tru theo cau truc long (nested)
+        Tra ve ban sao danh ba theo cau truc long (nested).
+        Cac kenh dang duoc theo doi qua /watch-list da co danh ba moi nhat.
+        Cac kenh khac duoc hoi song song qua /get-list, tru khi kenh da duoc hoi
+        (ke ca khi loi) trong LIST_TTL giay, va chi lay cac thay doi tu version
+        da biet (304 neu khong co thay doi).
+        """
+        now = time.monotonic()
+        with self.lock:
+            stale = [location for location in self.channels
+                     if location not in self.synced
+                     and now - self.list_fetched.get(location, float("-inf")) >= LIST_TTL]
+        if stale:
+            print(f"[Client] Dang cap nhat danh sach peer tu {len(stale)} kenh chua dong bo...")
+            self.for_each_tracker(self.fetch_peer_list, stale)
+
+        with self.lock:
+            # Bo cac kenh da roi
+            for location in list(self.peer_list):
+                if location not in self.channels:
+                    del self.peer_list[location]
+            return {location: dict(peers) for location, peers in self.peer_list.items()}
+
+    def fetch_peer_list(self, location, info):
+        """Lay danh ba cua mot kenh qua /get-list va luu vao self.peer_list."""
+        try:
+            with self.lock:
+                version = self.list_versions.get(location) if location in self.peer_list else None
+            if version is None:
+                status, body = self.tracker_request(location, info, "GET", "/get-list")
+            else:
+                status, body = self.tracker_request(location, info, "GET", f"/get-list?since={version}",
+                                                    headers={"If-None-Match": f'W/"{version}"'})
+            if status == 304:
+                with self.lock:
+                    self.list_fetched[location] = time.monotonic()
+                print(f"[Client] Kenh {location} khong thay doi.")
+            elif status == 200:
+                data = json.loads(body.decode('utf-8'))
+                peers_in_channel = data.get("peers", {})
+                # Xoa chinh minh khoi danh sach con
+                if self.username in peers_in_channel:
+                    del peers_in_channel[self.username]
+                
+                # Luu danh sach peer cua kenh nay (tru khi watcher da dong bo trong luc do)
+                with self.lock:
+                    if data.get("tracker"):
+                        self.tracker_ids[location] = data["tracker"]
+                    if location not in self.synced:
+                        if "since" in data:
+                            # Chi cac thay doi tu version da biet
+                            channel = self.peer_list.setdefault(location, {})
+                            channel.update(peers_in_channel)
+                            for peer_id in data.get("removed", []):
+                                channel.pop(peer_id, None)
+                        else:
+                            self.peer_list[location] = peers_in_channel
+                        self.list_versions[location] = data.get("version")
+                        self.list_fetched[location] = time.monotonic()
+                    count = len(self.peer_list.get(location, {}))
+                print(f"[Client] Kenh {location} co {count} peers (khac).")
+        except Exception as e:
+            # Giu danh ba cu, khong hoi lai tracker loi truoc LIST_TTL giay
+            with self.lock:
+                self.list_fetched[location] = time.monotonic()
+            print(f"[Client] Loi khi lay danh sach peer tu {location}: {e}")
+
+    #
+    # --- DANH BA TRUC TIEP (/watch-list) ---
+    #
+    def start_watcher(self, location):
+        """Khoi chay thread theo doi mot kenh neu chua co."""
+        watcher = self.watchers.get(location)
+        if watcher is not None and watcher.is_alive():
+            return
+        watcher = threading.Thread(target=self.watch_channel, args=(location,), daemon=True)
+        self.watchers[location] = watcher
+        watcher.start()
+
+    def watch_channel(self, location):
+        """
+        Giu mot ket noi /watch-list toi tracker cua kenh va ap dung cac su kien
+        (snapshot, set, remove) vao danh ba. Khi mat ket noi, ket noi lai voi
+        ?since=<version> de chi nhan cac thay doi bi lo.
         """
-        print("[Client] Dang cap nhat danh sach peer tu tat ca cac kenh...")
-        all_peers_by_channel = {}
-        for location, info in self.channels.items():
+        version = None
+        connected = False
+        while self.running and location in self.channels:
+            info = self.channels[location]
+            conn = None
             try:
-                conn = http.client.HTTPConnection(info['ip'], info['port'], timeout=3)
-                conn.request("GET", "/get-list")
+                conn = http.client.HTTPConnection(info['ip'], info['port'], timeout=WATCH_TIMEOUT)
+                path = "/watch-list" if version is None else f"/watch-list?since={version}"
+                conn.request("GET", path, headers={"Accept": "text/event-stream"})
                 response = conn.getresponse()
-                if response.status == 200:
-                    data = json.loads(response.read().decode('utf-8'))
-                    peers_in_channel = data.get("peers", {})
-                    # Xoa chinh minh khoi danh sach con
-                    if self.username in peers_in_channel:
-                        del peers_in_channel[self.username]
-                    
-                    # Luu danh sach peer cua kenh nay
-                    all_peers_by_channel[location] = peers_in_channel
-                    print(f"[Client] Kenh {location} co {len(peers_in_channel)} peers (khac).")
-                conn.close()
+                if response.status in WATCH_UNSUPPORTED:
+                    print(f"\r[Client] Kenh {location} khong ho tro /watch-list, dung /get-list\n[Ban]: ", end="", flush=True)
+                    return
+                if response.status != 200:
+                    raise ConnectionError(f"{response.status} {response.reason}")
+                if not connected:
+                    print(f"\r[Client] Dang theo doi danh sach peer cua kenh {location}\n[Ban]: ", end="", flush=True)
+                    connected = True
+                if version is not None:
+                    # Tracker gui cac thay doi tu version, hoac snapshot neu log khong du
+                    with self.lock:
+                        self.synced.add(location)
+                for event, event_id, data in self.read_events(response):
+                    if not (self.running and location in self.channels):
+                        break
+                    self.apply_event(location, event, data)
+                    if event_id is not None:
+                        version = int(event_id)
+                        with self.lock:
+                            self.list_versions[location] = version
             except Exception as e:
-                print(f"[Client] Loi khi lay danh sach peer tu {location}: {e}")
-        
-        self.peer_list = all_peers_by_channel # Luu lai cau truc long
-        print(f"[Client] Da cap nhat. Tong so {len(self.channels)} kenh.")
+                if connected:
+                    print(f"\r[Client] Mat ket noi theo doi kenh {location}: {e}\n[Ban]: ", end="", flush=True)
+                    connected = False
+            finally:
+                with self.lock:
+                    self.synced.discard(location)
+                if conn is not None:
+                    conn.close()
+            if self.running and location in self.channels:
+                time.sleep(WATCH_RETRY)
+
+    def read_events(self, response):
+        """
+        Doc cac su kien Server-Sent Events tu response.
+        Moi su kien la (event, id, data da giai ma JSON).
+        """
+        event, event_id, data = None, None, []
+        while True:
+            line = response.readline()
+            if not line:
+                return
+            line = line.decode('utf-8').rstrip('\r\n')
+            if not line:
+                if data:
+                    yield event, event_id, json.loads("\n".join(data))
+                event, event_id, data = None, None, []
+            elif line.startswith(':'):
+                # heartbeat
+                continue
+            else:
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == "event":
+                    event = value
+                elif field == "id":
+                    event_id = value
+                elif field == "data":
+                    data.append(value)
+
+    def apply_event(self, location, event, data):
+        """Ap dung mot su kien cua /watch-list vao danh ba cua kenh."""
+        with self.lock:
+            if event == "snapshot":
+                peers = data.get("peers", {})
+                peers.pop(self.username, None)
+                self.peer_list[location] = peers
+                if data.get("tracker"):
+                    self.tracker_ids[location] = data["tracker"]
+                self.synced.add(location)
+                return
+            peers = self.peer_list.setdefault(location, {})
+            peer_id = data.get("peer")
+            if peer_id == self.username:
+                return
+            if event == "set":
+                peers[peer_id] = data.get("info")
+            elif event == "remove":
+                peers.pop(peer_id, None)
 
     # --- Ham P2P (Khong thay doi) ---
     def start_server(self):
+        """
+        Nhan tin P2P tren mot thread duy nhat bang selectors: moi ket noi co buffer
+        rieng, tin day du duoc dua vao self.inbox. Inbox day thi ket noi tam
+        ngung doc va chua ack, peer gui se cham lai.
+        """
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.bind(('0.0.0.0', self.client_port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(self.backlog)
+        self.server_socket.setblocking(False)
         print(f"[Client] Dang lang nghe P2P tren port {self.client_port}")
-        while self.running:
+        selector = selectors.DefaultSelector()
+        selector.register(self.server_socket, selectors.EVENT_READ)
+        for sock in self.wakeup:
+            sock.setblocking(False)
+        selector.register(self.wakeup[0], selectors.EVENT_READ, "wakeup")
+        paused = set()
+        self.listening = True
+        last_sweep = time.monotonic()
+        try:
+            while self.running:
+                self.listener_paused = bool(paused)
+                for key, mask in selector.select(0.5):
+                    if key.data is None:
+                        self.accept_peers(selector)
+                        continue
+                    if key.data == "wakeup":
+                        try:
+                            self.wakeup[0].recv(RECV_SIZE)
+                        except (BlockingIOError, InterruptedError):
+                            pass
+                        self.add_links(selector)
+                        continue
+                    if isinstance(key.data, PeerLink):
+                        # Ack cua mot ket noi gui
+                        if not key.data.on_readable():
+                            selector.unregister(key.fileobj)
+                            key.fileobj.close()
+                        continue
+                    peer = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.read_peer(peer)
+                    if mask & selectors.EVENT_WRITE:
+                        self.write_peer(peer)
+                    self.update_peer(selector, peer, paused)
+                for peer in list(paused):
+                    self.update_peer(selector, peer, paused)
+                now = time.monotonic()
+                if now - last_sweep >= 1:
+                    last_sweep = now
+                    self.evict_links(selector, now)
+        except OSError:
+            if self.running: print("[Client] Loi server P2P")
+        finally:
+            self.listening = False
+            for key in list(selector.get_map().values()):
+                if isinstance(key.data, (InboundPeer, PeerLink)):
+                    key.fileobj.close()
+            selector.close()
+            self.server_socket.close()
+        print("[Client] Da dong server P2P.")
+
+    def add_links(self, selector):
+        """Dang ky cac ket noi gui moi vao vong lap de doc ack."""
+        while True:
+            try:
+                link = self.new_links.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                selector.register(link.sock, selectors.EVENT_READ, link)
+            except (ValueError, OSError):
+                # Socket da bi dong
+                link.close()
+                link.sock.close()
+
+    def evict_links(self, selector, now):
+        """Dong cac ket noi gui khong dung trong LINK_IDLE giay."""
+        for key in list(selector.get_map().values()):
+            link = key.data
+            if isinstance(link, PeerLink) and not link.closed and link.idle(now):
+                # shutdown: vong lap doc EOF roi dong socket
+                link.close("khong dung qua lau")
+                entry = self.peer_sockets.get(link.address)
+                if entry is not None and entry[0] is link and entry[1].acquire(blocking=False):
+                    try:
+                        if entry[0] is link:
+                            entry[0] = None
+                    finally:
+                        entry[1].release()
+
+    def register_link(self, link):
+        """Giao ket noi gui moi cho vong lap selectors, hoac mot thread doc ack."""
+        if self.listening:
+            self.new_links.put(link)
+            self.wake_listener()
+        else:
+            threading.Thread(target=link.read_acks, daemon=True).start()
+
+    def wake_listener(self):
+        try:
+            self.wakeup[1].send(b"\0")
+        except OSError:
+            pass
+
+    def accept_peers(self, selector):
+        while True:
             try:
                 conn, addr = self.server_socket.accept()
-                threading.Thread(target=self.handle_peer_connection, args=(conn, addr)).start()
-            except socket.error:
-                if self.running: print("[Client] Loi server P2P")
-                break
-        print("[Client] Da dong server P2P.")
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            peer = InboundPeer(conn, addr)
+            peer.events = selectors.EVENT_READ
+            selector.register(conn, peer.events, peer)
 
-    def handle_peer_connection(self, conn, addr):
+    def read_peer(self, peer):
         try:
-            data = conn.recv(1024).decode('utf-8')
-            if data:
-                print(f"\r[Tin nhan P2P tu {addr[0]}]: {data}\n[Ban]: ", end="", flush=True)
-        except Exception as e:
+            chunk = peer.conn.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
             print(f"\r[Client] Loi khi nhan tin nhan P2P: {e}")
-        finally:
-            conn.close()
+            chunk = b""
+        if chunk:
+            peer.buffer += chunk
+        else:
+            peer.eof = True
+
+    def write_peer(self, peer):
+        try:
+            sent = peer.conn.send(peer.outbox)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # Peer da dong, bo cac ack con lai
+            peer.outbox.clear()
+            return
+        del peer.outbox[:sent]
+
+    def parse_peer(self, peer):
+        """Tach cac tin day du trong buffer cua ket noi vao peer.frames."""
+        buffer = peer.buffer
+        if peer.framed is None:
+            if len(buffer) < len(PEER_MAGIC) and PEER_MAGIC.startswith(buffer) and not peer.eof:
+                return
+            peer.framed = buffer.startswith(PEER_MAGIC)
+            if peer.framed:
+                del buffer[:len(PEER_MAGIC)]
+        if peer.framed:
+            frames, used = decode_frames(buffer)
+            del buffer[:used]
+            peer.frames.extend(frame for frame in frames if frame[0] in (FRAME_MSG, FRAME_RELAY))
+        else:
+            lines = buffer.split(b"\n")
+            peer.buffer = lines.pop()
+            # Peer gui ban cu khong co "\n" thi tin con lai duoc hien thi khi ket noi dong
+            if peer.eof and peer.buffer:
+                lines.append(peer.buffer)
+                peer.buffer = bytearray()
+            peer.frames.extend((FRAME_MSG, None, bytes(line)) for line in lines)
+
+    def update_peer(self, selector, peer, paused):
+        """
+        Dua tin cua ket noi vao inbox, ack tin cuoi cung da vao, roi cap nhat
+        su kien cho doi hoac dong ket noi.
+        """
+        try:
+            self.parse_peer(peer)
+        except ValueError as e:
+            print(f"\r[Client] Loi khi nhan tin nhan P2P: {e}")
+            peer.eof = True
+            peer.frames.clear()
+        last_id = None
+        queued = 0
+        for kind, msg_id, payload in peer.frames:
+            try:
+                self.inbox.put_nowait((peer.addr, kind, payload))
+            except queue.Full:
+                break
+            queued += 1
+            if msg_id is not None:
+                last_id = msg_id
+        del peer.frames[:queued]
+        if last_id is not None:
+            peer.outbox += encode_frame(FRAME_ACK, last_id)
+            self.write_peer(peer)
+
+        peer.paused = bool(peer.frames)
+        if peer.paused:
+            paused.add(peer)
+        else:
+            paused.discard(peer)
+        if peer.eof and not peer.paused:
+            if peer.events:
+                selector.unregister(peer.conn)
+            peer.conn.close()
+            return
+        events = 0
+        if not peer.paused and not peer.eof:
+            events |= selectors.EVENT_READ
+        if peer.outbox:
+            events |= selectors.EVENT_WRITE
+        if events != peer.events:
+            if not peer.events:
+                selector.register(peer.conn, events, peer)
+            elif not events:
+                selector.unregister(peer.conn)
+            else:
+                selector.modify(peer.conn, events, peer)
+            peer.events = events
+
+    def display_loop(self):
+        """Thread giao dien: hien thi (va chuyen tiep gossip) cac tin trong inbox."""
+        while self.running:
+            try:
+                addr, kind, payload = self.inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self.listener_paused:
+                # Inbox vua co cho: bao vong lap selectors doc tiep
+                self.listener_paused = False
+                self.wake_listener()
+            if kind == FRAME_RELAY:
+                self.receive_relay(addr, payload)
+            else:
+                self.show_peer_message(addr, payload)
+
+    def show_peer_message(self, addr, data):
+        data = data.decode('utf-8', 'replace')
+        if data:
+            print(f"\r[Tin nhan P2P tu {addr[0]}]: {data}\n[Ban]: ", end="", flush=True)
+
+    #
+    # --- GUI TIN P2P SONG SONG ---
+    #
+    def peer_entry(self, address):
+        """Lay [PeerLink hoac None, lock] cua mot dia chi peer."""
+        with self.sockets_lock:
+            entry = self.peer_sockets.get(address)
+            if entry is None:
+                entry = [None, threading.Lock()]
+                self.peer_sockets[address] = entry
+            return entry
+
+    def peer_link(self, address, broken=None):
+        """
+        Lay ket noi dang mo toi mot dia chi, mo ket noi moi neu chua co, da dong
+        hoac la ket noi broken vua loi.
+        Tra ve (PeerLink, True neu vua mo).
+        """
+        entry = self.peer_entry(address)
+        with entry[1]:
+            link = entry[0]
+            if link is not None and (link.closed or link is broken):
+                link.close()
+                link = None
+            if link is None:
+                entry[0] = link = PeerLink(address)
+                self.register_link(link)
+                return link, True
+            return link, False
+
+    def send_to_peer(self, peer_id, info, message, kind=FRAME_MSG):
+        """
+        Gui mot tin toi mot peer qua ket noi da giu va cho ack cua peer. Ket noi
+        cu da hong thi thu lai mot lan voi ket noi moi.
+        Tra ve (peer_id, None neu thanh cong hoac loi, thoi gian gui).
+        """
+        start = time.monotonic()
+        try:
+            address = (info.get("ip"), int(info.get("port")))
+        except (TypeError, ValueError) as e:
+            return peer_id, f"dia chi khong hop le: {e}", 0.0
+        payload = message.encode('utf-8')
+        if len(payload) > MAX_FRAME:
+            return peer_id, f"tin nhan qua dai ({len(payload)} > {MAX_FRAME} byte)", 0.0
+
+        link = None
+        for _ in range(2):
+            fresh = True
+            try:
+                link, fresh = self.peer_link(address, link)
+                future = link.send(payload, kind)
+            except OSError as e:
+                error = str(e) or type(e).__name__
+                if fresh:
+                    break
+                continue
+            try:
+                future.result(timeout=SEND_TIMEOUT)
+                return peer_id, None, time.monotonic() - start
+            except FutureTimeout:
+                # Peer khong ack: ket noi bi treo, dong lai
+                error = f"khong nhan duoc ack sau {SEND_TIMEOUT}s"
+                link.close(error)
+                break
+            except OSError as e:
+                error = str(e) or type(e).__name__
+                if fresh:
+                    break
+        return peer_id, error, time.monotonic() - start
+
+    def fan_out(self, peers, message):
+        """
+        Gui mot tin toi nhieu peer song song (toi da FANOUT_WORKERS cung luc).
+        Thoi gian cho bi gioi han boi peer song cham nhat, khong phai tong thoi gian.
+        Tra ve bao cao {"delivered": [...], "failed": {peer_id: loi}, "elapsed": giay}.
+        """
+        start = time.monotonic()
+        futures = [self.executor.submit(self.send_to_peer, peer_id, info, message)
+                   for peer_id, info in peers.items()]
+        return self.collect_report(futures, start)
+
+    def collect_report(self, futures, start):
+        """Cho cac lan gui send_to_peer va tong hop bao cao."""
+        wait(futures)
+        report = {"delivered": [], "failed": {}, "elapsed": 0.0}
+        for future in futures:
+            peer_id, error, _ = future.result()
+            if error is None:
+                report["delivered"].append(peer_id)
+            else:
+                report["failed"][peer_id] = error
+        report["elapsed"] = round(time.monotonic() - start, 3)
+        return report
+
+    #
+    # --- OVERLAY GOSSIP ---
+    #
+    def remember_message(self, message_id):
+        """Ghi nho id tin. Tra ve False neu tin da nhan (hoac da gui) truoc do."""
+        with self.lock:
+            if message_id in self.seen_messages:
+                return False
+            self.seen_messages[message_id] = True
+            while len(self.seen_messages) > SEEN_SIZE:
+                self.seen_messages.popitem(last=False)
+            return True
+
+    def gossip(self, channel, relay, exclude=()):
+        """
+        Gui tin relay toi toi da self.fanout peer ngau nhien cua kenh (theo danh
+        ba hien co, khong hoi tracker), tru cac peer trong exclude.
+        Tra ve danh sach Future cua send_to_peer, khong cho.
+        """
+        with self.lock:
+            peers = {peer_id: info for peer_id, info in self.peer_list.get(channel, {}).items()
+                     if peer_id not in exclude}
+        targets = random.sample(sorted(peers), min(self.fanout, len(peers)))
+        data = json.dumps(relay)
+        return [self.executor.submit(self.send_to_peer, peer_id, peers[peer_id], data, FRAME_RELAY)
+                for peer_id in targets]
+
+    def start_gossip(self, channels, text):
+        """
+        Phat mot tin qua overlay gossip toi cac kenh. Nguoi gui chi gui toi
+        self.fanout peer moi kenh; TTL du de tin lan toi ca kenh sau
+        log_fanout(N) buoc.
+        Tra ve bao cao cua cac lan gui dau tien.
+        """
+        start = time.monotonic()
+        message_id = uuid.uuid4().hex
+        self.remember_message(message_id)
+        futures = []
+        with self.lock:
+            sizes = {channel: len(self.peer_list.get(channel, {})) for channel in channels}
+            names = {channel: self.tracker_ids.get(channel, channel) for channel in channels}
+        for channel, size in sizes.items():
+            if size == 0:
+                continue
+            hops = math.ceil(math.log(size) / math.log(max(self.fanout, 2))) if size > 1 else 0
+            relay = {"id": message_id, "ttl": hops + GOSSIP_EXTRA_HOPS, "origin": self.username,
+                     "via": self.username, "channel": names[channel], "text": text}
+            futures.extend(self.gossip(channel, relay, exclude=(self.username,)))
+        return self.collect_report(futures, start)
+
+    def find_channel(self, name):
+        """
+        Tim kenh (location) cua truong "channel" trong tin gossip: dinh danh
+        tracker, hoac dia chi tracker cua nguoi gui (tracker/client cu).
+        Tra ve None neu khong co kenh nao khop.
+        """
+        with self.lock:
+            for location, tracker_id in self.tracker_ids.items():
+                if tracker_id == name and location in self.peer_list:
+                    return location
+            if name in self.peer_list:
+                return name
+        return None
+
+    def receive_relay(self, addr, payload):
+        """Hien thi tin gossip lan dau nhan duoc va chuyen tiep neu con TTL."""
+        try:
+            relay = json.loads(payload)
+            message_id, ttl, channel, text = relay["id"], int(relay["ttl"]), relay["channel"], relay["text"]
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"\r[Client] Bo tin gossip khong hop le tu {addr[0]}: {e}")
+            return
+        if not self.remember_message(message_id):
+            return
+        self.show_peer_message(addr, text.encode('utf-8'))
+        if ttl > 0:
+            location = self.find_channel(channel)
+            if location is None:
+                print(f"\r[Client] Khong chuyen tiep tin gossip {message_id}: khong biet kenh {channel}\n[Ban]: ",
+                      end="", flush=True)
+                return
+            exclude = (self.username, relay.get("origin"), relay.get("via"))
+            relay.update(ttl=ttl - 1, via=self.username)
+            self.gossip(location, relay, exclude)
+
+    def print_report(self, report):
+        total = len(report["delivered"]) + len(report["failed"])
+        print(f"[Client] Da gui {len(report['delivered'])}/{total} peers trong {report['elapsed']}s.")
+        for peer_id, error in report["failed"].items():
+            print(f"[Client] Khong the gui den {peer_id}: {error}")
+
+    def close_peer_sockets(self):
+        with self.sockets_lock:
+            entries = list(self.peer_sockets.values()) + list(self.tracker_conns.values())
+            self.peer_sockets.clear()
+            self.tracker_conns.clear()
+        for entry in entries:
+            if entry[0] is not None:
+                try:
+                    entry[0].close()
+                except OSError:
+                    pass
 
     #
     # --- HAM BROADCAST (DA CAP NHAT) ---
@@ -153,30 +1037,29 @@ class ChatClient:
         Gui tin nhan Broadcast den tat ca peer (tu tat ca cac kenh)
         """
         print("[Client] Dang broadcast...")
-        self.get_peer_list() # Ham nay da duoc cap nhat
+        peer_list = self.get_peer_list() # Danh ba truc tiep
         
         full_message = f"[{self.username} - BROADCAST]: {message}"
         
         # Can tao mot danh sach "phang" de tranh gui trung lap
         all_peers_flat = {}
-        for location, peers_in_channel in self.peer_list.items():
+        for location, peers_in_channel in peer_list.items():
             all_peers_flat.update(peers_in_channel)
 
         if not all_peers_flat:
             print("[Client] Khong co peer nao de broadcast.")
             return
 
+        if self.overlay == "gossip":
+            print(f"[Client] Se phat broadcast qua gossip toi {len(all_peers_flat)} peers (fanout {self.fanout})...")
+            report = self.start_gossip(list(peer_list), full_message)
+            self.print_report(report)
+            return report
+
         print(f"[Client] Se gui broadcast den {len(all_peers_flat)} peers...")
-        for peer_id, info in all_peers_flat.items():
-            peer_ip = info.get("ip")
-            peer_port = int(info.get("port"))
-            try:
-                peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                peer_socket.connect((peer_ip, peer_port))
-                peer_socket.sendall(full_message.encode('utf-8'))
-                peer_socket.close()
-            except Exception as e:
-                print(f"[Client] Khong the gui broadcast den {peer_id} ({peer_ip}:{peer_port}): {e}")
+        report = self.fan_out(all_peers_flat, full_message)
+        self.print_report(report)
+        return report
 
     #
     # --- HAM SEND DIRECT (DA CAP NHAT) ---
@@ -186,11 +1069,11 @@ class ChatClient:
         Gui tin nhan rieng den mot peer cu the (P2P)
         """
         print(f"[Client] Dang gui tin nhan rieng cho {target_username}...")
-        self.get_peer_list() # Cap nhat danh ba
+        peer_list = self.get_peer_list() # Danh ba truc tiep
 
         target_info = None
         # Tim kiem peer do trong tat ca cac kenh
-        for location, peers_in_channel in self.peer_list.items():
+        for location, peers_in_channel in peer_list.items():
             if target_username in peers_in_channel:
                 target_info = peers_in_channel[target_username]
                 break # Tim thay
@@ -200,17 +1083,11 @@ class ChatClient:
             return
         
         full_message = f"[{self.username} - RIENG]: {message}"
-        peer_ip = target_info.get("ip")
-        peer_port = int(target_info.get("port"))
-        
-        try:
-            peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            peer_socket.connect((peer_ip, peer_port))
-            peer_socket.sendall(full_message.encode('utf-8'))
-            peer_socket.close()
+        _, error, _ = self.send_to_peer(target_username, target_info, full_message)
+        if error is None:
             print(f"[Client] Da gui tin nhan rieng cho {target_username}.")
-        except Exception as e:
-            print(f"[Client] Khong the gui den {target_username} ({peer_ip}:{peer_port}): {e}")
+        else:
+            print(f"[Client] Khong the gui den {target_username} ({target_info.get('ip')}:{target_info.get('port')}): {error}")
 
     #
     # --- HAM MOI: GUI DEN KENH CU THE ---
@@ -225,10 +1102,10 @@ class ChatClient:
             return
 
         print(f"[Client] Dang gui tin nhan den kenh {channel_location}...")
-        self.get_peer_list() # Cap nhat danh ba
+        peer_list = self.get_peer_list() # Danh ba truc tiep
         
         # Lay danh sach peer CHU RIENG kenh do
-        peers_in_this_channel = self.peer_list.get(channel_location)
+        peers_in_this_channel = peer_list.get(channel_location)
         
         if not peers_in_this_channel:
             print(f"[Client] Khong co peer nao trong kenh {channel_location} (ngoai ban).")
@@ -236,17 +1113,16 @@ class ChatClient:
 
         full_message = f"[{self.username} @ {channel_location}]: {message}"
         
+        if self.overlay == "gossip":
+            print(f"[Client] Se phat qua gossip toi {len(peers_in_this_channel)} peers trong kenh {channel_location} (fanout {self.fanout})...")
+            report = self.start_gossip([channel_location], full_message)
+            self.print_report(report)
+            return report
+
         print(f"[Client] Se gui den {len(peers_in_this_channel)} peers trong kenh {channel_location}...")
-        for peer_id, info in peers_in_this_channel.items():
-            peer_ip = info.get("ip")
-            peer_port = int(info.get("port"))
-            try:
-                peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                peer_socket.connect((peer_ip, peer_port))
-                peer_socket.sendall(full_message.encode('utf-8'))
-                peer_socket.close()
-            except Exception as e:
-                print(f"[Client] Khong the gui (kenh) den {peer_id} ({peer_ip}:{peer_port}): {e}")
+        report = self.fan_out(peers_in_this_channel, full_message)
+        self.print_report(report)
+        return report
 
     #
     # --- HAM START (DA CAP NHAT) ---
@@ -257,10 +1133,14 @@ class ChatClient:
         """
         self.load_channels() 
         self.register_with_all_trackers()
+        for location in self.channels:
+            self.start_watcher(location)
+        threading.Thread(target=self.heartbeat_loop, daemon=True).start()
         
         server_thread = threading.Thread(target=self.start_server)
         server_thread.daemon = True
         server_thread.start()
+        threading.Thread(target=self.display_loop, daemon=True).start()
         
         try:
             while True:
@@ -284,7 +1164,8 @@ class ChatClient:
                         port = int(port_str)
                         self.channels[location] = {"ip": ip, "port": port}
                         self.save_channels()
-                        self.register_with_all_trackers()
+                        self.register_with_tracker(location, self.channels[location])
+                        self.start_watcher(location)
                         print(f"[Client] Da tham gia va luu kenh: {location}")
                     except Exception as e:
                         print(f"[Client] Loi cu phap. Su dung: /join <ip:port>. Loi: {e}")
@@ -297,6 +1178,7 @@ class ChatClient:
                             # TODO: Can goi logout cho rieng channel nay
                             del self.channels[location]
                             self.save_channels()
+                            self.drop_tracker(location)
                             print(f"[Client] Da roi kenh {location}. (Hay logout khoi kenh do thu cong neu can)")
                         else:
                             print(f"[Client] Ban chua tham gia kenh {location}")
@@ -305,9 +1187,8 @@ class ChatClient:
                     continue
 
                 elif msg.lower() == '/list':
-                    self.get_peer_list()
                     # In ra danh sach peer da duoc phan loai
-                    print(json.dumps(self.peer_list, indent=2))
+                    print(json.dumps(self.get_peer_list(), indent=2))
                     continue
 
                 elif msg.startswith('/msg '):
@@ -358,6 +1239,8 @@ class ChatClient:
         finally:
             self.running = False
             self.logout_from_all_trackers() 
+            self.close_peer_sockets()
+            self.executor.shutdown(wait=False)
             try:
                 s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 s.connect((self.client_ip, self.client_port))
@@ -371,8 +1254,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='P2P Chat Client (Multi-Channel)')
     parser.add_argument('--username', required=True, help='Ten cua ban (bat buoc)')
     parser.add_argument('--port', type=int, required=True, help='Port P2P de ban lang nghe (bat buoc)')
+    parser.add_argument('--overlay', choices=['direct', 'gossip'], default='direct',
+                        help='Cach phat broadcast / tin kenh: gui truc tiep toi tung peer hoac qua gossip')
+    parser.add_argument('--fanout', type=int, default=GOSSIP_FANOUT,
+                        help='So peer moi buoc chuyen tiep trong che do gossip')
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG,
+                        help='Hang doi ket noi P2P cho accept')
+    parser.add_argument('--inbox-size', type=int, default=INBOX_SIZE,
+                        help='So tin P2P nhan duoc cho hien thi toi da')
     
     args = parser.parse_args()
     
-    client = ChatClient(args.username, args.port)
+    client = ChatClient(args.username, args.port, overlay=args.overlay, fanout=args.fanout,
+                        backlog=args.backlog, inbox_size=args.inbox_size)
     client.start()
\ No newline at end of file
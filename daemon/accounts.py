@@ -0,0 +1,235 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.accounts
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`AccountStore <AccountStore>` checking the
+credentials of ``/login`` against the SQLite account database, through
+connections opened by the application (e.g. ``sqlite3.connect``).
+
+- Connections come from a bounded :class:`SQLitePool <SQLitePool>`
+  instead of one new connection per request: at most ``pool_size`` are ever
+  open, and each keeps the statements it already compiled (``sqlite3``
+  caches the prepared statements of a connection by SQL text).
+- Verified credentials are kept for ``cache_ttl`` seconds, as a salted SHA-256
+  digest of the name and password, never the password itself. Failed logins
+  are not cached and always reach the database.
+
+Notes:
+------
+- A password changed in the database is picked up once the cached entry
+  expires, or at once after :meth:`AccountStore.invalidate`.
+- The time spent waiting for a free connection is reported by
+  :meth:`AccountStore.stats`; :class:`PoolTimeout` is raised after
+  ``ACQUIRE_TIMEOUT`` seconds.
+
+Usage Example:
+--------------
+>>> connect = lambda: sqlite3.connect("db/account.db", check_same_thread=False)
+>>> accounts = AccountStore(connect, select_user)
+>>> accounts.verify("alice", "secret")
+True
+>>> accounts.stats()
+
+"""
+
+import hashlib
+import hmac
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+#: Most database connections open at once.
+POOL_SIZE = 8
+
+#: Seconds a lookup waits for a free connection.
+ACQUIRE_TIMEOUT = 5
+
+#: Seconds a verified credential is trusted without the database, 0 disables.
+CACHE_TTL = 60
+
+#: Most verified credentials kept.
+CACHE_SIZE = 1024
+
+class PoolTimeout(Exception):
+    """No connection became free within the acquire timeout."""
+
+class SQLitePool:
+    """The :class:`SQLitePool <SQLitePool>` object lends database
+    connections to one thread at a time, opening them on demand.
+    """
+
+    __attrs__ = [
+        "size",
+        "timeout",
+    ]
+
+    def __init__(self, connect, size=POOL_SIZE, timeout=ACQUIRE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @contextmanager
+    def connection(self):
+        """
+        Lends a connection for the duration of the ``with`` block. A connection
+        whose block raised is closed instead of going back to the pool.
+
+        :raise PoolTimeout: no connection became free in time.
+        """
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout("No database connection free after {}s".format(self.timeout))
+        waited = time.monotonic() - start
+        with self._lock:
+            self.acquired += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._lock:
+                    self.opened += 1
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                with self._lock:
+                    self.opened -= 1
+                raise
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Returns the pool counters, wait times in milliseconds."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self.opened,
+                "idle": self._idle.qsize(),
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(1000 * self.wait_total / self.acquired, 3) if self.acquired else 0.0,
+                "wait_max_ms": round(1000 * self.wait_max, 3),
+            }
+
+class AccountStore:
+    """The :class:`AccountStore <AccountStore>` object verifies credentials
+    through a connection pool and a cache of verified credentials.
+    """
+
+    __attrs__ = [
+        "pool",
+        "select",
+        "cache_ttl",
+        "cache_size",
+    ]
+
+    def __init__(self, connect, select, pool_size=POOL_SIZE,
+                 cache_ttl=CACHE_TTL, cache_size=CACHE_SIZE):
+        """
+        :param connect (function): opens a database connection. The pool lends
+                                   it to any thread, a SQLite connection must
+                                   be opened with ``check_same_thread=False``.
+        :param select (function): ``select(conn, username)`` returning the account
+                                  row, password second, or None.
+        """
+        self.pool = SQLitePool(connect, pool_size)
+        self.select = select
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._salt = os.urandom(16)
+        # username -> (digest, expiry), least recently verified first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.queries = 0
+
+    def _digest(self, username, password):
+        data = "{}\0{}".format(username, password).encode("utf-8")
+        return hashlib.sha256(self._salt + data).digest()
+
+    def lookup(self, username):
+        """
+        Reads an account row.
+
+        :raise PoolTimeout: no connection became free in time.
+        """
+        with self.pool.connection() as conn:
+            with self._lock:
+                self.queries += 1
+            return self.select(conn, username)
+
+    def verify(self, username, password):
+        """
+        Checks a name and password, from the cache when they were verified
+        less than ``cache_ttl`` seconds ago.
+
+        :rtype bool: True if the credentials are valid.
+        :raise PoolTimeout: no connection became free in time.
+        """
+        digest = self._digest(username, password)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(username)
+            if entry is not None and entry[1] > now and hmac.compare_digest(entry[0], digest):
+                self._cache.move_to_end(username)
+                self.hits += 1
+                return True
+
+        row = self.lookup(username)
+        valid = row is not None and hmac.compare_digest(
+            str(row[1]).encode("utf-8"), password.encode("utf-8"))
+
+        with self._lock:
+            if not valid:
+                self._cache.pop(username, None)
+            elif self.cache_ttl > 0:
+                self._cache[username] = (digest, now + self.cache_ttl)
+                self._cache.move_to_end(username)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return valid
+
+    def invalidate(self, username=None):
+        """Forgets the verified credentials of an account, or of all accounts."""
+        with self._lock:
+            if username is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(username, None)
+
+    def stats(self):
+        """Returns the cache counters and the pool counters."""
+        with self._lock:
+            stats = {"cache_hits": self.hits, "queries": self.queries, "cached": len(self._cache)}
+        stats.update(self.pool.stats())
+        return stats
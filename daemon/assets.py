@@ -0,0 +1,312 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.assets
+~~~~~~~~~~~~~~~~~
+
+This module provides the process-wide cache of the static files served from
+``www/`` and ``static/``. A file is loaded once with its precomputed headers
+(Content-Type, Content-Length, ETag, Last-Modified), then served from memory.
+Files above ``max_entry_bytes`` only keep their path and headers, their body is
+sent from disk (see :meth:`Response.send_to <daemon.response.Response.send_to>`).
+The ``gzip``/``br`` variants of a file are kept with it (see :meth:`StaticCache.encoded`)
+and dropped when the file changes, a precompressed sibling also when it changes.
+
+Invalidation:
+-------------
+A cached file is checked with one ``stat`` at most every ``stat_interval``
+seconds, and reloaded when its size or modification time changed. Between two
+checks a request costs no filesystem call, the resolved path of each request
+path is cached too.
+
+Usage Example:
+--------------
+>>> asset = static_cache.get("static/css", "/styles.css", "text/css")
+>>> asset.headers["ETag"]
+'"45a-18c2b7f1e0a"'
+
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+
+from .encoding import SUFFIXES, MIN_SIZE, compress, can_compress
+
+#: Bytes of file content kept in memory.
+MAX_BYTES = 32 * 1024 * 1024
+
+#: Largest file kept in memory, bigger files are sent from disk.
+MAX_ENTRY_BYTES = 256 * 1024
+
+#: Seconds between two freshness checks of a cached file.
+STAT_INTERVAL = 1.0
+
+def resolve_path(base_dir, path):
+    """
+    Resolves a request path inside a base directory.
+
+    :param base_dir (str): directory the file must be in.
+    :param path (str): request path.
+
+    :rtype str: real path of the file.
+    :raise IOError: the path leads out of the base directory.
+    """
+    base_real = os.path.realpath(base_dir)
+    target_real = os.path.realpath(os.path.join(base_dir, path.lstrip('/')))
+    if os.path.commonpath([base_real]) != os.path.commonpath([base_real, target_real]):
+        raise IOError("File path is not allowed")
+    return target_real
+
+class StaticAsset:
+    """A static file loaded in memory and its response headers."""
+
+    __attrs__ = [
+        "path",
+        "content",
+        "headers",
+        "size",
+        "cost",
+        "mtime_ns",
+        "stat",
+        "checked",
+        "aliases",
+        "variants",
+    ]
+
+    def __init__(self, path, mime_type, st, content, coding=None, etag=None):
+        #: Real path of the file.
+        self.path = path
+        #: Bytes of the file, None when it is sent from disk.
+        self.content = content
+        #: Size and modification time the content was read at. A write during
+        #: the read leaves a size different from the file, seen by the next check.
+        self.size = st.st_size if content is None else len(content)
+        self.mtime_ns = st.st_mtime_ns
+        self.stat = st
+        #: Bytes of memory held by the entry.
+        self.cost = 0 if content is None else self.size
+        #: Headers describing the content. An encoded variant takes the
+        #: ETag of its source file with the coding appended.
+        self.headers = {
+            "Content-Type": mime_type,
+            "Content-Length": str(self.size),
+            "ETag": etag or '"{:x}-{:x}"'.format(self.size, self.mtime_ns),
+            "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        }
+        if coding is not None:
+            self.headers["Content-Encoding"] = coding
+        #: Monotonic time of the last freshness check.
+        self.checked = time.monotonic()
+        #: Cache keys of the request paths resolved to this file.
+        self.aliases = set()
+        #: Coding -> encoded variant of the file, None when not worth it.
+        self.variants = {}
+
+    def changed(self, st):
+        return st.st_size != self.size or st.st_mtime_ns != self.mtime_ns
+
+class StaticCache:
+    """The :class:`StaticCache <StaticCache>` object keeps the hot static files
+    in memory, least recently used first out above ``max_bytes``.
+    """
+
+    __attrs__ = [
+        "max_bytes",
+        "max_entry_bytes",
+        "stat_interval",
+        "hits",
+        "misses",
+    ]
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entry_bytes=MAX_ENTRY_BYTES,
+                 stat_interval=STAT_INTERVAL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.stat_interval = stat_interval
+        self.hits = 0
+        self.misses = 0
+        self._assets = OrderedDict()
+        self._aliases = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Returns the counters and the current size of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "files": len(self._assets),
+                "bytes": self._size,
+            }
+
+    def _drop(self, asset):
+        """Removes a file and its aliases from the cache, lock held."""
+        if self._assets.pop(asset.path, None) is asset:
+            self._size -= asset.cost
+            for alias in asset.aliases:
+                self._aliases.pop(alias, None)
+
+    def _add(self, asset, alias):
+        """Inserts a file and evicts the least recently used ones, lock held."""
+        stale = self._assets.get(asset.path)
+        if stale is not None:
+            asset.aliases |= stale.aliases
+            self._drop(stale)
+        asset.aliases.add(alias)
+        for key in asset.aliases:
+            self._aliases[key] = asset.path
+        self._assets[asset.path] = asset
+        self._size += asset.cost
+        self._shrink()
+
+    def _shrink(self):
+        """Evicts the least recently used files above ``max_bytes``, lock held."""
+        while self._size > self.max_bytes:
+            _, oldest = self._assets.popitem(last=False)
+            self._size -= oldest.cost
+            for key in oldest.aliases:
+                self._aliases.pop(key, None)
+
+    def get(self, base_dir, path, mime_type):
+        """
+        Returns a static file, from memory when it is cached and unchanged.
+
+        :param base_dir (str): directory the file must be in.
+        :param path (str): request path.
+        :param mime_type (str): Content-Type of the file.
+
+        :rtype StaticAsset: the file and its headers.
+        :raise IOError: the path is not allowed or the file cannot be read.
+        """
+        alias = (base_dir, path)
+        now = time.monotonic()
+        with self._lock:
+            asset = self._assets.get(self._aliases.get(alias))
+            if asset is not None and now - asset.checked < self.stat_interval:
+                self._assets.move_to_end(asset.path)
+                self.hits += 1
+                return asset
+
+        real_path = asset.path if asset is not None else resolve_path(base_dir, path)
+        try:
+            st = os.stat(real_path)
+        except OSError:
+            if asset is not None:
+                with self._lock:
+                    self._drop(asset)
+            raise
+        if asset is not None and not asset.changed(st):
+            with self._lock:
+                asset.checked = now
+                if self._assets.get(asset.path) is asset:
+                    self._assets.move_to_end(asset.path)
+                self.hits += 1
+            return asset
+
+        asset = self._load(real_path, mime_type, st)
+        with self._lock:
+            self.misses += 1
+            self._add(asset, alias)
+        return asset
+
+    def _load(self, real_path, mime_type, st, coding=None, etag=None):
+        """Reads a file, or only describes it when it is sent from disk."""
+        if st.st_size > self.max_entry_bytes:
+            return StaticAsset(real_path, mime_type, st, None, coding, etag)
+        with open(real_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            content = f.read()
+        return StaticAsset(real_path, mime_type, st, content, coding, etag)
+
+    def encoded(self, asset, coding):
+        """
+        Returns the variant of a file in a content coding: its precompressed
+        sibling (``.gz``, ``.br``) if one exists, else the file compressed in
+        memory when the server can produce the coding. Variants live and die
+        with their source entry, a sibling is also checked on its own every
+        ``stat_interval`` seconds and reloaded when it changed.
+
+        :param asset (StaticAsset): the source file.
+        :param coding (str): ``gzip`` or ``br``.
+
+        :rtype StaticAsset: the encoded variant, None when there is no sibling
+                            and compressing would not pay off.
+        """
+        now = time.monotonic()
+        with self._lock:
+            variant = asset.variants.get(coding)
+            if coding in asset.variants and (variant is None or variant.path == asset.path
+                                             or now - variant.checked < self.stat_interval):
+                return variant
+
+        if variant is not None:
+            # A sibling due for a check, rewritten or removed apart from its source
+            try:
+                st = os.stat(variant.path)
+            except OSError:
+                st = None
+            with self._lock:
+                if st is not None and not variant.changed(st):
+                    variant.checked = now
+                    return variant
+                if asset.variants.get(coding) is variant:
+                    del asset.variants[coding]
+                    asset.cost -= variant.cost
+                    if self._assets.get(asset.path) is asset:
+                        self._size -= variant.cost
+
+        mime_type = asset.headers["Content-Type"]
+        etag = '{}-{}"'.format(asset.headers["ETag"][:-1], coding)
+        sibling = asset.path + SUFFIXES[coding]
+        try:
+            variant = self._load(sibling, mime_type, os.stat(sibling), coding, etag)
+        except OSError:
+            variant = None
+            if asset.content is not None and asset.size >= MIN_SIZE and can_compress(coding):
+                data = compress(asset.content, coding, static=True)
+                if len(data) < asset.size:
+                    variant = StaticAsset(asset.path, mime_type, asset.stat, data, coding, etag)
+        if variant is not None:
+            # Validators follow the source file, whichever file the bytes came from
+            variant.headers["Last-Modified"] = asset.headers["Last-Modified"]
+
+        with self._lock:
+            if coding not in asset.variants:
+                asset.variants[coding] = variant
+                if variant is not None:
+                    asset.cost += variant.cost
+                    if self._assets.get(asset.path) is asset:
+                        self._size += variant.cost
+                        self._shrink()
+            return asset.variants[coding]
+
+    def invalidate(self, path=None):
+        """
+        Forgets one cached file by its real path, or every file.
+
+        :param path (str): real path of the file, None for all.
+        """
+        with self._lock:
+            if path is None:
+                self._assets.clear()
+                self._aliases.clear()
+                self._size = 0
+            elif path in self._assets:
+                self._drop(self._assets[path])
+
+#: Static files shared by every thread of the process.
+static_cache = StaticCache()
@@ -0,0 +1,331 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.asyncbackend
+~~~~~~~~~~~~~~~~~
+
+This module provides an asyncio engine for the backend daemon. A single event loop
+accepts the connections with :func:`asyncio.start_server`, so an idle connection
+costs a coroutine instead of an OS thread.
+
+Requests are parsed with the same :meth:`Request.prepare <Request.prepare>` semantics
+and dispatched through :meth:`HttpAdapter.dispatch <HttpAdapter.dispatch>` as in the
+threaded backend. Route handlers may be plain functions, which run in a thread pool
+executor, or ``async def`` coroutines, which are awaited on the event loop.
+
+Requirements:
+--------------
+- asyncio: event loop, stream server.
+- concurrent.futures: thread pool running the blocking route handlers.
+- httpadapter: the class for handling HTTP requests.
+
+Notes:
+------
+- Idle keep-alive connections only hold a coroutine and a buffered reader.
+- At most ``pool_size`` blocking handlers run at once and ``queue_size`` more may
+  wait for the executor, further requests are shed with ``503``.
+- Serving ten thousand concurrent connections requires the process file
+  descriptor limit (``ulimit -n``) to be raised accordingly.
+
+Usage Example:
+--------------
+>>> create_backend("127.0.0.1", 9000, routes={}, mode="asyncio")
+
+"""
+
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from .backend import POOL_SIZE, QUEUE_SIZE
+from .request import Request
+from .response import Response, LAST_CHUNK
+from .httpadapter import HttpAdapter, READ_TIMEOUT, KEEPALIVE_TIMEOUT, MAX_REQUESTS
+from .parser import parse_head, ParseError, MAX_HEADER_BYTES, MAX_BODY_BYTES, MAX_CHUNK_LINE
+
+#: Listen backlog of the asyncio server.
+BACKLOG = 1024
+
+async def read_chunked_body(reader):
+    """
+    Reads and decodes a ``Transfer-Encoding: chunked`` body, trailer fields included.
+
+    :param reader (asyncio.StreamReader): client stream, after the header block.
+
+    :rtype bytearray: the decoded body.
+    :raise ParseError: a chunk is malformed or the body exceeds ``MAX_BODY_BYTES``.
+    """
+    body = bytearray()
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if len(line) > MAX_CHUNK_LINE:
+            raise ParseError(400, "Bad Request")
+        try:
+            size = int(line.split(b";", 1)[0], 16)
+        except ValueError:
+            raise ParseError(400, "Bad Request")
+        if size < 0:
+            raise ParseError(400, "Bad Request")
+        if size == 0:
+            # Trailer fields, up to an empty line
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return body
+        if len(body) + size > MAX_BODY_BYTES:
+            raise ParseError(413, "Payload Too Large")
+        body += await reader.readexactly(size)
+        if await reader.readexactly(2) != b"\r\n":
+            raise ParseError(400, "Bad Request")
+
+async def read_request(reader, adapter, timeout):
+    """
+    Reads one HTTP request (header block and Content-Length or chunked body) from the stream.
+    Pipelined requests behind it stay buffered in the reader.
+
+    :param reader (asyncio.StreamReader): client stream.
+    :param adapter (HttpAdapter): adapter whose request is prepared.
+    :param timeout (int): seconds to wait for the header block.
+
+    :rtype bool: True if a request was read and prepared, False on EOF or timeout.
+    :raise ParseError: the request is malformed or exceeds the parser limits.
+    """
+    req = adapter.request
+    try:
+        header_bytes = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    except asyncio.LimitOverrunError:
+        raise ParseError(431, "Request Header Fields Too Large")
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return False
+    if len(header_bytes) > MAX_HEADER_BYTES:
+        raise ParseError(431, "Request Header Fields Too Large")
+
+    head = parse_head(header_bytes[:-4])
+    if head.content_length > MAX_BODY_BYTES:
+        raise ParseError(413, "Payload Too Large")
+    req.prepare_head(head, adapter.routes)
+
+    body = b""
+    if head.chunked:
+        try:
+            body = await asyncio.wait_for(read_chunked_body(reader), READ_TIMEOUT)
+        except asyncio.LimitOverrunError:
+            raise ParseError(400, "Bad Request")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            adapter.framed = False
+    elif head.content_length > 0:
+        try:
+            body = await asyncio.wait_for(reader.readexactly(head.content_length), READ_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            body = e.partial
+            adapter.framed = False
+        except (asyncio.TimeoutError, ConnectionError):
+            adapter.framed = False
+    req.raw_body = memoryview(body)
+    return True
+
+async def send_response(writer, result):
+    """
+    Writes a response to the client stream. The file body of a
+    :class:`Response <Response>` goes through ``loop.sendfile``, which uses
+    ``os.sendfile`` on plain sockets and falls back to buffered reads elsewhere.
+    A streamed body is written by :func:`send_stream`.
+
+    :param writer (asyncio.StreamWriter): client stream writer.
+    :param result (bytes): raw HTTP response, or a :class:`Response <Response>`.
+    """
+    if not isinstance(result, Response):
+        writer.write(result)
+        await writer.drain()
+        return
+
+    writer.write(result._header)
+    if result._chunks is not None:
+        await send_stream(writer, result)
+        return
+    if result._file is None:
+        writer.write(result._content)
+        await writer.drain()
+        return
+    await writer.drain()
+    loop = asyncio.get_running_loop()
+    with open(result._file, 'rb') as f:
+        for prefix, offset, count in result._segments:
+            if prefix:
+                writer.write(prefix)
+                await writer.drain()
+            await loop.sendfile(writer.transport, f, offset, count)
+    if result._trailer:
+        writer.write(result._trailer)
+        await writer.drain()
+
+async def send_stream(writer, result):
+    """
+    Writes the streamed body of a :class:`Response <Response>` chunk by chunk.
+    An asynchronous iterator is driven on the event loop, the fragments of any
+    other iterable are pulled on the default executor. Each chunk is drained
+    before the next fragment is asked for, so the transport buffer stays bounded.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = result._chunks
+    end = object()
+    if hasattr(chunks, "__aiter__"):
+        pull = chunks.__aiter__().__anext__
+    else:
+        fragments = iter(chunks)
+
+        async def pull():
+            fragment = await loop.run_in_executor(None, next, fragments, end)
+            if fragment is end:
+                raise StopAsyncIteration
+            return fragment
+
+    try:
+        while True:
+            try:
+                fragment = await pull()
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                # The header is sent already, only a reset tells the client
+                print("[Backend] Streamed body failed: {}".format(e))
+                writer.transport.abort()
+                return
+            data = result.frame(fragment)
+            if data:
+                writer.write(data)
+                await writer.drain()
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        result.close()
+    if result.chunked:
+        writer.write(LAST_CHUNK)
+    await writer.drain()
+
+def is_async_route(req):
+    """Returns True if the request is routed to an ``async def`` handler."""
+    return req.hook is not None and inspect.iscoroutinefunction(req.hook)
+
+async def handle_client_async(ip, port, reader, writer, routes, executor, slots, settings):
+    """
+    Handles one client connection on the event loop, serving requests until the
+    connection is no longer persistent (see :meth:`HttpAdapter.prepare_connection`).
+
+    Coroutine handlers are awaited in place, everything else (blocking route
+    handlers, static files) runs on the executor.
+
+    :param ip (str): IP address of the server.
+    :param port (int): Port number the server is listening on.
+    :param reader (asyncio.StreamReader): client stream reader.
+    :param writer (asyncio.StreamWriter): client stream writer.
+    :param routes (dict): Dictionary of route handlers.
+    :param executor (ThreadPoolExecutor): executor for blocking handlers.
+    :param slots (asyncio.Semaphore): admission counter of the executor jobs.
+    :param settings (dict): ``keepalive_timeout`` and ``max_requests`` of the adapter.
+    """
+    addr = writer.get_extra_info("peername")
+    adapter = HttpAdapter(ip, port, writer.get_extra_info("socket"), addr, routes, **settings)
+    loop = asyncio.get_running_loop()
+
+    try:
+        served = 0
+        while served < adapter.max_requests:
+            adapter.request = Request()
+            adapter.response = Response()
+            timeout = adapter.keepalive_timeout if served else READ_TIMEOUT
+            try:
+                if not await read_request(reader, adapter, timeout):
+                    break
+            except ParseError as e:
+                print("[Backend] Refusing request from {}: {}".format(addr, e))
+                writer.write(adapter.response.build_rejected(e.status, e.reason))
+                await writer.drain()
+                break
+            served += 1
+
+            req = adapter.request
+            if is_async_route(req):
+                result = adapter.dispatch(req)
+            elif slots.locked():
+                print("[Backend] Executor queue is full, shedding {}".format(addr))
+                adapter.framed = False
+                result = adapter.response.build_service_unavailable()
+            else:
+                async with slots:
+                    result = await loop.run_in_executor(executor, adapter.dispatch, req)
+
+            if inspect.isawaitable(result):
+                result = await adapter.resolve_hook(result)
+            result = adapter.encode_response(req, result)
+            result = adapter.strip_body(req, result)
+
+            result, keep_alive = adapter.prepare_connection(req, result, served)
+            await send_response(writer, result)
+            if not keep_alive:
+                break
+    except (ConnectionError, OSError) as e:
+        print("[Backend] Connection error on {}: {}".format(addr, e))
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+async def serve(ip, port, routes, pool_size, queue_size, settings):
+    """
+    Creates the asyncio server and serves until cancelled.
+
+    :param ip (str): IP address to bind the server.
+    :param port (int): Port number to listen on.
+    :param routes (dict): Dictionary of route handlers.
+    :param pool_size (int): Number of executor threads for blocking handlers.
+    :param queue_size (int): Number of blocking requests allowed to wait for the executor.
+    :param settings (dict): ``keepalive_timeout`` and ``max_requests`` of the connections.
+    """
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="backend-executor")
+    slots = asyncio.Semaphore(pool_size + queue_size)
+
+    async def on_connect(reader, writer):
+        await handle_client_async(ip, port, reader, writer, routes, executor, slots, settings)
+
+    server = await asyncio.start_server(on_connect, ip, port, backlog=BACKLOG)
+    print("[Backend] Listening on port {} (asyncio mode)".format(port))
+    if routes != {}:
+        print("[Backend] route settings {}".format(routes))
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False)
+
+def run_backend_async(ip, port, routes, pool_size=POOL_SIZE, queue_size=QUEUE_SIZE,
+                      keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_REQUESTS):
+    """
+    Starts the asyncio backend server and runs its event loop in the calling thread.
+
+    :param ip (str): IP address to bind the server.
+    :param port (int): Port number to listen on.
+    :param routes (dict): Dictionary of route handlers.
+    :param pool_size (int): Number of executor threads for blocking handlers.
+    :param queue_size (int): Number of blocking requests allowed to wait for the executor.
+    :param keepalive_timeout (int): idle seconds before a persistent connection is closed.
+    :param max_requests (int): requests served per connection before it is closed.
+    """
+    settings = {"keepalive_timeout": keepalive_timeout, "max_requests": max_requests}
+    try:
+        asyncio.run(serve(ip, port, routes, pool_size, queue_size, settings))
+    except OSError as e:
+        print("Socket error: {}".format(e))
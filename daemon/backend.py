@@ -31,24 +31,51 @@ Requirements:
 Notes:
 ------
 - The server create daemon threads for client handling.
+- In the ``pool`` mode a fixed number of worker threads consume accepted
+  connections from a bounded queue, connections arriving while the queue
+  is full are shed with a ``503 Service Unavailable`` response.
+- In the ``pool`` mode a persistent connection holds a worker only while a
+  request is being served. Between two requests it is parked on a selector
+  and queued again once its next request arrives, see :func:`park_loop`.
+- The ``asyncio`` mode is served by :mod:`daemon.asyncbackend`.
+- Connections are persistent (HTTP/1.1 keep-alive) up to ``keepalive_timeout``
+  idle seconds and ``max_requests`` requests, see :class:`HttpAdapter <HttpAdapter>`.
 - The current implementation error handling is minimal, socket errors are printed to the console.
 - The actual request processing is delegated to the HttpAdapter class.
 
 Usage Example:
 --------------
 >>> create_backend("127.0.0.1", 9000, routes={})
+>>> create_backend("127.0.0.1", 9000, routes={}, mode="pool", pool_size=16, queue_size=64)
 
 """
 
 import socket
 import threading
 import argparse
+import queue
+import selectors
+import time
 
 from .response import *
-from .httpadapter import HttpAdapter
+from .httpadapter import HttpAdapter, KEEPALIVE_TIMEOUT, MAX_REQUESTS
 from .dictionary import CaseInsensitiveDict
 
-def handle_client(ip, port, conn, addr, routes):
+#: Default number of worker threads in the ``pool`` concurrency mode.
+POOL_SIZE = 32
+
+#: Default depth of the accept queue in the ``pool`` concurrency mode.
+QUEUE_SIZE = 128
+
+#: Supported concurrency modes of the backend.
+MODES = ("thread", "pool", "asyncio")
+
+#: Seconds between two sweeps of the parked connections for expired ones.
+PARK_SWEEP = 1
+
+def handle_client(ip, port, conn, addr, routes,
+                  keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_REQUESTS,
+                  parser=None, served=0, park=None):
     """
     Initializes an HttpAdapter instance and delegates the client handling logic to it.
 
@@ -57,51 +84,247 @@ def handle_client(ip, port, conn, addr, routes):
     :param conn (socket.socket): Client connection socket.
     :param addr (tuple): client address (IP, port).
     :param routes (dict): Dictionary of route handlers.
+    :param keepalive_timeout (int): idle seconds before a persistent connection is closed.
+    :param max_requests (int): requests served per connection before it is closed.
+    :param parser (RequestParser): parser of a resumed persistent connection.
+    :param served (int): requests already served on a resumed connection.
+    :param park (callable): receives the connection once it is idle, see
+                            :meth:`HttpAdapter.handle_client <HttpAdapter.handle_client>`.
     """
-    daemon = HttpAdapter(ip, port, conn, addr, routes)
+    daemon = HttpAdapter(ip, port, conn, addr, routes, keepalive_timeout, max_requests)
 
     # Handle client
-    daemon.handle_client(conn, addr, routes)
+    daemon.handle_client(conn, addr, routes, parser, served, park)
+
+def worker_loop(ip, port, tasks, routes, settings, park):
+    """
+    Worker routine of the ``pool`` mode. It takes connections from the shared
+    queue and handles them one at a time with :func:`handle_client`, new ones
+    from the accept loop and persistent ones whose next request has arrived.
+    An idle persistent connection is handed to ``park`` and frees the worker.
+
+    :param ip (str): IP address of the server.
+    :param port (int): Port number the server is listening on.
+    :param tasks (queue.Queue): bounded queue of ``(conn, addr, parser, served)`` tuples.
+    :param routes (dict): Dictionary of route handlers.
+    :param settings (dict): connection settings passed to :func:`handle_client`.
+    :param park (callable): parks an idle connection, see :func:`start_parking`.
+    """
+    while True:
+        conn, addr, parser, served = tasks.get()
+        try:
+            handle_client(ip, port, conn, addr, routes, parser=parser, served=served,
+                          park=park, **settings)
+        except Exception as e:
+            print("[Backend] Worker error on {}: {}".format(addr, e))
+            try:
+                conn.close()
+            except Exception:
+                pass
+        finally:
+            tasks.task_done()
 
-def run_backend(ip, port, routes):
+def shed_client(conn, addr):
+    """
+    Rejects a connection that does not fit into the accept queue with a
+    ``503 Service Unavailable`` response and closes it.
+
+    The pending request bytes are drained without blocking so that closing
+    the socket does not reset the connection before the client reads the
+    response.
+
+    :param conn (socket.socket): Client connection socket.
+    :param addr (tuple): client address (IP, port).
+    """
+    print("[Backend] Queue is full, shedding {}".format(addr))
+    try:
+        conn.setblocking(False)
+        try:
+            conn.recv(4096)
+        except (BlockingIOError, socket.error):
+            pass
+        conn.setblocking(True)
+        conn.sendall(Response().build_service_unavailable())
+        conn.shutdown(socket.SHUT_WR)
+    except socket.error:
+        pass
+    finally:
+        conn.close()
+
+def park_loop(tasks, parked, wakeup, keepalive_timeout):
+    """
+    Waits on the idle persistent connections of the ``pool`` mode with a
+    selector. A connection is queued to the workers again as soon as it is
+    readable, shed with ``503`` if the queue is full, and closed once it has
+    been idle for ``keepalive_timeout`` seconds.
+
+    :param tasks (queue.Queue): queue feeding the workers.
+    :param parked (queue.SimpleQueue): connections handed over by the workers.
+    :param wakeup (socket.socket): read end signalled when ``parked`` gets an entry.
+    :param keepalive_timeout (int): idle seconds before a parked connection is closed.
+    """
+    selector = selectors.DefaultSelector()
+    wakeup.setblocking(False)
+    selector.register(wakeup, selectors.EVENT_READ, None)
+    last_sweep = time.monotonic()
+    while True:
+        for key, mask in selector.select(PARK_SWEEP):
+            if key.data is None:
+                try:
+                    wakeup.recv(4096)
+                except (BlockingIOError, InterruptedError):
+                    pass
+                deadline = time.monotonic() + keepalive_timeout
+                while True:
+                    try:
+                        item = parked.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        selector.register(item[0], selectors.EVENT_READ, (item, deadline))
+                    except (ValueError, OSError):
+                        item[0].close()
+                continue
+            selector.unregister(key.fileobj)
+            item = key.data[0]
+            try:
+                tasks.put_nowait(item)
+            except queue.Full:
+                shed_client(item[0], item[1])
+
+        now = time.monotonic()
+        if now - last_sweep < PARK_SWEEP:
+            continue
+        last_sweep = now
+        for key in list(selector.get_map().values()):
+            if key.data is not None and key.data[1] <= now:
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+
+def start_parking(tasks, settings):
+    """
+    Starts the :func:`park_loop` thread of the ``pool`` mode.
+
+    :param tasks (queue.Queue): queue feeding the workers.
+    :param settings (dict): connection settings, ``keepalive_timeout`` bounds the parking.
+
+    :rtype callable: ``park(conn, addr, parser, served)`` used by the workers.
+    """
+    parked = queue.SimpleQueue()
+    wakeup = socket.socketpair()
+    thread = threading.Thread(target=park_loop,
+                              args=(tasks, parked, wakeup[0], settings["keepalive_timeout"]),
+                              name="backend-parking")
+    thread.daemon = True
+    thread.start()
+
+    def park(conn, addr, parser, served):
+        parked.put((conn, addr, parser, served))
+        wakeup[1].send(b"\0")
+
+    return park
+
+def start_workers(ip, port, routes, pool_size, queue_size, settings):
+    """
+    Creates the bounded accept queue, spawns the fixed-size worker pool
+    serving it and the thread parking their idle persistent connections.
+
+    :param ip (str): IP address of the server.
+    :param port (int): Port number the server is listening on.
+    :param routes (dict): Dictionary of route handlers.
+    :param pool_size (int): Number of worker threads.
+    :param queue_size (int): Maximum number of accepted connections waiting for a worker.
+    :param settings (dict): connection settings passed to :func:`handle_client`.
+
+    :rtype queue.Queue: the queue feeding the workers.
+    """
+    tasks = queue.Queue(maxsize=queue_size)
+    park = start_parking(tasks, settings)
+    for i in range(pool_size):
+        worker = threading.Thread(target=worker_loop,
+                                  args=(ip, port, tasks, routes, settings, park),
+                                  name="backend-worker-{}".format(i))
+        worker.daemon = True
+        worker.start()
+    print("[Backend] Worker pool of {} threads, queue depth {}".format(pool_size, queue_size))
+    return tasks
+
+def run_backend(ip, port, routes, mode="thread", pool_size=POOL_SIZE, queue_size=QUEUE_SIZE,
+                keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_REQUESTS):
     """
     Starts the backend server, binds to the specified IP and port, and listens for incoming
-    connections. Each connection is handled in a separate thread. The backend accepts incoming
-    connections and spawns a thread for each client.
+    connections. In the ``thread`` mode each connection is handled in a separate thread.
+    In the ``pool`` mode the connections are queued to a fixed number of worker threads
+    and shed with ``503`` once the queue is full.
 
 
     :param ip (str): IP address to bind the server.
     :param port (int): Port number to listen on.
     :param routes (dict): Dictionary of route handlers.
+    :param mode (str): concurrency mode, ``thread`` or ``pool``.
+    :param pool_size (int): Number of worker threads in the ``pool`` mode.
+    :param queue_size (int): Depth of the accept queue in the ``pool`` mode.
+    :param keepalive_timeout (int): idle seconds before a persistent connection is closed.
+    :param max_requests (int): requests served per connection before it is closed.
     """
+    if mode not in ("thread", "pool"):
+        raise ValueError("Invalid backend mode: {}".format(mode))
+
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     try:
         server.bind((ip, port))
         server.listen(50)
-        print("[Backend] Listening on port {}".format(port))
+        print("[Backend] Listening on port {} ({} mode)".format(port, mode))
         if routes != {}:
             print("[Backend] route settings {}".format(routes))
 
+        settings = {"keepalive_timeout": keepalive_timeout, "max_requests": max_requests}
+        tasks = None
+        if mode == "pool":
+            tasks = start_workers(ip, port, routes, pool_size, queue_size, settings)
+
         while True:
             conn, addr = server.accept()
+            if tasks is not None:
+                try:
+                    tasks.put_nowait((conn, addr, None, 0))
+                except queue.Full:
+                    shed_client(conn, addr)
+                continue
             #
             #  TODO: implement the step of the client incomping connection
             #        using multi-thread programming with the
             #        provided handle_client routine
             #
-            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes))
+            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes),
+                                             kwargs=settings)
             client_thread.start()
     except socket.error as e:
       print("Socket error: {}".format(e))
 
-def create_backend(ip, port, routes={}):
+def create_backend(ip, port, routes={}, mode="thread", **options):
     """
     Entry point for creating and running the backend server.
 
     :param ip (str): IP address to bind the server.
     :param port (int): Port number to listen on.
     :param routes (dict, optional): Dictionary of route handlers. Defaults to empty dict.
+    :param mode (str, optional): concurrency mode, ``thread`` (default), ``pool``
+                                 or ``asyncio``.
+    :param options: mode settings forwarded to :func:`run_backend` or
+                    :func:`run_backend_async <daemon.asyncbackend.run_backend_async>`
+                    (``pool_size``, ``queue_size``, ``keepalive_timeout``, ``max_requests``).
+
+    In the ``pool`` mode idle keep-alive connections are handed back to a
+    selector between requests rather than held by a worker, so ``pool_size``
+    bounds the requests in progress, not the open connections, and
+    ``keepalive_timeout``/``max_requests`` keep their values for every mode.
     """
 
-    run_backend(ip, port, routes)
\ No newline at end of file
+    if mode == "asyncio":
+        from .asyncbackend import run_backend_async
+        run_backend_async(ip, port, routes, **options)
+        return
+
+    run_backend(ip, port, routes, mode, **options)
\ No newline at end of file
@@ -0,0 +1,316 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.balancer
+~~~~~~~~~~~~~~~~~
+
+This module provides the load balancing policies of the proxy. Each virtual host
+owns a :class:`Balancer <Balancer>` holding its backends and their counters, so
+the selection for one host never waits on the traffic of another.
+
+Policies (``dist_policy`` in ``config/proxy.conf``):
+-----------------------------------------------------
+- round-robin: backends in turn, with a lock-free counter.
+- weighted: smooth weighted round-robin over the ``weight=`` of each ``proxy_pass``.
+- least-conn: the backend with the fewest requests in flight (relative to its weight).
+- ewma-latency: the better of two random backends, scored by the moving average
+  of their response time times their requests in flight.
+- ip-hash: consistent hashing of the client address on a ring of virtual nodes,
+  a client sticks to its backend and only 1/N of the clients move when a backend
+  is added or removed.
+
+Health:
+-------
+A backend failing ``max_fails`` requests in a row is ejected for ``fail_timeout``
+seconds, and a backend failing its active probe (see :mod:`daemon.health`) is left
+out until a probe succeeds again. The policies only choose among the healthy
+backends, or among all of them when none is healthy.
+
+Usage Example:
+--------------
+>>> balancer = get_balancer("app2.local", routes)
+>>> backend = balancer.select(client_ip="10.0.0.7")
+>>> with balancer.track(backend):
+>>>     forward_request(backend.host, backend.port, request)
+
+"""
+
+import bisect
+import hashlib
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+#: Smoothing factor of the response time moving average.
+EWMA_ALPHA = 0.3
+
+#: Virtual nodes of a weight-1 backend on the consistent hash ring.
+HASH_REPLICAS = 100
+
+#: Backend used when a host maps to an empty list of proxy_pass.
+DEFAULT_BACKEND = "127.0.0.1:9000"
+
+#: Consecutive failed requests that eject a backend.
+MAX_FAILS = 3
+
+#: Seconds an ejected backend is left out of the selection.
+FAIL_TIMEOUT = 10
+
+class Backend:
+    """A backend server of a virtual host and its balancing counters."""
+
+    __attrs__ = [
+        "host",
+        "port",
+        "weight",
+        "inflight",
+        "ewma",
+        "failures",
+        "ejected_until",
+        "probe_ok",
+    ]
+
+    def __init__(self, address, weight=1):
+        host, port = address.split(":", 1)
+        #: IP address of the backend.
+        self.host = host
+        #: Port of the backend.
+        self.port = int(port)
+        #: Relative capacity declared with ``weight=`` in proxy.conf.
+        self.weight = max(1, int(weight))
+        #: Requests currently forwarded to the backend.
+        self.inflight = 0
+        #: Moving average of the response time in seconds.
+        self.ewma = 0.0
+        #: Current weight of the smooth weighted round-robin.
+        self.current = 0
+        #: Consecutive failed requests.
+        self.failures = 0
+        #: Monotonic time until which the backend is ejected.
+        self.ejected_until = 0.0
+        #: Result of the last active probe.
+        self.probe_ok = True
+
+    @property
+    def address(self):
+        return "{}:{}".format(self.host, self.port)
+
+    def available(self, now):
+        """Returns True if the backend is neither ejected nor failing its probe."""
+        return self.probe_ok and now >= self.ejected_until
+
+    def __repr__(self):
+        return "<Backend {} weight={}>".format(self.address, self.weight)
+
+class Balancer:
+    """The :class:`Balancer <Balancer>` object selects the backend of each request
+    of one virtual host according to its policy.
+
+    The ``inflight`` counters and the weighted round-robin state are updated under
+    the balancer's own lock, the other policies select without locking.
+    """
+
+    def __init__(self, backends, policy="round-robin", max_fails=MAX_FAILS,
+                 fail_timeout=FAIL_TIMEOUT, health_check=None):
+        if policy not in POLICIES:
+            print("[Balancer] Unknown dist_policy {}, using round-robin".format(policy))
+            policy = "round-robin"
+        self.backends = backends
+        self.policy = policy
+        self._select = POLICIES[policy]
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._ring = build_ring(backends) if policy in ("ip-hash", "consistent-hash") else None
+        #: Failed requests in a row that eject a backend.
+        self.max_fails = max_fails
+        #: Seconds a backend stays ejected.
+        self.fail_timeout = fail_timeout
+        #: Active probe settings ``{"path", "interval", "timeout"}`` or None.
+        self.health_check = health_check
+
+    def select(self, client_ip=None, exclude=()):
+        """
+        Selects the backend of a request among the healthy backends.
+
+        :param client_ip (str): address of the client, used by ``ip-hash``.
+        :param exclude (set): backends already tried for this request.
+
+        :rtype Backend: the selected backend, None if every backend was tried.
+        """
+        if len(self.backends) == 1 and not exclude:
+            return self.backends[0]
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not candidates:
+            # Fail open: a probably dead backend beats no backend at all
+            candidates = [b for b in self.backends if b not in exclude]
+            if not candidates:
+                return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return self._select(self, candidates, client_ip)
+
+    def mark_success(self, backend):
+        """Resets the failure count of a backend after a successful request."""
+        backend.failures = 0
+
+    def mark_failure(self, backend):
+        """
+        Counts a failed request (connection refused, reset or timed out) and
+        ejects the backend for ``fail_timeout`` seconds after ``max_fails`` in a row.
+        """
+        with self._lock:
+            backend.failures += 1
+            if backend.failures >= self.max_fails:
+                backend.failures = 0
+                backend.ejected_until = time.monotonic() + self.fail_timeout
+                print("[Balancer] Backend {} ejected for {}s".format(backend.address, self.fail_timeout))
+
+    @contextmanager
+    def track(self, backend):
+        """
+        Counts a request in flight on a backend and feeds its response time
+        to the moving average once the block exits.
+        """
+        with self._lock:
+            backend.inflight += 1
+        started = time.monotonic()
+        try:
+            yield backend
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                backend.inflight -= 1
+            backend.ewma += EWMA_ALPHA * (elapsed - backend.ewma)
+
+def select_round_robin(balancer, candidates, client_ip):
+    return candidates[next(balancer._counter) % len(candidates)]
+
+def select_weighted(balancer, candidates, client_ip):
+    # Smooth weighted round-robin: spreads a heavy backend between the others
+    # instead of sending it a burst of consecutive requests.
+    with balancer._lock:
+        total = 0
+        best = None
+        for backend in candidates:
+            backend.current += backend.weight
+            total += backend.weight
+            if best is None or backend.current > best.current:
+                best = backend
+        best.current -= total
+        return best
+
+def select_least_conn(balancer, candidates, client_ip):
+    start = next(balancer._counter)
+    count = len(candidates)
+    # Rotating the start breaks ties in turn instead of always on the first backend
+    rotated = [candidates[(start + i) % count] for i in range(count)]
+    return min(rotated, key=lambda b: b.inflight / b.weight)
+
+def select_ewma(balancer, candidates, client_ip):
+    first, second = random.sample(candidates, 2)
+    score = lambda b: (b.ewma or 1e-6) * (b.inflight + 1) / b.weight
+    return first if score(first) <= score(second) else second
+
+def select_ip_hash(balancer, candidates, client_ip):
+    if client_ip is None:
+        return select_round_robin(balancer, candidates, client_ip)
+    keys, owners = balancer._ring
+    index = bisect.bisect(keys, hash_key(client_ip))
+    # Walk the ring clockwise to the first node of a selectable backend
+    for step in range(len(keys)):
+        owner = owners[(index + step) % len(keys)]
+        if owner in candidates:
+            return owner
+    return candidates[0]
+
+def hash_key(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+def build_ring(backends):
+    """
+    Builds the consistent hash ring of the backends, ``HASH_REPLICAS`` virtual
+    nodes per unit of weight.
+
+    :rtype tuple: (sorted node keys, backend owning each key).
+    """
+    nodes = []
+    for backend in backends:
+        for i in range(HASH_REPLICAS * backend.weight):
+            nodes.append((hash_key("{}#{}".format(backend.address, i)), backend))
+    nodes.sort(key=lambda node: node[0])
+    return [key for key, _ in nodes], [backend for _, backend in nodes]
+
+#: Selection function of each dist_policy.
+POLICIES = {
+    "round-robin": select_round_robin,
+    "weighted": select_weighted,
+    "least-conn": select_least_conn,
+    "ewma-latency": select_ewma,
+    "ip-hash": select_ip_hash,
+    "consistent-hash": select_ip_hash,
+}
+
+'''Balancer of each virtual host, created on its first request'''
+balancers = {}
+balancers_lock = threading.Lock()
+
+def build_balancer(entry):
+    """
+    Creates the balancer of a routes entry ``(proxy_map, policy[, options])``
+    where ``proxy_map`` is one ``"ip:port"`` or a list of them. The options
+    hold the ``weights`` of the addresses, the ``max_fails``/``fail_timeout``
+    of the passive checks and the ``health_check`` probe settings.
+
+    :rtype Balancer: the balancer of the entry.
+    """
+    proxy_map, policy = entry[0], entry[1]
+    options = entry[2] if len(entry) > 2 else {}
+    weights = options.get("weights", {})
+
+    if not isinstance(proxy_map, list):
+        proxy_map = [proxy_map]
+    if len(proxy_map) == 0:
+        # TODO: implement the error handling for non mapped host
+        #       the policy is design by team, but it can be
+        #       basic default host in your self-defined system
+        # Use a dummy host to raise an invalid connection
+        proxy_map = [DEFAULT_BACKEND]
+
+    backends = [Backend(address, weights.get(address, 1)) for address in proxy_map]
+    return Balancer(backends, policy,
+                    max_fails=options.get("max_fails", MAX_FAILS),
+                    fail_timeout=options.get("fail_timeout", FAIL_TIMEOUT),
+                    health_check=options.get("health_check"))
+
+def get_balancer(hostname, routes):
+    """
+    Returns the balancer of a virtual host, creating it on first use.
+
+    :params hostname (str): Host header of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+
+    :rtype Balancer: the balancer of the host.
+    """
+    name = hostname.split(":")[0]
+    key = (id(routes), name)
+    balancer = balancers.get(key)
+    if balancer is None:
+        with balancers_lock:
+            balancer = balancers.get(key)
+            if balancer is None:
+                entry = routes.get(name, (DEFAULT_BACKEND, 'round-robin'))
+                balancer = balancers[key] = build_balancer(entry)
+    return balancer
@@ -0,0 +1,390 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.cache
+~~~~~~~~~~~~~~~~~
+
+This module provides the HTTP response cache of the proxy. Responses are keyed
+by host, method and request target, with one variant per value of the request
+headers named in their ``Vary`` header.
+
+Caching rules:
+--------------
+- Only GET and HEAD responses with status 200, 203, 301, 404 or 410 and no
+  ``Set-Cookie`` are stored, and never with ``no-store``, ``private`` or ``Vary: *``.
+- A request with credentials is never answered from the cache. Its response
+  is only stored when it is explicitly shared: with ``public``, ``s-maxage`` or
+  ``must-revalidate`` for ``Authorization``, with ``public`` for ``Cookie``.
+- Freshness comes from ``s-maxage``/``max-age`` or ``Expires``. A stale entry, or
+  one stored with ``no-cache``, is revalidated with ``If-None-Match`` /
+  ``If-Modified-Since`` and served again on ``304 Not Modified``.
+- Concurrent misses on the same key are coalesced: one request goes to the
+  backend while the others wait for its response.
+- Entries are evicted least recently used first above ``max_bytes``. With a
+  ``disk_dir`` every stored entry is also written to disk and reloaded on a
+  memory miss.
+
+Usage Example:
+--------------
+>>> cache = ResponseCache(max_bytes=64 * 1024 * 1024)
+>>> response = cache.fetch("app1.local", "GET", "/styles.css", headers, forward)
+>>> cache.stats()
+{'hits': 12, 'misses': 3, 'revalidated': 1, 'stores': 3, 'evictions': 0, ...}
+
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+from .utils import get_header, update_headers, status_code_of
+
+#: Bytes of responses kept in memory.
+MAX_BYTES = 64 * 1024 * 1024
+
+#: Largest response stored in the cache.
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+#: Seconds a coalesced request waits for the response of the leading one.
+FLIGHT_TIMEOUT = 10
+
+#: Methods whose responses may be stored.
+CACHEABLE_METHODS = ("GET", "HEAD")
+
+#: Status codes whose responses may be stored.
+CACHEABLE_STATUS = (200, 203, 301, 404, 410)
+
+def parse_cache_control(value):
+    """
+    Parses a Cache-Control header.
+
+    :rtype dict: lower-case directive -> value (None for valueless directives).
+    """
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+def credentials_of(headers):
+    """
+    :param headers (dict): lower-case request headers.
+
+    :rtype str: ``"authorization"`` or ``"cookie"`` for a request carrying
+                credentials, else None.
+    """
+    if headers.get("authorization"):
+        return "authorization"
+    if headers.get("cookie"):
+        return "cookie"
+    return None
+
+def shareable(directives, credentials):
+    """
+    Tells whether a response to a request with ``credentials`` may be stored
+    in a shared cache.
+
+    :param directives (dict): Cache-Control directives of the response.
+    :param credentials (str): result of :func:`credentials_of`.
+    """
+    if credentials == "authorization":
+        return any(name in directives for name in ("public", "s-maxage", "must-revalidate"))
+    if credentials == "cookie":
+        return "public" in directives
+    return True
+
+def expiry_of(response, now):
+    """
+    Computes the expiry time of a response from its Cache-Control or Expires header.
+
+    :rtype float: epoch time until which the response is fresh.
+    """
+    directives = parse_cache_control(get_header(response, "cache-control"))
+    if "no-cache" in directives:
+        return now
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name):
+            try:
+                return now + int(directives[name])
+            except ValueError:
+                return now
+    expires = get_header(response, "expires")
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return now
+    return now
+
+class CacheEntry:
+    """A stored response and the request header values it varies on."""
+
+    __attrs__ = [
+        "response",
+        "vary",
+        "stored",
+        "expires",
+        "etag",
+        "last_modified",
+    ]
+
+    def __init__(self, response, vary, now):
+        #: Raw HTTP response.
+        self.response = response
+        #: Request header name -> value the response was selected by.
+        self.vary = vary
+        #: Epoch time the response was stored or last revalidated.
+        self.stored = now
+        #: Epoch time until which the response is fresh.
+        self.expires = expiry_of(response, now)
+        #: Validators for the conditional requests.
+        self.etag = get_header(response, "etag")
+        self.last_modified = get_header(response, "last-modified")
+
+    @property
+    def size(self):
+        return len(self.response)
+
+    def fresh(self, now):
+        return now < self.expires
+
+    def matches(self, headers):
+        return all(headers.get(name, "") == value for name, value in self.vary.items())
+
+    def serve(self, now, status="HIT"):
+        return update_headers(self.response, {
+            "Age": str(int(now - self.stored)),
+            "X-Cache": status,
+        })
+
+class ResponseCache:
+    """The :class:`ResponseCache <ResponseCache>` object stores backend responses
+    in memory, least recently used first out, optionally backed by a directory.
+
+    The hit/miss counters are available through :meth:`stats`.
+    """
+
+    __attrs__ = [
+        "max_bytes",
+        "max_entry_bytes",
+        "disk_dir",
+        "hits",
+        "misses",
+        "revalidated",
+        "stores",
+        "evictions",
+    ]
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entry_bytes=MAX_ENTRY_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Returns the counters and the current size of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": sum(len(v) for v in self._entries.values()),
+                "bytes": self._size,
+            }
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, name + ".cache")
+
+    def _load(self, key):
+        """Loads the variants of a key from disk into memory, lock held."""
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                variants = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+        self._entries[key] = variants
+        self._size += sum(entry.size for entry in variants)
+        self._shrink()
+        return variants
+
+    def _save(self, key, variants):
+        """Writes the variants of a key to disk, lock held."""
+        path = self._disk_path(key)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(variants, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print("[Cache] Cannot write {}: {}".format(path, e))
+
+    def _shrink(self):
+        """Evicts least recently used keys until the cache fits ``max_bytes``, lock held."""
+        while self._size > self.max_bytes and self._entries:
+            _, variants = self._entries.popitem(last=False)
+            self._size -= sum(entry.size for entry in variants)
+            self.evictions += len(variants)
+
+    def lookup(self, key, headers):
+        """
+        Returns the stored variant of a key matching the request headers.
+
+        :param key (tuple): (host, method, target).
+        :param headers (dict): lower-case request headers.
+
+        :rtype CacheEntry: the matching entry, None on miss.
+        """
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is None and self.disk_dir:
+                variants = self._load(key)
+            if variants is None:
+                return None
+            self._entries.move_to_end(key)
+            for entry in variants:
+                if entry.matches(headers):
+                    return entry
+            return None
+
+    def store(self, key, headers, response):
+        """
+        Stores a backend response if it is cacheable.
+
+        :param key (tuple): (host, method, target).
+        :param headers (dict): lower-case request headers.
+        :param response (bytes): raw HTTP response.
+
+        :rtype bool: True if the response was stored.
+        """
+        if key[1] not in CACHEABLE_METHODS or status_code_of(response) not in CACHEABLE_STATUS:
+            return False
+        if len(response) > self.max_entry_bytes or get_header(response, "set-cookie"):
+            return False
+        directives = parse_cache_control(get_header(response, "cache-control"))
+        if "no-store" in directives or "private" in directives:
+            return False
+        if not shareable(directives, credentials_of(headers)):
+            return False
+        vary_names = [name.strip().lower()
+                      for name in (get_header(response, "vary") or "").split(",") if name.strip()]
+        if "*" in vary_names:
+            return False
+
+        now = time.time()
+        entry = CacheEntry(response, {name: headers.get(name, "") for name in vary_names}, now)
+        if not entry.fresh(now) and not (entry.etag or entry.last_modified):
+            # Neither fresh nor revalidatable, storing it would never pay off
+            return False
+
+        with self._lock:
+            stored = self._entries.pop(key, [])
+            self._size -= sum(v.size for v in stored)
+            variants = [v for v in stored if v.vary != entry.vary] + [entry]
+            self._entries[key] = variants
+            self._size += sum(v.size for v in variants)
+            self.stores += 1
+            self._shrink()
+            if self.disk_dir:
+                self._save(key, variants)
+        return True
+
+    def fetch(self, host, method, target, headers, forward):
+        """
+        Serves a request from the cache, forwarding it to the backend on a miss
+        or to revalidate a stale entry.
+
+        :param host (str): Host header of the request.
+        :param method (str): request method.
+        :param target (str): request target (path and query).
+        :param headers (dict): lower-case request headers.
+        :param forward (callable): ``forward(extra_headers) -> bytes`` sends the
+                                   request with the extra headers to a backend.
+
+        :rtype bytes: raw HTTP response, with an ``X-Cache`` header.
+        """
+        key = (host.split(":")[0].lower(), method, target)
+        request_directives = parse_cache_control(headers.get("cache-control"))
+        if "no-store" in request_directives:
+            return forward({})
+        if credentials_of(headers):
+            # Another user's entry must not answer it, nor a flight be shared
+            response = forward({})
+            self.store(key, headers, response)
+            return update_headers(response, {"X-Cache": "BYPASS"})
+
+        leader = True
+        while True:
+            entry = self.lookup(key, headers)
+            now = time.time()
+            if entry is not None and entry.fresh(now) and "no-cache" not in request_directives:
+                with self._lock:
+                    self.hits += 1
+                return entry.serve(now)
+            if not leader:
+                break
+            with self._lock:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = threading.Event()
+            if leader:
+                break
+            # Another request is fetching this key, wait for it and look again
+            flight.wait(FLIGHT_TIMEOUT)
+
+        try:
+            conditional = {}
+            if entry is not None:
+                if entry.etag:
+                    conditional["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    conditional["If-Modified-Since"] = entry.last_modified
+            response = forward(conditional)
+
+            now = time.time()
+            if entry is not None and status_code_of(response) == 304:
+                # Still valid, take the new freshness from the 304 headers
+                with self._lock:
+                    self.revalidated += 1
+                    entry.stored = now
+                    entry.expires = expiry_of(response, now)
+                    if self.disk_dir:
+                        self._save(key, self._entries.get(key, [entry]))
+                return entry.serve(now, "REVALIDATED")
+
+            with self._lock:
+                self.misses += 1
+            self.store(key, headers, response)
+            return update_headers(response, {"X-Cache": "MISS"})
+        finally:
+            if leader:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                flight.set()
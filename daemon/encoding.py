@@ -0,0 +1,245 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.encoding
+~~~~~~~~~~~~~~~~~
+
+This module provides the ``Content-Encoding`` negotiation of the responses.
+The coding is chosen from the ``Accept-Encoding`` header of the request among
+``br`` and ``gzip``. Compressing to ``br`` needs the optional ``brotli``
+package, serving a precompressed ``.br`` file does not.
+
+- Static files use a precompressed sibling (``styles.css.gz``, ``styles.css.br``)
+  when one exists, otherwise they are compressed once, in a coding the server
+  can produce, and the result is kept in the static file cache
+  (see :meth:`StaticCache.encoded <daemon.assets.StaticCache.encoded>`).
+- Other responses (route handlers, ``/get-list`` JSON) are compressed on the fly
+  by :func:`encode_message` when their body is at least ``MIN_SIZE`` bytes.
+- Streamed bodies are compressed fragment by fragment by :func:`encode_stream`,
+  each fragment flushed so the client can decode it on arrival.
+
+Usage Example:
+--------------
+>>> acceptable_encodings("gzip;q=0.8, br")
+['br', 'gzip']
+>>> encode_message(raw_response, "gzip")
+
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .utils import get_header, update_headers, status_code_of
+
+#: Smallest body worth compressing, below it the headers outweigh the gain.
+MIN_SIZE = 1024
+
+#: Compression levels of the bodies compressed on every request.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+#: Compression levels of the static files, compressed once and cached.
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+#: File suffix of the precompressed sibling of each coding.
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+#: Codings negotiated for the static files, preferred first: a precompressed
+#: sibling is served whether or not the server could produce the coding.
+KNOWN_ENCODINGS = ("br", "gzip")
+
+#: Content types that compress well, images other than SVG are already compressed.
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "image/x-icon",
+)
+
+def supported_encodings():
+    """Returns the codings the server can produce, preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def can_compress(coding):
+    """Returns True if the server can compress a body to this coding."""
+    return coding in supported_encodings()
+
+def is_compressible(content_type):
+    """Returns True if a body of this Content-Type is worth compressing."""
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+def parse_accept_encoding(value):
+    """
+    Parses an Accept-Encoding header.
+
+    :rtype dict: lower-case coding -> quality value.
+    """
+    accepted = {}
+    for part in (value or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+def acceptable_encodings(value, codings=None):
+    """
+    Lists the codings a client accepts, best first: highest quality value,
+    then the server preference.
+
+    :param value (str): Accept-Encoding header of the request.
+    :param codings (tuple): codings on offer, preferred first, by default the
+                            ones the server can produce.
+
+    :rtype list: codings, empty when only ``identity`` is acceptable.
+    """
+    accepted = parse_accept_encoding(value)
+    ranked = []
+    for preference, coding in enumerate(codings or supported_encodings()):
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > 0:
+            ranked.append((-quality, preference, coding))
+    return [coding for _, _, coding in sorted(ranked)]
+
+def compress(data, coding, static=False):
+    """
+    Compresses a body.
+
+    :param data (bytes): the body.
+    :param coding (str): ``gzip`` or ``br``.
+    :param static (bool): use the slower, stronger levels of the cached static files.
+
+    :rtype bytes: the encoded body.
+    """
+    if coding == "br":
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so the ETag of a static variant, stable
+    return gzip.compress(data, STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+def encode_message(message, accept_encoding):
+    """
+    Compresses the body of a raw ``200 OK`` response when the client accepts
+    a supported coding and the body is compressible and large enough.
+
+    A response already carrying ``Content-Encoding``, or a ``Vary`` on
+    ``Accept-Encoding`` set by a builder that negotiated itself, is left as is.
+
+    :param message (bytes): raw HTTP response.
+    :param accept_encoding (str): Accept-Encoding header of the request.
+
+    :rtype bytes: the raw HTTP response, possibly encoded.
+    """
+    if status_code_of(message) != 200 or get_header(message, "content-encoding"):
+        return message
+    if "accept-encoding" in (get_header(message, "vary") or "").lower():
+        return message
+    if not is_compressible(get_header(message, "content-type")):
+        return message
+    length = get_header(message, "content-length")
+    end = message.find(b"\r\n\r\n")
+    body = message[end + 4:]
+    if length is None or end == -1 or len(body) < MIN_SIZE or str(len(body)) != length.strip():
+        return message
+
+    vary = get_header(message, "vary")
+    headers = {"Vary": "{}, Accept-Encoding".format(vary) if vary else "Accept-Encoding"}
+    codings = acceptable_encodings(accept_encoding)
+    if not codings:
+        return update_headers(message, headers)
+
+    encoded = compress(body, codings[0])
+    if len(encoded) >= len(body):
+        return update_headers(message, headers)
+    headers["Content-Encoding"] = codings[0]
+    headers["Content-Length"] = str(len(encoded))
+    return update_headers(message[:end + 4], headers) + encoded
+
+class StreamEncoder:
+    """Compresses a body fragment by fragment, flushing after each one."""
+
+    def __init__(self, coding):
+        self.coding = coding
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def encode(self, data):
+        """Returns the compressed bytes of a fragment, decodable on their own."""
+        if self.coding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """Returns the end of the compressed stream."""
+        if self.coding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def encode_stream(fragments, coding):
+    """
+    Compresses a streamed body.
+
+    :param fragments (iterable): fragments of the body, ``bytes`` or ``str``,
+                                 or an asynchronous iterable of them.
+    :param coding (str): ``gzip`` or ``br``.
+
+    :rtype iterable: the compressed fragments, asynchronous if ``fragments`` is.
+    """
+    if hasattr(fragments, "__aiter__"):
+        return _encode_async(fragments, StreamEncoder(coding))
+    return _encode(fragments, StreamEncoder(coding))
+
+def _encode(fragments, encoder):
+    try:
+        for fragment in fragments:
+            if isinstance(fragment, str):
+                fragment = fragment.encode("utf-8")
+            if fragment:
+                yield encoder.encode(fragment)
+        yield encoder.finish()
+    finally:
+        close = getattr(fragments, "close", None)
+        if close is not None:
+            close()
+
+async def _encode_async(fragments, encoder):
+    try:
+        async for fragment in fragments:
+            if isinstance(fragment, str):
+                fragment = fragment.encode("utf-8")
+            if fragment:
+                yield encoder.encode(fragment)
+        yield encoder.finish()
+    finally:
+        aclose = getattr(fragments, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,234 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.feed
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`ChangeFeed <ChangeFeed>`: a dictionary whose
+every change bumps a version number and is kept in a bounded log, so a client
+holding a version can ask for the changes since it instead of the whole
+dictionary, or wait for the next ones.
+
+Subscribers are ``async`` generators (see :meth:`ChangeFeed.subscribe`): they
+wait on the event loop of the asyncio engine, or on the private loop of a
+threaded engine, and are woken up by a change made on any thread.
+
+Notes:
+------
+- A version older than the log (``HISTORY`` changes) gets a snapshot instead
+  of the changes.
+- A feed created with a time-based ``version`` (e.g. milliseconds since the
+  epoch) never reuses the versions of a previous process, so the cursors kept
+  by clients across a restart get a snapshot rather than a wrong delta.
+- :func:`format_event` frames a change as a ``text/event-stream`` event for
+  Server-Sent Events clients.
+
+Usage Example:
+--------------
+>>> feed = ChangeFeed()
+>>> feed.set("alice", {"ip": "127.0.0.1", "port": 9001})
+1
+>>> feed.changes(0)
+(1, [(1, 'set', 'alice', {'ip': '127.0.0.1', 'port': 9001})])
+
+"""
+
+import asyncio
+import json
+import threading
+from bisect import bisect_right
+from collections import deque
+
+#: Changes kept in the log.
+HISTORY = 1024
+
+#: Seconds between two heartbeats of an idle subscription.
+HEARTBEAT = 15
+
+def format_event(event, data, version=None):
+    """
+    Formats a Server-Sent Event.
+
+    :param event (str): event name.
+    :param data (dict): event payload, sent as JSON.
+    :param version (int): event id, sent back by the client in ``Last-Event-ID``.
+
+    :rtype str: the event, ended by an empty line.
+    """
+    lines = ["event: {}".format(event)]
+    if version is not None:
+        lines.append("id: {}".format(version))
+    lines.append("data: {}".format(json.dumps(data)))
+    return "\n".join(lines) + "\n\n"
+
+class ChangeFeed:
+    """The :class:`ChangeFeed <ChangeFeed>` object holds a versioned dictionary
+    and the log of its changes.
+    """
+
+    __attrs__ = [
+        "items",
+        "version",
+        "history",
+    ]
+
+    def __init__(self, history=HISTORY, version=0):
+        #: Current key -> value, only modified through :meth:`set`/:meth:`remove`.
+        self.items = {}
+        #: Version of the last change, ``version`` before any.
+        self.version = version
+        self.history = history
+        self.lock = threading.Lock()
+        self._log = deque(maxlen=history)
+        # (loop, asyncio.Event) of the waiting subscribers
+        self._waiters = set()
+        # Sorted keys of the items and the version they were sorted at, for paging
+        self._sorted = (None, [])
+
+    def set(self, key, value):
+        """
+        Adds or replaces an item.
+
+        :rtype int: the version of the change.
+        """
+        with self.lock:
+            self.items[key] = value
+            return self._publish("set", key, value)
+
+    def remove(self, key):
+        """
+        Removes an item.
+
+        :rtype int: the version of the change, None if the key is unknown.
+        """
+        with self.lock:
+            if key not in self.items:
+                return None
+            del self.items[key]
+            return self._publish("remove", key, None)
+
+    def _publish(self, op, key, value):
+        self.version += 1
+        self._log.append((self.version, op, key, value))
+        for loop, event in list(self._waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop of a dropped subscriber is closed
+                self._waiters.discard((loop, event))
+        return self.version
+
+    def snapshot(self):
+        """
+        :rtype tuple: (version, copy of the items).
+        """
+        with self.lock:
+            return self.version, dict(self.items)
+
+    def changes(self, since):
+        """
+        Returns the changes made after a version.
+
+        :param since (int): version known by the caller.
+
+        :rtype tuple: (current version, ``(version, op, key, value)`` list),
+                      None if the log no longer holds every change since
+                      ``since`` or ``since`` is ahead of the feed.
+        """
+        with self.lock:
+            if since > self.version:
+                return None
+            oldest = self._log[0][0] if self._log else self.version + 1
+            if since + 1 < oldest and since != self.version:
+                return None
+            return self.version, [change for change in self._log if change[0] > since]
+
+    def delta(self, since):
+        """
+        Collapses the changes made after a version into their net effect.
+
+        :param since (int): version known by the caller.
+
+        :rtype tuple: (current version, key -> value of the items added or
+                      changed, sorted keys removed), None when :meth:`changes`
+                      cannot answer.
+        """
+        result = self.changes(since)
+        if result is None:
+            return None
+        version, changes = result
+        updated, removed = {}, set()
+        for _, op, key, value in changes:
+            if op == "set":
+                updated[key] = value
+                removed.discard(key)
+            else:
+                updated.pop(key, None)
+                removed.add(key)
+        return version, updated, sorted(removed)
+
+    def page(self, after=None, limit=None):
+        """
+        Returns the items in key order, ``limit`` at a time. The sorted keys are
+        kept until the next change, so walking the pages costs one sort.
+
+        :param after (str): last key of the previous page, None for the first one.
+        :param limit (int): most items returned, None for all of them.
+
+        :rtype tuple: (version, key -> value of the page, last key of the page
+                      if more items follow, else None).
+        """
+        with self.lock:
+            version, keys = self._sorted
+            if version != self.version:
+                keys = sorted(self.items)
+                self._sorted = (self.version, keys)
+            start = 0 if after is None else bisect_right(keys, after)
+            end = len(keys) if limit is None else min(start + limit, len(keys))
+            page = {key: self.items[key] for key in keys[start:end]}
+            return self.version, page, keys[end - 1] if end < len(keys) else None
+
+    async def subscribe(self, since=None, heartbeat=HEARTBEAT):
+        """
+        Yields the changes as they happen, starting after ``since``.
+
+        The first item is a ``(version, "snapshot", None, items)`` when ``since``
+        is None or too old, then every change is a ``(version, op, key, value)``
+        tuple and ``(version, "heartbeat", None, None)`` is yielded after
+        ``heartbeat`` idle seconds, so a dead client is noticed by the write.
+
+        :param since (int): version known by the subscriber, or None.
+        :param heartbeat (float): idle seconds between heartbeats.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self._waiters.add(waiter)
+        try:
+            version = since
+            while True:
+                result = None if version is None else self.changes(version)
+                if result is None:
+                    version, items = self.snapshot()
+                    yield version, "snapshot", None, items
+                else:
+                    version, changes = result
+                    for change in changes:
+                        yield change
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield version, "heartbeat", None, None
+                waiter[1].clear()
+        finally:
+            with self.lock:
+                self._waiters.discard(waiter)
@@ -0,0 +1,107 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.health
+~~~~~~~~~~~~~~~~~
+
+This module provides the active health checks of the proxy backends. A host
+declaring a ``health_check`` in ``config/proxy.conf`` gets a daemon thread that
+requests the probe path on each of its backends every ``interval`` seconds.
+A backend answering below 500 is healthy, a backend failing to answer or
+answering 5xx is left out of the selection until a probe succeeds again.
+
+Configuration Example:
+----------------------
+host "app2.local" {
+    proxy_pass http://127.0.0.1:9002;
+    proxy_pass http://127.0.0.1:9003;
+    health_check /health interval=5 timeout=1;
+    max_fails 3;
+    fail_timeout 10;
+}
+
+"""
+
+import http.client
+import threading
+import time
+
+from .balancer import get_balancer
+
+#: Seconds between two probes of a backend.
+PROBE_INTERVAL = 5
+
+#: Seconds allowed for a probe response.
+PROBE_TIMEOUT = 1
+
+def probe(backend, hostname, path, timeout):
+    """
+    Requests the probe path on a backend.
+
+    :param backend (Backend): the probed backend.
+    :param hostname (str): virtual host sent in the Host header.
+    :param path (str): probe path.
+    :param timeout (int): seconds allowed for the response.
+
+    :rtype bool: True if the backend answered with a status below 500.
+    """
+    conn = http.client.HTTPConnection(backend.host, backend.port, timeout=timeout)
+    try:
+        conn.request("GET", path, headers={"Host": hostname, "Connection": "close"})
+        response = conn.getresponse()
+        response.read()
+        return response.status < 500
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+def probe_loop(hostname, balancer):
+    """
+    Probes the backends of a host forever, updating their ``probe_ok`` state.
+
+    :param hostname (str): the virtual host.
+    :param balancer (Balancer): balancer of the host.
+    """
+    settings = balancer.health_check
+    path = settings.get("path", "/")
+    interval = settings.get("interval", PROBE_INTERVAL)
+    timeout = settings.get("timeout", PROBE_TIMEOUT)
+    while True:
+        for backend in balancer.backends:
+            healthy = probe(backend, hostname, path, timeout)
+            if healthy != backend.probe_ok:
+                print("[Health] Backend {} of {} is {}".format(
+                    backend.address, hostname, "up" if healthy else "down"))
+            backend.probe_ok = healthy
+            if healthy:
+                balancer.mark_success(backend)
+        time.sleep(interval)
+
+def start_health_checks(routes):
+    """
+    Starts the probe thread of every host declaring a ``health_check``.
+
+    :param routes (dict): dictionary mapping hostnames and location.
+    """
+    for hostname in routes:
+        balancer = get_balancer(hostname, routes)
+        if not balancer.health_check:
+            continue
+        checker = threading.Thread(target=probe_loop, args=(hostname, balancer),
+                                   name="health-{}".format(hostname))
+        checker.daemon = True
+        checker.start()
+        print("[Health] Probing {} on {} every {}s".format(
+            hostname, balancer.health_check.get("path", "/"),
+            balancer.health_check.get("interval", PROBE_INTERVAL)))
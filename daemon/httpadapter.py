@@ -21,9 +21,26 @@ Request and Response objects to handle client-server communication.
 """
 
 import json # <-- ĐÃ THÊM: Cần thiết để xử lý phản hồi API
+import asyncio
+import inspect
 from .request import Request
 from .response import Response
 from .dictionary import CaseInsensitiveDict
+from .utils import update_headers, is_delimited
+from .encoding import encode_message
+from .parser import RequestParser, ParseError
+
+#: Seconds allowed to receive the rest of a request once it has started.
+READ_TIMEOUT = 2
+
+#: Seconds a persistent connection may stay idle between two requests.
+KEEPALIVE_TIMEOUT = 5
+
+#: Maximum number of requests served on one persistent connection.
+MAX_REQUESTS = 100
+
+#: Bytes asked from the socket per ``recv``.
+RECV_SIZE = 65536
 
 class HttpAdapter:
     """
@@ -40,9 +57,12 @@ class HttpAdapter:
         "routes",
         "request",
         "response",
+        "keepalive_timeout",
+        "max_requests",
     ]
 
-    def __init__(self, ip, port, conn, connaddr, routes):
+    def __init__(self, ip, port, conn, connaddr, routes,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_REQUESTS):
         """
         Initialize a new HttpAdapter instance.
         ...
@@ -62,6 +82,12 @@ class HttpAdapter:
         self.request = Request()
         #: Response
         self.response = Response()
+        #: Idle seconds before a persistent connection is closed
+        self.keepalive_timeout = keepalive_timeout
+        #: Requests served per connection before it is closed
+        self.max_requests = max_requests
+        #: False once the current request could not be fully read
+        self.framed = True
 
     # def handle_client(self, conn, addr, routes):
     #     """
@@ -152,81 +178,242 @@ class HttpAdapter:
     #     conn.sendall(response)
     #     conn.close()
 
-    def handle_client(self, conn, addr, routes):
+    def handle_client(self, conn, addr, routes, parser=None, served=0, park=None):
         """
         Handle an incoming client connection.
-        - read headers and full body (Content-Length aware)
-        - parse request and cookies
-        - implement POST /login logic (validate credentials, set cookie or 401)
-        - implement GET / or /index.html cookie check (auth=true => serve index, else 401)
-        - call app hook when present
-        - fallback to static file serving via Response.build_response
+        - read headers and full body (Content-Length or chunked) with :class:`RequestParser`
+        - parse request and cookies, refuse oversized or malformed requests
+        - dispatch the request (see :meth:`dispatch`) and send the response
+        - keep the connection open for the next request (HTTP/1.1 keep-alive),
+          requests pipelined behind the current one stay in the receive buffer
+        - with ``park``, an idle persistent connection is handed to ``park(conn, addr,
+          parser, served)`` instead of being waited on, and resumed later by calling
+          this method again with the same ``parser`` and ``served``
         """
         self.conn = conn
         self.connaddr = addr
-        req = self.request
-        resp = self.response
+        self.routes = routes
 
-        # Read headers first (until \r\n\r\n)
-        conn.settimeout(2)
-        raw = b""
+        if parser is None:
+            parser = RequestParser()
+        parked = False
         try:
-            while b"\r\n\r\n" not in raw:
-                chunk = conn.recv(4096)
-                if not chunk:
+            while served < self.max_requests:
+                self.request = Request()
+                self.response = Response()
+                req = self.request
+
+                try:
+                    ready = self.read_request(conn, parser, served)
+                except ParseError as e:
+                    print("[HttpAdapter] Refusing request from {}: {}".format(addr, e))
+                    conn.sendall(self.response.build_rejected(e.status, e.reason))
+                    break
+                if not ready:
+                    break
+                served += 1
+
+                result = self.dispatch(req)
+                # Coroutine route handlers are driven to completion on this thread
+                if inspect.isawaitable(result):
+                    result = asyncio.run(self.resolve_hook(result))
+                result = self.encode_response(req, result)
+                result = self.strip_body(req, result)
+
+                result, keep_alive = self.prepare_connection(req, result, served)
+                self.send_response(conn, result)
+                if not keep_alive:
+                    break
+                if park is not None and not parser.buf:
+                    # Nothing pending: wait for the next request off this thread
+                    park(conn, addr, parser, served)
+                    parked = True
                     break
-                raw += chunk
         except Exception:
             pass
+        finally:
+            if not parked:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
 
-        # If no data, close
-        if not raw:
-            try:
-                conn.close()
-            except Exception:
-                pass
-            return
+    def read_request(self, conn, parser, served):
+        """
+        Reads the next request of the connection and prepares ``self.request``.
 
-        # Decode headers safely
-        header_end = raw.find(b"\r\n\r\n")
-        header_bytes = raw[:header_end + 4] if header_end != -1 else raw
+        :param conn (socket.socket): Client connection socket.
+        :param parser (RequestParser): parser holding the bytes received but not
+                                       consumed yet, e.g. pipelined requests.
+        :param served (int): number of requests already served on the connection.
+
+        :rtype bool: True if a request was prepared.
+        :raise ParseError: the request is malformed or exceeds the parser limits.
+        """
+        req = self.request
+
+        # Read headers first (until \r\n\r\n). The idle timeout applies
+        # while waiting for the first byte of a follow-up request.
+        conn.settimeout(self.keepalive_timeout if served and not parser.buf else READ_TIMEOUT)
         try:
-            header_text = header_bytes.decode("utf-8", errors="replace")
-        except Exception:
-            header_text = header_bytes.decode("latin1", errors="replace")
+            head = parser.parse_head()
+            while head is None:
+                chunk = conn.recv(RECV_SIZE)
+                if not chunk:
+                    return False
+                parser.feed(chunk)
+                conn.settimeout(READ_TIMEOUT)
+                head = parser.parse_head()
+        except OSError:
+            return False
+
+        # Prepare request (request-line and headers are already parsed)
+        req.prepare_head(head, self.routes)
+
+        # Read the Content-Length or chunked body, anything behind it belongs to the next request
+        try:
+            while not parser.body_complete():
+                chunk = conn.recv(RECV_SIZE)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        except OSError:
+            pass
+        self.framed = parser.body_complete()
+
+        # The body stays a view of the received bytes, decoded on first use of req.body
+        req.raw_body = parser.take_body() if self.framed else parser.take_partial()
+        return True
+
+    def wants_keep_alive(self, req):
+        """
+        Returns True if the client asked for a persistent connection: the
+        HTTP/1.1 default unless ``Connection: close``, or an explicit
+        ``Connection: keep-alive`` for HTTP/1.0.
+        """
+        connection = (req.headers.get("connection") or "").lower()
+        if req.version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
+    def prepare_connection(self, req, result, served):
+        """
+        Decides whether the connection persists after the response and sets its
+        ``Connection``/``Keep-Alive`` headers, overriding whatever the response
+        builder or route handler wrote.
+
+        The connection is kept only if the client asked for it, the request was
+        fully read, the per-connection limit is not reached and the end of the
+        response can be found by the client without a close.
+
+        :param req (Request): the answered request.
+        :param result (bytes): raw HTTP response, or a :class:`Response <Response>`
+                               with a file or streamed body whose ``_header`` is rewritten.
+        :param served (int): number of requests served including this one.
+
+        :rtype tuple: (raw HTTP response, True if the connection persists).
+        """
+        message = result._header if isinstance(result, Response) else result
+        if isinstance(result, Response) and result._chunks is not None and req.version != "HTTP/1.1":
+            # HTTP/1.0 has no chunked coding, the body ends with the connection
+            result.chunked = False
+            message = update_headers(message, {"Transfer-Encoding": None})
+        keep_alive = (self.framed
+                      and served < self.max_requests
+                      and self.wants_keep_alive(req)
+                      and is_delimited(message))
+        if keep_alive:
+            headers = {
+                "Connection": "keep-alive",
+                "Keep-Alive": "timeout={}, max={}".format(self.keepalive_timeout,
+                                                          self.max_requests - served),
+            }
+        else:
+            headers = {"Connection": "close", "Keep-Alive": None}
+        if isinstance(result, Response):
+            result._header = update_headers(message, headers)
+            return result, keep_alive
+        return update_headers(result, headers), keep_alive
+
+    def encode_response(self, req, result):
+        """
+        Compresses the body of a dynamic response for a client accepting
+        ``gzip``/``br`` (see :func:`encode_message <daemon.encoding.encode_message>`).
+        Static files are negotiated by :meth:`Response.build_content` instead,
+        streamed bodies are compressed as they are sent.
+
+        :rtype bytes: the raw HTTP response, or the given :class:`Response <Response>`.
+        """
+        if isinstance(result, Response):
+            if result._chunks is not None:
+                result.encode_stream(req.headers.get("accept-encoding", ""))
+            return result
+        return encode_message(result, req.headers.get("accept-encoding", ""))
+
+    def strip_body(self, req, result):
+        """
+        Drops the body of the answer to a ``HEAD`` request, which is served by
+        the ``GET`` handler or the static files; the headers are kept as is.
+
+        :rtype bytes: the raw HTTP response, or the given :class:`Response <Response>`.
+        """
+        if req.method != "HEAD":
+            return result
+        if isinstance(result, Response):
+            result.close()
+            result._chunks = None
+            result._file = None
+            result._content = b""
+            return result
+        end = result.find(b"\r\n\r\n")
+        return result if end == -1 else result[:end + 4]
+
+    def send_response(self, conn, result):
+        """
+        Sends a response on the client connection.
 
-        # Prepare request (parses request-line, headers)
-        req.prepare(header_text, routes)
+        :param conn (socket.socket): Client connection socket.
+        :param result (bytes): raw HTTP response, or a :class:`Response <Response>`
+                               sending its file or streamed body itself
+                               (see :meth:`Response.send_to`).
+        """
+        if isinstance(result, Response):
+            result.send_to(conn)
+        else:
+            conn.sendall(result)
 
-        # Determine if there's a body to read (Content-Length)
-        content_length = 0
+    def content_length(self, req):
+        """
+        Returns the declared ``Content-Length`` of a prepared request, or 0
+        when the header is missing or malformed.
+        """
         cl = req.headers.get("content-length")
         if cl:
             try:
-                content_length = int(cl)
+                return int(cl)
             except Exception:
-                content_length = 0
+                return 0
+        return 0
 
-        # Already-read remainder after headers
-        body_already = raw[header_end + 4:] if header_end != -1 else b""
-        body = body_already
-        to_read = content_length - len(body)
-        # Read remaining body if needed
+    def decode_body(self, body):
+        """Decodes a raw request body (utf-8 with latin1 fallback)."""
         try:
-            while to_read > 0:
-                chunk = conn.recv(min(4096, to_read))
-                if not chunk:
-                    break
-                body += chunk
-                to_read -= len(chunk)
+            return body.decode("utf-8", errors="replace")
         except Exception:
-            pass
+            return body.decode("latin1", errors="replace")
 
-        # Store body as decoded string (utf-8 fallback to latin1)
-        try:
-            req.body = body.decode("utf-8", errors="replace")
-        except Exception:
-            req.body = body.decode("latin1", errors="replace")
+    def dispatch(self, req):
+        """
+        Runs the business logic of a prepared :class:`Request <Request>`.
+        - implement GET / or /index.html cookie check (auth=true => serve index, else 401)
+        - call app hook when present
+        - fallback to static file serving via Response.build_response
+
+        :rtype bytes: the raw HTTP response. When the hook is an ``async def``
+                      route handler, the awaitable it returned is passed back
+                      instead and must be resolved with :meth:`resolve_hook`.
+        """
+        resp = self.response
 
         # Now business logic: login + cookie-protected index
         try:
@@ -236,44 +423,14 @@ class HttpAdapter:
                 path = "/index.html"
                 req.path = path
 
-            # Helper: send raw bytes and close
-            def send_and_close(data_bytes):
-                try:
-                    conn.sendall(data_bytes)
-                except Exception:
-                    pass
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            # The route exists for other methods only: 405, or the Allow list for OPTIONS
+            if req.hook is None and req.allowed:
+                if req.method == "OPTIONS":
+                    return resp.build_options(req.allowed)
+                return resp.build_method_not_allowed(req.allowed)
 
-            # Task 1A: POST /login
-            # if req.method == "POST" and req.path == "/login":
-            #     # parse form body (application/x-www-form-urlencoded)
-            #     from urllib.parse import parse_qs
-            #     parsed = parse_qs(req.body, keep_blank_values=True)
-            #     username = parsed.get("username", [""])[0]
-            #     password = parsed.get("password", [""])[0]
-
-            #     if username == "admin" and password == "password":
-            #         # build login-success response (sets cookie + returns index)
-            #         resp.cookies.clear()
-            #         resp.cookies["auth"] = "true; Path=/"
-            #         # Ensure request points to index for building content
-            #         req.path = "/index.html"
-            #         req.method = "GET"
-            #         result = resp.build_response(req)
-            #         # result = resp.redirect("/", cookies=resp.cookies)
-            #         send_and_close(result)
-            #         return
-            #     else:
-            #         # invalid credentials -> 401
-            #         result = resp.build_unauthorized()
-            #         send_and_close(result)
-            #         return
-           
             # Task 1B: GET /index.html (or /)
-            if req.method == "GET" and req.path in ["/index.html"]:
+            if req.method in ("GET", "HEAD") and req.path in ["/index.html"]:
                 # check cookie auth
                 cookie_val = req.cookies.get("auth", "")
                 # handle cases like "true" or "true; Path=/" if set that way
@@ -283,54 +440,19 @@ class HttpAdapter:
                         is_auth = True
                 if not is_auth:
                     # not authorized
-                    result = resp.build_unauthorized()
-                    send_and_close(result)
-                    return
+                    return resp.build_unauthorized()
                 # else authorized -> serve index via build_response
-                result = resp.build_response(req)
-                send_and_close(result)
-                return
+                return resp.build_response(req)
 
-            # If a webapp hook is present, call it (we expect a dict -> JSON)
+            # If a webapp hook is present, call it
             if req.hook:
                 try:
-                    api_response = req.hook(req)
-                    # if not isinstance(api_response,Response):
-                    #     import json
-                    #     json_body = json.dumps(api_response)
-                    #     content_length = len(json_body.encode("utf-8"))
-                    #     response_bytes = (
-                    #         "HTTP/1.1 200 OK\r\n"
-                    #         "Content-Type: application/json\r\n"
-                    #         f"Content-Length: {content_length}\r\n"
-                    #         "Connection: close\r\n"
-                    #         "\r\n"
-                    #         f"{json_body}"
-                    #     ).encode("utf-8")
-                    #     send_and_close(response_bytes)
-                    #     return
-                    # else:
-                    send_and_close(api_response)
-                    return
-
+                    return req.hook(req)
                 except Exception as e:
-                    import json
-                    err = json.dumps({"error": "Internal Server Error", "message": str(e)})
-                    response_bytes = (
-                        "HTTP/1.1 500 Internal Server Error\r\n"
-                        "Content-Type: application/json\r\n"
-                        f"Content-Length: {len(err.encode('utf-8'))}\r\n"
-                        "Connection: close\r\n"
-                        "\r\n"
-                        f"{err}"
-                    ).encode("utf-8")
-                    send_and_close(response_bytes)
-                    return
+                    return self.build_hook_error(e)
 
             # Fallback: static file serving
-            result = resp.build_response(req)
-            send_and_close(result)
-            return
+            return resp.build_response(req)
 
         except Exception as e:
             # On unexpected error, return 500
@@ -342,15 +464,24 @@ class HttpAdapter:
                 "Connection: close\r\n"
                 "\r\n"
             ).encode("utf-8")
-            try:
-                conn.sendall(header + body)
-            except Exception:
-                pass
-            try:
-                conn.close()
-            except Exception:
-                pass
-            return
+            return header + body
+
+    async def resolve_hook(self, awaitable):
+        """
+        Awaits the result of an ``async def`` route handler.
+
+        :rtype bytes: the raw HTTP response, a 500 response if the handler raised.
+        """
+        try:
+            return await awaitable
+        except Exception as e:
+            return self.build_hook_error(e)
+
+    def build_hook_error(self, e):
+        """Builds the 500 JSON response for an exception raised by a route handler."""
+        print("[HttpAdapter] hook error: {}".format(e))
+        return self.response.build_internal_error(
+            {"error": "Internal Server Error", "message": str(e)})
 
     @property
     def extract_cookies(self, req, resp):
@@ -0,0 +1,262 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.parser
+~~~~~~~~~~~~~~~~~
+
+This module provides the incremental HTTP request parser of the backend. The
+bytes of a connection are appended to one ``bytearray``; the search for the end
+of the header block resumes where the previous chunk left it, the head is parsed
+once in a single pass when it is complete and the body is handed out as a
+``memoryview`` of the buffer instead of a copy. A ``Transfer-Encoding: chunked``
+body is decoded as its chunks arrive.
+
+Limits:
+-------
+- A header block above ``max_header_bytes`` is refused with ``431``.
+- A ``Content-Length`` above ``max_body_bytes`` is refused with ``413``.
+- A malformed request line, ``Content-Length`` or chunk is refused with ``400``.
+- A transfer coding other than ``chunked`` is refused with ``501``.
+
+Usage Example:
+--------------
+>>> parser = RequestParser()
+>>> parser.feed(conn.recv(65536))
+>>> head = parser.parse_head()
+>>> if head is not None and parser.body_complete():
+>>>     body = parser.take_body()
+
+"""
+
+#: Largest header block accepted.
+MAX_HEADER_BYTES = 16 * 1024
+
+#: Largest request body accepted.
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+#: Longest chunk-size line (size and chunk extensions) accepted.
+MAX_CHUNK_LINE = 1024
+
+class ParseError(Exception):
+    """A request the server refuses to parse, answered with ``status``."""
+
+    def __init__(self, status, reason):
+        super().__init__("{} {}".format(status, reason))
+        self.status = status
+        self.reason = reason
+
+class RequestHead:
+    """The parsed request line and headers of a request."""
+
+    __slots__ = ("method", "path", "version", "headers", "content_length", "chunked")
+
+    def __init__(self, method, path, version, headers, content_length, chunked=False):
+        self.method = method
+        self.path = path
+        self.version = version
+        #: Lower-case header name -> value.
+        self.headers = headers
+        self.content_length = content_length
+        #: True for a ``Transfer-Encoding: chunked`` body, ``content_length`` is then 0.
+        self.chunked = chunked
+
+def parse_head(head):
+    """
+    Parses a header block in one pass.
+
+    :param head (bytes): request line and headers, without the empty line.
+
+    :rtype RequestHead: the parsed head.
+    :raise ParseError: malformed request line or Content-Length.
+    """
+    # One decode of the whole block, then one split: the per-line work is
+    # a partition and a lower() on str, all in C.
+    lines = head.decode("utf-8", "replace").split("\r\n")
+    parts = lines[0].split()
+    if len(parts) != 3:
+        raise ParseError(400, "Bad Request")
+    method, path, version = parts
+
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.lower()] = value.strip()
+
+    if "transfer-encoding" in headers:
+        # Chunked takes precedence over any Content-Length
+        if headers["transfer-encoding"].strip().lower() != "chunked":
+            raise ParseError(501, "Not Implemented")
+        return RequestHead(method, path, version, headers, 0, True)
+
+    content_length = 0
+    if "content-length" in headers:
+        try:
+            content_length = int(headers["content-length"])
+        except ValueError:
+            raise ParseError(400, "Bad Request")
+        if content_length < 0:
+            raise ParseError(400, "Bad Request")
+    return RequestHead(method, path, version, headers, content_length)
+
+class RequestParser:
+    """The :class:`RequestParser <RequestParser>` object frames the successive
+    requests of one connection.
+    """
+
+    __attrs__ = [
+        "buf",
+        "max_header_bytes",
+        "max_body_bytes",
+    ]
+
+    def __init__(self, max_header_bytes=MAX_HEADER_BYTES, max_body_bytes=MAX_BODY_BYTES):
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        #: Received bytes not consumed by a previous request.
+        self.buf = bytearray()
+        self._scanned = 0
+        self._head_end = -1
+        self._head = None
+        # Chunked body: decoded bytes, offset of the next chunk in ``buf``,
+        # and end of the body in ``buf`` once the last chunk is read
+        self._decoded = None
+        self._chunk_pos = 0
+        self._body_end = -1
+
+    def feed(self, data):
+        """Appends received bytes to the buffer."""
+        self.buf += data
+
+    def parse_head(self):
+        """
+        Looks for the end of the header block in the bytes received since the
+        last call and parses the head once it is complete.
+
+        :rtype RequestHead: the head, None until the header block is complete.
+        :raise ParseError: the head is malformed or too large.
+        """
+        if self._head is not None:
+            return self._head
+        # The terminator may straddle the previous chunk, back up 3 bytes
+        end = self.buf.find(b"\r\n\r\n", max(0, self._scanned - 3))
+        if end == -1:
+            self._scanned = len(self.buf)
+            if self._scanned > self.max_header_bytes:
+                raise ParseError(431, "Request Header Fields Too Large")
+            return None
+        if end > self.max_header_bytes:
+            raise ParseError(431, "Request Header Fields Too Large")
+
+        self._head_end = end + 4
+        self._head = parse_head(bytes(self.buf[:end]))
+        if self._head.content_length > self.max_body_bytes:
+            raise ParseError(413, "Payload Too Large")
+        if self._head.chunked:
+            self._decoded = bytearray()
+            self._chunk_pos = self._head_end
+        return self._head
+
+    def body_complete(self):
+        """
+        Returns True once the whole body of the parsed head is buffered.
+
+        :raise ParseError: a chunk is malformed or the body exceeds the limit.
+        """
+        if self._head.chunked:
+            return self.decode_chunks()
+        return len(self.buf) >= self._head_end + self._head.content_length
+
+    def decode_chunks(self):
+        """
+        Decodes the complete chunks received since the last call.
+
+        :rtype bool: True once the last chunk and the trailers are read.
+        :raise ParseError: a chunk is malformed or the body exceeds the limit.
+        """
+        buf = self.buf
+        while self._body_end == -1:
+            eol = buf.find(b"\r\n", self._chunk_pos)
+            if eol == -1:
+                if len(buf) - self._chunk_pos > MAX_CHUNK_LINE:
+                    raise ParseError(400, "Bad Request")
+                return False
+            try:
+                size = int(bytes(buf[self._chunk_pos:eol]).split(b";", 1)[0], 16)
+            except ValueError:
+                raise ParseError(400, "Bad Request")
+            if size < 0:
+                raise ParseError(400, "Bad Request")
+
+            if size == 0:
+                # Last chunk, then optional trailer fields up to an empty line
+                if buf[eol + 2:eol + 4] == b"\r\n":
+                    self._body_end = eol + 4
+                else:
+                    end = buf.find(b"\r\n\r\n", eol + 2)
+                    if end == -1:
+                        return False
+                    self._body_end = end + 4
+                break
+
+            data_end = eol + 2 + size
+            if len(buf) < data_end + 2:
+                return False
+            if buf[data_end:data_end + 2] != b"\r\n":
+                raise ParseError(400, "Bad Request")
+            if len(self._decoded) + size > self.max_body_bytes:
+                raise ParseError(413, "Payload Too Large")
+            self._decoded += buf[eol + 2:data_end]
+            self._chunk_pos = data_end + 2
+        return True
+
+    def take_body(self):
+        """
+        Ends the current request and returns its body. The bytes behind it stay
+        buffered for the next request.
+
+        :rtype memoryview: the body, a view of the bytes received.
+        """
+        if self._head.chunked:
+            body, body_end = memoryview(self._decoded), self._body_end
+        else:
+            body_end = self._head_end + self._head.content_length
+            body = memoryview(self.buf)[self._head_end:body_end]
+        # The view keeps the old buffer alive, the next request gets a new one
+        # holding only the pipelined bytes, usually none.
+        self.buf = bytearray(self.buf[body_end:])
+        self.reset()
+        return body
+
+    def take_partial(self):
+        """
+        Ends the current request whose body was cut short by the client.
+
+        :rtype memoryview: the part of the body received.
+        """
+        if self._head.chunked:
+            body = memoryview(self._decoded)
+        else:
+            body = memoryview(self.buf)[self._head_end:]
+        self.buf = bytearray()
+        self.reset()
+        return body
+
+    def reset(self):
+        """Forgets the state of the request just taken."""
+        self._scanned = 0
+        self._head_end = -1
+        self._head = None
+        self._decoded = None
+        self._chunk_pos = 0
+        self._body_end = -1
@@ -25,6 +25,10 @@ Requirement:
 - response: customized :class: `Response <Response>` utilities.
 - httpadapter: :class: `HttpAdapter <HttpAdapter >` adapter for HTTP request processing.
 - dictionary: :class: `CaseInsensitiveDict <CaseInsensitiveDict>` for managing headers and cookies.
+- upstream: :class: `ConnectionPool <ConnectionPool>` of keep-alive backend connections.
+- balancer: :class: `Balancer <Balancer>` applying the ``dist_policy`` of each host.
+- health: active probes of the backends declaring a ``health_check``.
+- cache: :class: `ResponseCache <ResponseCache>` of the cacheable backend responses.
 
 """
 import socket
@@ -32,6 +36,12 @@ import threading
 from .response import *
 from .httpadapter import HttpAdapter
 from .dictionary import CaseInsensitiveDict
+from .upstream import (ConnectionPool, PoolExhausted, SocketReader, RELAY_BUFFER, read_response,
+                       read_body, relay_body, parse_head, status_of, has_body)
+from .utils import update_headers
+from .balancer import get_balancer
+from .health import start_health_checks
+from .cache import CACHEABLE_METHODS
 
 #: A dictionary mapping hostnames to backend IP and port tuples.
 #: Used to determine routing targets for incoming requests.
@@ -41,100 +51,229 @@ PROXY_PASS = {
     "app2.local": [('127.0.0.1', 9002),('127.0.0.1', 9003)],  # load balancing example
 }
 
-'''Round-robin policy counter for each hostname'''
-rr_counter ={}
-rr_lock = threading.Lock() # locking for thread-safe counter update
-
-def forward_request(host, port, request):
+#: Seconds allowed to receive the request of a client.
+CLIENT_TIMEOUT = 10
+
+#: Response sent when the backend of a host cannot be reached.
+NOT_FOUND = (
+    "HTTP/1.1 404 Not Found\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 13\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "404 Not Found"
+).encode('utf-8')
+
+#: Response sent when every backend of a host failed.
+BAD_GATEWAY = (
+    "HTTP/1.1 502 Bad Gateway\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 15\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "502 Bad Gateway"
+).encode('utf-8')
+
+#: Methods safe to send again to another backend after a failure.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE")
+
+class BackendError(Exception):
+    """The backend failed before its response started, the request may be
+    sent to another backend."""
+
+class BackendBusy(BackendError):
+    """Every pooled connection to the backend is in use. The backend did not
+    fail and is not reported to the balancer."""
+
+class ClientError(ConnectionError):
+    """The client connection failed while its request was relayed, the
+    backend is not to blame."""
+
+class ClientReader(SocketReader):
+    """:class:`SocketReader <SocketReader>` of the client connection. Receive
+    errors and an early close raise :class:`ClientError`."""
+
+    def fill(self):
+        try:
+            if not SocketReader.fill(self):
+                raise ClientError("Client closed inside the message")
+        except ClientError:
+            raise
+        except OSError as e:
+            raise ClientError(e)
+        return True
+
+    def recv_into(self, view, size=0):
+        try:
+            count = self.sock.recv_into(view, size)
+        except OSError as e:
+            raise ClientError(e)
+        if not count:
+            raise ClientError("Client closed inside the message")
+        return count
+
+#: Keep-alive connections to the backends shared by the proxy threads,
+#: replaced by :func:`run_proxy` when pool settings are given.
+upstream_pool = ConnectionPool()
+
+def forward_request(host, port, request, pool=None):
     """
     Forwards an HTTP request to a backend server and retrieves the response.
 
     :params host (str): IP address of the backend server.
     :params port (int): port number of the backend server.
-    :params request (str): incoming HTTP request.
+    :params request (bytes): incoming HTTP request.
+    :params pool (ConnectionPool): backend connection pool, defaults to ``upstream_pool``.
 
     :rtype bytes: Raw HTTP response from the backend server. If the connection
                   fails, returns a 404 Not Found response.
     """
+    try:
+        return send_request(host, port, request, pool)
+    except BackendError as e:
+        print("Socket error: {}".format(e))
+        return NOT_FOUND
 
-    backend = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+def send_request(host, port, request, pool=None):
+    """
+    Sends an HTTP request to a backend server and retrieves the response.
 
-    try:
-        backend.connect((host, port))
-        backend.sendall(request.encode())
-        response = b""
-        while True:
-            chunk = backend.recv(4096)
-            if not chunk:
-                break
-            response += chunk
-        return response
-    except socket.error as e:
-      print("Socket error: {}".format(e))
-      return (
-            "HTTP/1.1 404 Not Found\r\n"
-            "Content-Type: text/plain\r\n"
-            "Content-Length: 13\r\n"
-            "Connection: close\r\n"
-            "\r\n"
-            "404 Not Found"
-        ).encode('utf-8')
-    finally:
-        backend.close()
+    The request goes over a pooled keep-alive connection and the response is
+    framed by its Content-Length or chunked encoding, so the connection returns
+    to the pool afterwards. A reused connection that the backend closed in the
+    meantime is retried once on a fresh connection.
 
+    :params host (str): IP address of the backend server.
+    :params port (int): port number of the backend server.
+    :params request (bytes): incoming HTTP request.
+    :params pool (ConnectionPool): backend connection pool, defaults to ``upstream_pool``.
 
-def resolve_routing_policy(hostname, routes):
+    :rtype bytes: Raw HTTP response from the backend server.
+    :raise BackendBusy: no pooled connection to the backend became free.
+    :raise BackendError: the backend could not be reached or failed to answer.
+    """
+    pool = pool or upstream_pool
+    if isinstance(request, str):
+        request = request.encode()
+    method = request.split(b" ", 1)[0].decode("latin1")
+    data = update_headers(request, {
+        "Connection": "keep-alive",
+        "Keep-Alive": None,
+        "Proxy-Connection": None,
+    })
+
+    while True:
+        reused = False
+        try:
+            backend, reused = pool.acquire(host, port)
+            try:
+                backend.sendall(data)
+                response, reusable = read_response(backend, method)
+            except BaseException:
+                pool.release(host, port, backend, False)
+                raise
+            pool.release(host, port, backend, reusable)
+            # The proxy closes the client connection after the response
+            return update_headers(response, {"Connection": "close", "Keep-Alive": None})
+        except PoolExhausted as e:
+            raise BackendBusy(e)
+        except (socket.error, ValueError) as e:
+            if reused:
+                continue
+            raise BackendError(e)
+
+
+def resolve_routing_policy(hostname, routes, client_ip=None):
     """
     Handles an routing policy to return the matching proxy_pass.
-    It determines the target backend to forward the request to.
+    It determines the target backend to forward the request to, using the
+    ``dist_policy`` of the host (see :mod:`daemon.balancer`).
 
-    :params host (str): IP address of the request target server.
-    :params port (int): port number of the request target server.
+    :params hostname (str): Host header of the request.
     :params routes (dict): dictionary mapping hostnames and location.
+    :params client_ip (str): address of the client, used by the ``ip-hash`` policy.
+
+    :rtype tuple: (proxy_host, proxy_port) of the selected backend.
+    """
+
+    backend = get_balancer(hostname, routes).select(client_ip)
+    return backend.host, backend.port
+
+def relay_request(host, port, conn, client, head, headers, pool=None):
     """
+    Streams a request to a backend and its response back to the client.
+
+    The request head is forwarded as soon as it is parsed, the request body and
+    the response body are relayed as they arrive through one bounded buffer
+    (see :func:`relay_body <daemon.upstream.relay_body>`), so neither message is
+    held in memory. The backend connection returns to the pool when both bodies
+    ended on their framing. A failure after the response started only closes
+    the client connection.
 
-    proxy_map, policy = routes.get(hostname.split(":")[0],('127.0.0.1:9000','round-robin'))
-
-
-
-    proxy_host = ''
-    proxy_port = '9000'
-    if isinstance(proxy_map,list):
-        if len(proxy_map) == 0:
-            print("[Proxy] Emtpy resolved routing of hostname {}".format(hostname))
-            print("Empty proxy_map result")
-            # TODO: implement the error handling for non mapped host
-            #       the policy is design by team, but it can be 
-            #       basic default host in your self-defined system
-            # Use a dummy host to raise an invalid connection
-            proxy_host = '127.0.0.1'
-            proxy_port = '9000'
-        elif len(proxy_map) == 1:
-            proxy_host, proxy_port = proxy_map[0].split(":", 2)
-        #elif: # apply the policy handling 
-        #   proxy_map
-        #   policy
-        elif len(proxy_map) > 1:
-            # print("[Proxy] resolve route of hostname {} with multiple alternatives".format(hostname))
-            if policy == 'round-robin':
-                with rr_lock:
-                    index = rr_counter.get(hostname, 0)
-                    rr_counter[hostname] = (index + 1) % len(proxy_map)
-                    backend = proxy_map[index]
-                proxy_host, proxy_port = backend.split(":", 2)
-                # print("[Proxy] round-robin selected index {} for hostname {}".format(index, hostname))
-                
-        # else:
-        #     # Out-of-handle mapped host
-        #     proxy_host = '127.0.0.1'
-        #     proxy_port = '9000'
-    else:
-        print("[Proxy] resolve route of hostname {} is a singulair to".format(hostname))
-        proxy_host, proxy_port = proxy_map.split(":", 2)
-
-    return proxy_host, proxy_port
-
-def handle_client(ip, port, conn, addr, routes):
+    :params host (str): IP address of the backend server.
+    :params port (int): port number of the backend server.
+    :params conn (socket.socket): client connection socket.
+    :params client (SocketReader): reader of the client connection after the head.
+    :params head (bytes): raw request head.
+    :params headers (dict): lower-case request headers.
+    :params pool (ConnectionPool): backend connection pool, defaults to ``upstream_pool``.
+
+    :raise BackendBusy: no pooled connection to the backend became free.
+    :raise BackendError: the backend failed before the response started.
+    :raise ClientError: the request body could not be read from the client.
+    """
+    pool = pool or upstream_pool
+    method = head.split(b" ", 1)[0].decode("latin1")
+    view = memoryview(bytearray(RELAY_BUFFER))
+    data = update_headers(head, {
+        "Connection": "keep-alive",
+        "Keep-Alive": None,
+        "Proxy-Connection": None,
+    })
+    has_request_body = "content-length" in headers or "transfer-encoding" in headers
+
+    while True:
+        try:
+            backend, reused = pool.acquire(host, port)
+        except PoolExhausted as e:
+            raise BackendBusy(e)
+        except socket.error as e:
+            raise BackendError(e)
+
+        reusable = False
+        started = False
+        try:
+            backend.sendall(data)
+            try:
+                relay_body(client, backend, headers, view, to_eof=False)
+            except ValueError as e:
+                # Malformed chunk framing of the request
+                raise ClientError(e)
+            upstream = SocketReader(backend)
+            response_head = upstream.read_until(b"\r\n\r\n")
+            started = True
+            start_line, response_headers = parse_head(response_head)
+            conn.sendall(update_headers(response_head, {"Connection": "close", "Keep-Alive": None}))
+            reusable = "close" not in response_headers.get("connection", "").lower()
+            if has_body(method, status_of(start_line)):
+                reusable = relay_body(upstream, conn, response_headers, view) and reusable
+            reusable = reusable and not upstream.buf
+            return
+        except ClientError:
+            raise
+        except (socket.error, ValueError) as e:
+            # A reused connection closed by the backend before answering is
+            # retried, unless the request body was already consumed.
+            if reused and not started and not has_request_body:
+                continue
+            if not started:
+                raise BackendError(e)
+            print("Socket error: {}".format(e))
+            return
+        finally:
+            pool.release(host, port, backend, reusable)
+
+def handle_client(ip, port, conn, addr, routes, pool=None, relay="buffer", cache=None):
     """
     Handles an individual client connection by parsing the request,
     determining the target backend, and forwarding the request.
@@ -143,49 +282,104 @@ def handle_client(ip, port, conn, addr, routes):
     matches the hostname against known routes. In the matching
     condition,it forwards the request to the appropriate backend.
 
-    The handler sends the backend response back to the client or
-    returns 404 if the hostname is unreachable or is not recognized.
+    The handler sends the backend response back to the client. When the
+    backend fails before answering, an idempotent request is sent again to
+    the next healthy backend of the host and the failure is reported to the
+    balancer. The client gets 502 once every backend failed.
+
+    Only connect, send and read failures against a backend are reported. A
+    backend whose pooled connections are all in use is skipped without being
+    reported (503 once every backend was busy), and errors on the client
+    connection are not blamed on the backend.
+
+    With a response cache, GET and HEAD requests without a body are served
+    from the cache and forwarded whole on a miss, whatever the relay mode.
 
     :params ip (str): IP address of the proxy server.
     :params port (int): port number of the proxy server.
     :params conn (socket.socket): client connection socket.
     :params addr (tuple): client address (IP, port).
     :params routes (dict): dictionary mapping hostnames and location.
+    :params pool (ConnectionPool): backend connection pool.
+    :params relay (str): ``buffer`` forwards whole messages, ``stream`` relays
+                         them as they arrive (see :func:`relay_request`).
+    :params cache (ResponseCache): response cache of the proxy, None to disable it.
     """
 
-    request = conn.recv(1024).decode()
+    client = ClientReader(conn)
+    try:
+        conn.settimeout(CLIENT_TIMEOUT)
+        head = client.read_until(b"\r\n\r\n")
+    except (socket.error, ConnectionError):
+        conn.close()
+        return
 
     # Extract hostname
-    for line in request.splitlines():
-        if line.lower().startswith('host:'):
-            hostname = line.split(':', 1)[1].strip()
+    _, headers = parse_head(head)
+    hostname = headers.get("host", "")
 
     print("[Proxy] {} at Host: {}".format(addr, hostname))
 
-    # Resolve the matching destination in routes and need conver port
-    # to integer value
-    resolved_host, resolved_port = resolve_routing_policy(hostname, routes)
+    # Resolve the matching destination in routes with the host balancer,
+    # which also counts the request in flight and its response time
+    balancer = get_balancer(hostname, routes)
+    method = head.split(b" ", 1)[0].decode("latin1")
+    has_request_body = "content-length" in headers or "transfer-encoding" in headers
+    cached = cache is not None and method in CACHEABLE_METHODS and not has_request_body
+    stream = relay == "stream" and not cached
+    retryable = method in IDEMPOTENT_METHODS and not (stream and has_request_body)
+    tried = set()
+    failed = set()
+
+    def forward(request):
+        # Tries the backends of the host in turn until one answers
+        while True:
+            backend = balancer.select(addr[0], exclude=tried)
+            if backend is None:
+                if tried and not failed:
+                    raise BackendBusy("every backend of {} is busy".format(hostname))
+                raise BackendError("every backend of {} failed".format(hostname))
+            tried.add(backend)
+            resolved_host, resolved_port = backend.host, backend.port
+            try:
+                with balancer.track(backend):
+                    if stream:
+                        print("[Proxy] Host name {} is relayed to {}:{}".format(hostname, resolved_host, resolved_port))
+                        response = relay_request(resolved_host, resolved_port, conn, client, head, headers, pool)
+                    else:
+                        print("[Proxy] Host name {} is forwarded to {}:{}".format(hostname,resolved_host, resolved_port))
+                        response = send_request(resolved_host, resolved_port, request, pool)
+                balancer.mark_success(backend)
+                return response
+            except BackendBusy as e:
+                # Nothing was sent yet, the next backend may take the request
+                print("[Proxy] Backend {}:{} busy: {}".format(resolved_host, resolved_port, e))
+            except BackendError as e:
+                print("[Proxy] Backend {}:{} failed: {}".format(resolved_host, resolved_port, e))
+                failed.add(backend)
+                balancer.mark_failure(backend)
+                if not retryable:
+                    raise
+
     try:
-        resolved_port = int(resolved_port)
-    except ValueError:
-        print("Not a valid integer")
-
-    if resolved_host:
-        print("[Proxy] Host name {} is forwarded to {}:{}".format(hostname,resolved_host, resolved_port))
-        response = forward_request(resolved_host, resolved_port, request)        
-    else:
-        response = (
-            "HTTP/1.1 404 Not Found\r\n"
-            "Content-Type: text/plain\r\n"
-            "Content-Length: 13\r\n"
-            "Connection: close\r\n"
-            "\r\n"
-            "404 Not Found"
-        ).encode('utf-8')
-    conn.sendall(response)
-    conn.close()
-
-def run_proxy(ip, port, routes):
+        if cached:
+            target = head.split(b" ", 2)[1].decode("latin1")
+            conn.sendall(cache.fetch(hostname, method, target, headers,
+                                     lambda extra: forward(update_headers(head, extra))))
+        elif stream:
+            forward(head)
+        else:
+            conn.sendall(forward(head + read_body(client, headers)))
+    except BackendBusy:
+        conn.sendall(Response().build_service_unavailable())
+    except BackendError:
+        conn.sendall(BAD_GATEWAY)
+    except (socket.error, ValueError) as e:
+        print("Socket error: {}".format(e))
+    finally:
+        conn.close()
+
+def run_proxy(ip, port, routes, relay="buffer", cache=None, **pool_options):
     """
     Starts the proxy server and listens for incoming connections. 
 
@@ -197,9 +391,17 @@ def run_proxy(ip, port, routes):
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
     :params routes (dict): dictionary mapping hostnames and location.
+    :params relay (str): ``buffer`` (default) or ``stream``, see :func:`handle_client`.
+    :params cache (ResponseCache): response cache of the proxy, None to disable it.
+    :params pool_options: :class:`ConnectionPool <ConnectionPool>` settings of the
+                          backend connections (``max_idle``, ``max_per_host``,
+                          ``idle_timeout``, ``connect_timeout``).
 
     """
 
+    pool = ConnectionPool(**pool_options) if pool_options else upstream_pool
+    start_health_checks(routes)
+
     proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     try:
@@ -213,18 +415,21 @@ def run_proxy(ip, port, routes):
             #        using multi-thread programming with the
             #        provided handle_client routine
             #
-            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes))
+            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes, pool, relay, cache))
             client_thread.start()
     except socket.error as e:
       print("Socket error: {}".format(e))
 
-def create_proxy(ip, port, routes):
+def create_proxy(ip, port, routes, relay="buffer", cache=None, **pool_options):
     """
     Entry point for launching the proxy server.
 
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
     :params routes (dict): dictionary mapping hostnames and location.
+    :params relay (str): ``buffer`` (default) or ``stream`` relay of the messages.
+    :params cache (ResponseCache): response cache of the proxy, None to disable it.
+    :params pool_options: backend connection pool settings, see :func:`run_proxy`.
     """
 
-    run_proxy(ip, port, routes)
+    run_proxy(ip, port, routes, relay, cache, **pool_options)
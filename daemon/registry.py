@@ -0,0 +1,219 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.registry
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`PeerRegistry <PeerRegistry>` of the tracker:
+the peers registered by the chat clients, indexed by name, by address, by
+channel and by last heartbeat.
+
+- Register, unregister, heartbeat and the index lookups are O(1), expiry is
+  O(expired peers): the last-seen index is kept in heartbeat order.
+- The published peer list is a :class:`ChangeFeed <daemon.feed.ChangeFeed>`,
+  read through its snapshots, so ``/get-list`` and ``/watch-list`` never see
+  a half-made change.
+- A peer missing heartbeats for ``ttl`` seconds is removed by the reaper thread
+  (see :meth:`PeerRegistry.start_reaper`) as if it had logged out.
+
+Locking:
+--------
+The registry lock guards the indexes and is held while the feed is changed, so
+the feed and the indexes move together; the feed lock is only ever taken
+inside it.
+
+Usage Example:
+--------------
+>>> registry = PeerRegistry(ttl=90)
+>>> registry.register("alice", "127.0.0.1", 9001)
+>>> registry.by_address("127.0.0.1", 9001)
+'alice'
+>>> registry.start_reaper()
+
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .feed import ChangeFeed
+
+#: Seconds without heartbeat after which a peer expires.
+PEER_TTL = 90
+
+#: Seconds between two runs of the reaper.
+REAP_INTERVAL = 5
+
+class PeerRegistry:
+    """The :class:`PeerRegistry <PeerRegistry>` object holds the registered
+    peers and their indexes.
+    """
+
+    __attrs__ = [
+        "feed",
+        "ttl",
+    ]
+
+    def __init__(self, ttl=PEER_TTL, feed=None):
+        #: Published name -> ``{"ip", "port"[, "channel"]}``.
+        self.feed = feed if feed is not None else ChangeFeed()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # name -> (ip, port, channel)
+        self._peers = {}
+        # (ip, port) -> name
+        self._addresses = {}
+        # channel -> set of names
+        self._channels = {}
+        # name -> last heartbeat (time.monotonic), oldest first
+        self._last_seen = OrderedDict()
+
+    def register(self, name, ip, port, channel=None):
+        """
+        Registers a peer, or updates its address and channel. A peer registered
+        before at the same address under another name is replaced.
+
+        :param name (str): peer name.
+        :param ip (str): IP address of its P2P listener.
+        :param port (int): port of its P2P listener.
+        :param channel (str): channel of the peer, if any.
+
+        :rtype int: the feed version of the change.
+        """
+        port = int(port)
+        with self.lock:
+            holder = self._addresses.get((ip, port))
+            if holder is not None and holder != name:
+                self._remove(holder)
+            if name in self._peers:
+                self._unindex(name)
+
+            self._peers[name] = (ip, port, channel)
+            self._addresses[(ip, port)] = name
+            if channel is not None:
+                self._channels.setdefault(channel, set()).add(name)
+            self._last_seen[name] = time.monotonic()
+            self._last_seen.move_to_end(name)
+
+            info = {"ip": ip, "port": port}
+            if channel is not None:
+                info["channel"] = channel
+            return self.feed.set(name, info)
+
+    def unregister(self, name):
+        """
+        Removes a peer.
+
+        :rtype int: the feed version of the change, None if the peer is unknown.
+        """
+        with self.lock:
+            if name not in self._peers:
+                return None
+            return self._remove(name)
+
+    def heartbeat(self, name):
+        """
+        Records a heartbeat of a peer.
+
+        :rtype bool: False if the peer is unknown (expired), it must register again.
+        """
+        with self.lock:
+            if name not in self._peers:
+                return False
+            self._last_seen[name] = time.monotonic()
+            self._last_seen.move_to_end(name)
+            return True
+
+    def _unindex(self, name):
+        ip, port, channel = self._peers.pop(name)
+        if self._addresses.get((ip, port)) == name:
+            del self._addresses[(ip, port)]
+        if channel is not None:
+            members = self._channels.get(channel)
+            members.discard(name)
+            if not members:
+                del self._channels[channel]
+        self._last_seen.pop(name, None)
+
+    def _remove(self, name):
+        self._unindex(name)
+        return self.feed.remove(name)
+
+    def get(self, name):
+        """
+        :rtype dict: ``{"ip", "port", "channel"}`` of a peer, None if unknown.
+        """
+        with self.lock:
+            peer = self._peers.get(name)
+        if peer is None:
+            return None
+        return {"ip": peer[0], "port": peer[1], "channel": peer[2]}
+
+    def by_address(self, ip, port):
+        """
+        :rtype str: name of the peer listening on an address, None if none.
+        """
+        with self.lock:
+            return self._addresses.get((ip, int(port)))
+
+    def in_channel(self, channel):
+        """
+        :rtype list: names of the peers of a channel.
+        """
+        with self.lock:
+            return list(self._channels.get(channel, ()))
+
+    def last_seen(self, name):
+        """
+        :rtype float: seconds since the last heartbeat of a peer, None if unknown.
+        """
+        with self.lock:
+            seen = self._last_seen.get(name)
+        return None if seen is None else time.monotonic() - seen
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, name):
+        return name in self._peers
+
+    def expire(self, now=None):
+        """
+        Removes the peers whose last heartbeat is older than ``ttl``.
+
+        :rtype list: names of the expired peers.
+        """
+        deadline = (time.monotonic() if now is None else now) - self.ttl
+        expired = []
+        with self.lock:
+            while self._last_seen:
+                name, seen = next(iter(self._last_seen.items()))
+                if seen > deadline:
+                    break
+                self._remove(name)
+                expired.append(name)
+        return expired
+
+    def reap_loop(self, interval):
+        """Expires the stale peers every ``interval`` seconds, forever."""
+        while True:
+            time.sleep(interval)
+            for name in self.expire():
+                print("[Registry] Peer {} expired after {}s without heartbeat".format(name, self.ttl))
+
+    def start_reaper(self, interval=REAP_INTERVAL):
+        """Starts the daemon thread expiring the stale peers."""
+        reaper = threading.Thread(target=self.reap_loop, args=(interval,), name="registry-reaper")
+        reaper.daemon = True
+        reaper.start()
+        return reaper
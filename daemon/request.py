@@ -18,6 +18,8 @@ This module provides a Request object to manage and persist
 request settings (cookies, auth, proxies).
 """
 from .dictionary import CaseInsensitiveDict
+from .router import Router
+from urllib.parse import parse_qsl
 import json as json_lib
 
 class Request():
@@ -47,6 +49,10 @@ class Request():
         "body",
         "routes",
         "hook",
+        "params",
+        "query",
+        "allowed",
+        "raw_body",
     ]
 
     def __init__(self):
@@ -58,14 +64,24 @@ class Request():
         self.headers = None
         #: HTTP path
         self.path = None        
+        #: HTTP version of the request line, e.g. "HTTP/1.1"
+        self.version = None
         # The cookies set used to create Cookie header
         self.cookies = None
         #: request body to send to the server.
         self.body = None
+        #: Bytes of the received body, a ``memoryview`` of the connection buffer.
+        self.raw_body = None
         #: Routes
         self.routes = {}
         #: Hook point for routed mapped-path
         self.hook = None
+        #: Path parameters of the matched route, e.g. ``{"name": "alice"}``
+        self.params = {}
+        #: Query string parameters, e.g. ``{"since": "42"}`` for ``?since=42``
+        self.query = {}
+        #: Methods of the path when the route exists for other methods only
+        self.allowed = None
 
     def extract_request_line(self, request):
         try:
@@ -76,7 +92,7 @@ class Request():
             if path == '/':
                 path = '/index.html'
         except Exception:
-            return None, None
+            return None, None, None
 
         return method, path, version
              
@@ -95,8 +111,33 @@ class Request():
 
         # Prepare the request line from the request header
         self.method, self.path, self.version = self.extract_request_line(request)
+        self.headers = self.prepare_headers(request)
+        self.prepare_route(routes)
+        return
+
+    def prepare_head(self, head, routes=None):
+        """
+        Prepares the request from a head already parsed by
+        :class:`RequestParser <daemon.parser.RequestParser>`, without going
+        through the header text again.
+        """
+        self.method, self.path, self.version = head.method, head.path, head.version
+        if self.path == '/':
+            self.path = '/index.html'
+        self.headers = head.headers
+        self.prepare_route(routes)
+
+    def prepare_route(self, routes=None):
+        """Splits the query string, resolves the route hook and parses the cookies."""
         print("[Request] {} path {} version {}".format(self.method, self.path, self.version))
 
+        # Tách query string khỏi path: /get-list?since=3 -> /get-list, {"since": "3"}
+        if self.path and '?' in self.path:
+            self.path, query_string = self.path.split('?', 1)
+            self.query = dict(parse_qsl(query_string))
+            if self.path == '/':
+                self.path = '/index.html'
+
         #
         # @bksysnet Preapring the webapp hook with WeApRous instance
         # The default behaviour with HTTP server is empty routed
@@ -104,15 +145,17 @@ class Request():
         # TODO manage the webapp hook in this mounting point
         #
         
-        if not routes == {}:
+        if not routes == {} and routes is not None:
             self.routes = routes
-            self.hook = routes.get((self.method, self.path))
+            if isinstance(routes, Router):
+                self.hook, self.params, self.allowed = routes.match(self.method, self.path)
+            else:
+                self.hook = routes.get((self.method, self.path))
             #
             # self.hook manipulation goes here
             # ...
             #
 
-        self.headers = self.prepare_headers(request)
         cookies_string = self.headers.get('cookie', '')
             #
             #  TODO: implement the cookie function here
@@ -126,6 +169,20 @@ class Request():
                     self.cookies[name.strip()] = value
         return
 
+    @property
+    def body(self):
+        """The request body as text, decoded from :attr:`raw_body` on first use."""
+        if self._body is None and self.raw_body is not None:
+            try:
+                self._body = str(self.raw_body, "utf-8", "replace")
+            except Exception:
+                self._body = str(self.raw_body, "latin1", "replace")
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
     def prepare_body(self, data, files, json=None):
         body = None
         if json is not None:
@@ -18,19 +18,52 @@ This module provides a :class: `Response <Response>` object to manage and persis
 response settings (cookies, auth, proxies), and to construct HTTP responses
 based on incoming requests. 
 
-The current version supports MIME type detection, content loading and header formatting
+The current version supports MIME type detection, content loading and header formatting.
+Static files too large for the in-memory cache are not loaded: :meth:`build_response`
+then returns the :class: `Response <Response>` itself and :meth:`send_to` sends the
+file from disk after the header.
+
+Static files carry ``ETag``/``Last-Modified`` validators: ``If-None-Match`` and
+``If-Modified-Since`` are answered with ``304 Not Modified``, ``Range`` (guarded
+by ``If-Range``) with ``206 Partial Content``, as ``multipart/byteranges`` when
+several ranges are asked for.
+
+Text files are negotiated on ``Accept-Encoding`` (see :mod:`daemon.encoding`): a
+precompressed ``.gz``/``.br`` sibling or a cached compressed copy is served with
+``Vary: Accept-Encoding``.
+
+Route handlers may stream a body instead of returning it whole: see
+:meth:`Response.build_stream` and :meth:`Response.build_json_stream`.
 """
+import asyncio
 import datetime
 import json
 import os
+import mmap
 import mimetypes
+import uuid
+from email.utils import parsedate_to_datetime
 from .dictionary import CaseInsensitiveDict
+from .assets import static_cache
+from .encoding import KNOWN_ENCODINGS, acceptable_encodings, is_compressible, encode_stream
 
 # <--- ĐÃ SỬA: BASE_DIR được đặt là "" để biểu thị thư mục gốc
 # Nơi start_backend.py được chạy.
 # Các thư mục con www/ và static/ sẽ được nối vào đây.
 BASE_DIR = ""
 
+#: Bytes per send when a file body is sent through ``mmap``.
+SEND_CHUNK = 256 * 1024
+
+#: Most ranges served for one request, a longer Range header is ignored.
+MAX_RANGES = 16
+
+#: Last chunk of a chunked body, without trailer fields.
+LAST_CHUNK = b"0\r\n\r\n"
+
+#: Bytes gathered from the small fragments of a streamed JSON body before a chunk is sent.
+STREAM_BUFFER = 16 * 1024
+
 class Response():   
     """The :class:`Response <Response>` object, which contains a
     server's response to an HTTP request.
@@ -40,6 +73,9 @@ class Response():
     __attrs__ = [
         "_content",
         "_header",
+        "_file",
+        "_chunks",
+        "chunked",
         "status_code",
         "method",
         "headers",
@@ -63,6 +99,17 @@ class Response():
         """
 
         self._content = b"" # <--- ĐÃ SỬA: Khởi tạo là bytes
+        self._header = b""
+        #: Path of a file body sent from disk, None when the body is ``_content``.
+        self._file = None
+        #: ``(prefix, offset, count)`` parts of the file body and the bytes after them.
+        self._segments = []
+        self._trailer = b""
+        #: Iterable of the fragments of a streamed body, None for other bodies.
+        self._chunks = None
+        #: Frame the streamed body with ``Transfer-Encoding: chunked``, False
+        #: for an HTTP/1.0 client, then the end of the body is the close.
+        self.chunked = True
         self._content_consumed = False
         self._next = None
 
@@ -157,45 +204,41 @@ class Response():
         return base_dir
 
 
-    def build_content(self, path, base_dir):
+    def build_content(self, path, base_dir, accept_encoding=None):
         """
         Loads the objects file from storage space.
         ...
+        :params accept_encoding (str): Accept-Encoding header of the request,
+                                       None to always serve the file unencoded.
         """
 
-        # filepath = os.path.join(base_dir, path.lstrip('/'))
-        # Lược bỏ dấu / ở đầu path
-        rel_path = path.lstrip('/')
+        # Các tệp tĩnh được đọc qua bộ đệm dùng chung của tiến trình
+        # (xem daemon.assets): đường dẫn đã kiểm tra realpath + commonpath
+        # và nội dung được giữ trong bộ nhớ cho tới khi tệp thay đổi.
+        asset = static_cache.get(base_dir, path, self.headers.get('Content-Type', 'application/octet-stream'))
 
-        # Tạo đường dẫn mục tiêu và chuẩn hóa
-        target = os.path.join(base_dir, rel_path)
+        # Tệp văn bản: chọn bản nén gzip/br mà trình duyệt chấp nhận
+        if accept_encoding is not None and is_compressible(asset.headers['Content-Type']):
+            self.headers['Vary'] = "Accept-Encoding"
+            # br đứng trước: tệp .br dựng sẵn được gửi cả khi không có thư viện brotli
+            for coding in acceptable_encodings(accept_encoding, KNOWN_ENCODINGS):
+                variant = static_cache.encoded(asset, coding)
+                if variant is not None:
+                    asset = variant
+                    self.headers['Content-Encoding'] = coding
+                    break
 
-        # SỬA: thay vì kiểm tra chuỗi '..', dùng realpath + commonpath để an toàn
-        base_real = os.path.realpath(base_dir)
-        target_real = os.path.realpath(target)
+        print("[Response] serving the object at location {}".format(asset.path))
 
-        # Nếu target không nằm trong base -> từ chối
+        # Các header tính sẵn: ETag và Last-Modified để trình duyệt kiểm tra lại
+        self.headers['ETag'] = asset.headers['ETag']
+        self.headers['Last-Modified'] = asset.headers['Last-Modified']
 
-        # Đảm bảo đường dẫn là an toàn (không đi ngược thư mục)
-        # if '..' in filepath:
-        if not os.path.commonpath([base_real]) == os.path.commonpath([base_real, target_real]):
-            # Không cho phép truy cập ra ngoài base_dir
-            raise IOError("File path is not allowed")
+        # Tệp lớn không nằm trong bộ nhớ: gửi thẳng từ đĩa (xem send_to)
+        self._file = asset.path if asset.content is None else None
+        self._segments = [(b"", 0, asset.size)]
 
-        # print("[Response] serving the object at location {}".format(filepath))
-        print("[Response] serving the object at location {}".format(target_real))
-            
-        #
-        #  TODO: implement the step of fetch the object file
-        #        store in the return value of content
-        #
-        # <--- ĐÃ SỬA: Hoàn thành TODO ---
-        content = b""
-        # Mở tệp ở chế độ 'rb' (read binary) vì chúng ta cần gửi bytes
-        with open(target_real, 'rb') as f:
-            content = f.read()
-        
-        return len(content), content
+        return asset.size, asset.content or b""
 
 
     def build_response_header(self, request):
@@ -302,6 +345,196 @@ class Response():
             f"{json_body}"
         ).encode("utf-8")
 
+    def build_service_unavailable(self, retry_after=1):
+        """
+        Constructs a 503 Service Unavailable response, used when the backend
+        sheds a connection because its worker queue is full.
+
+        :param retry_after (int): seconds advertised in the ``Retry-After`` header.
+        """
+        content = b"503 Service Unavailable"
+        return (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Retry-After: {retry_after}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode("utf-8") + content
+
+    def build_rejected(self, status, reason):
+        """
+        Constructs the answer to a request refused by the parser: 400 for a
+        malformed request, 413 for a body or 431 for headers above the limits.
+
+        :param status (int): HTTP status code.
+        :param reason (str): HTTP reason phrase.
+        """
+        content = f"{status} {reason}".encode("utf-8")
+        return (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode("utf-8") + content
+
+    def build_method_not_allowed(self, allowed):
+        """
+        Constructs a 405 Method Not Allowed response for a path routed for
+        other methods only.
+
+        :param allowed (list): methods of the path, sent in the ``Allow`` header.
+        """
+        content = b"405 Method Not Allowed"
+        return (
+            "HTTP/1.1 405 Method Not Allowed\r\n"
+            f"Allow: {', '.join(allowed)}\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode("utf-8") + content
+
+    def build_options(self, allowed):
+        """
+        Constructs the 204 No Content answer of an ``OPTIONS`` request.
+
+        :param allowed (list): methods of the path, sent in the ``Allow`` header.
+        """
+        return (
+            "HTTP/1.1 204 No Content\r\n"
+            f"Allow: {', '.join(allowed)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode("utf-8")
+
+    def build_stream(self, chunks, content_type="application/octet-stream", content_length=None):
+        """
+        Constructs a 200 OK response whose body is sent fragment by fragment as
+        the iterable yields them, with ``Transfer-Encoding: chunked``: a route
+        handler returns it to stream a large body (a peer list, a log export)
+        without building it in memory.
+
+        The iterable may be a list, a generator or an asynchronous iterator
+        (an ``async def`` generator), which the asyncio engine drives on its
+        event loop. The next fragment is only pulled once the previous one is
+        written to the socket, so a slow client slows the producer down.
+
+        :param chunks (iterable): fragments of the body, ``bytes`` or ``str``
+                                  (encoded as UTF-8). Empty fragments are skipped.
+        :param content_type (str): Content-Type of the body.
+        :param content_length (int): total size of the body when known in
+                                     advance, then sent as ``Content-Length``
+                                     instead of chunks.
+
+        :rtype Response: the response, sent by :meth:`send_to`.
+        """
+        self.status_code = 200
+        self.reason = "OK"
+        self.headers['Content-Type'] = content_type
+        if content_length is None:
+            self.headers['Transfer-Encoding'] = "chunked"
+        else:
+            self.headers['Content-Length'] = str(content_length)
+            self.chunked = False
+        self.headers['Connection'] = "close"
+        self._chunks = chunks
+        self._header = self.build_response_header(None)
+        return self
+
+    def build_json_stream(self, body):
+        """
+        Constructs a 200 OK JSON response serialized while it is sent: the
+        encoded document never exists in memory as a whole. The fragments of
+        ``json.JSONEncoder.iterencode`` are gathered into ``STREAM_BUFFER``
+        byte chunks.
+
+        The body is read while the response is sent: pass a copy of a
+        structure other threads modify.
+
+        :param body (dict): the JSON document.
+
+        :rtype Response: the response, sent by :meth:`send_to`.
+        """
+        def gather(fragments):
+            pending, size = [], 0
+            for fragment in fragments:
+                pending.append(fragment)
+                size += len(fragment)
+                if size >= STREAM_BUFFER:
+                    yield "".join(pending)
+                    pending, size = [], 0
+            if pending:
+                yield "".join(pending)
+
+        return self.build_stream(gather(json.JSONEncoder().iterencode(body)), "application/json")
+
+    def encode_stream(self, accept_encoding):
+        """
+        Compresses a streamed body of a compressible type for a client accepting
+        ``gzip``/``br`` (see :func:`encode_stream <daemon.encoding.encode_stream>`).
+        A body with a ``Content-Length`` or a ``Content-Encoding`` is left as is.
+
+        :param accept_encoding (str): Accept-Encoding header of the request.
+        """
+        if 'Content-Length' in self.headers or 'Content-Encoding' in self.headers:
+            return
+        if not is_compressible(self.headers.get('Content-Type')):
+            return
+        self.headers['Vary'] = "Accept-Encoding"
+        codings = acceptable_encodings(accept_encoding)
+        if codings:
+            self.headers['Content-Encoding'] = codings[0]
+            self._chunks = encode_stream(self._chunks, codings[0])
+        self._header = self.build_response_header(None)
+
+    def iterate(self):
+        """
+        Yields the fragments of the streamed body. An asynchronous iterator is
+        driven by a private event loop, for the threaded engines; the loop
+        closes the iterator and finalizes the asynchronous generators it
+        started (e.g. a subscription the iterator reads) before it is closed,
+        so their ``finally`` blocks run even when the client went away.
+        """
+        if not hasattr(self._chunks, '__aiter__'):
+            yield from self._chunks
+            return
+        loop = asyncio.new_event_loop()
+        fragments = self._chunks.__aiter__()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(fragments.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            try:
+                aclose = getattr(fragments, 'aclose', None)
+                if aclose is not None:
+                    loop.run_until_complete(aclose())
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+
+    def frame(self, fragment):
+        """
+        Frames one fragment of a streamed body as a chunk.
+
+        :rtype bytes: the chunk, or ``b""`` for an empty fragment.
+        """
+        if isinstance(fragment, str):
+            fragment = fragment.encode('utf-8')
+        if not fragment or not self.chunked:
+            return bytes(fragment)
+        return b"%x\r\n" % len(fragment) + fragment + b"\r\n"
+
+    def close(self):
+        """Closes the streamed body, e.g. a generator left unfinished."""
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
     def build_response(self, request):
         """
         Builds a full HTTP response including headers and content based on the request.
@@ -321,24 +554,230 @@ class Response():
             base_dir = self.prepare_content_type(mime_type)
             
             # 2. Tải nội dung tệp
-            c_len, self._content = self.build_content(path, base_dir)
+            c_len, self._content = self.build_content(path, base_dir,
+                                                      (request.headers or {}).get('accept-encoding', ''))
 
             # 3. Nếu thành công, đặt status 200 OK
             self.status_code = 200
             self.reason = "OK"
             self.headers['Content-Length'] = c_len
+            self.headers['Accept-Ranges'] = "bytes"
             self.headers['Connection'] = "close" # Đóng kết nối sau khi gửi
 
         except (IOError, FileNotFoundError, ValueError) as e:
             # 4. Nếu có lỗi (Không tìm thấy tệp, MIME không hỗ trợ)
             print(f"[Response] Error serving file {path}: {e}")
             return self.build_notfound()
+
+        # Yêu cầu có điều kiện: trình duyệt đã có bản sao còn hợp lệ -> 304
+        if request.method in ("GET", "HEAD") and self.is_not_modified(request):
+            return self.build_not_modified(request)
+
+        # Yêu cầu một phần của tệp (tải tiếp, tua video...) -> 206 hoặc 416
+        if request.method == "GET":
+            ranges = self.requested_ranges(request, c_len)
+            if ranges == []:
+                return self.build_range_not_satisfiable(request, c_len)
+            if ranges:
+                self.prepare_ranges(ranges, c_len)
         
         # 5. Xây dựng header
         self._header = self.build_response_header(request)
 
-        # 6. Trả về header + nội dung
+        # 6. Tệp lớn: trả về chính Response, phần thân được gửi bằng sendfile
+        if self._file is not None:
+            return self
+
+        # 7. Trả về header + nội dung
         return self._header + self._content
+
+    def send_to(self, conn):
+        """
+        Sends the response on a blocking socket: the header, then the body from
+        memory or, for a file body, with ``socket.sendfile`` (``os.sendfile``
+        where available) so the file never goes through Python bytes. Without
+        ``os.sendfile`` the file is mapped and sent ``SEND_CHUNK`` bytes at a time.
+
+        A streamed body is sent one chunk per fragment as the iterable yields them.
+
+        :param conn (socket.socket): client connection socket.
+        """
+        if self._chunks is not None:
+            conn.sendall(self._header)
+            fragments = self.iterate()
+            try:
+                for fragment in fragments:
+                    data = self.frame(fragment)
+                    if data:
+                        conn.sendall(data)
+            finally:
+                fragments.close()
+                self.close()
+            if self.chunked:
+                conn.sendall(LAST_CHUNK)
+            return
+
+        if self._file is None:
+            conn.sendall(self._header + self._content)
+            return
+
+        conn.sendall(self._header)
+        with open(self._file, 'rb') as f:
+            if hasattr(os, 'sendfile'):
+                for prefix, offset, count in self._segments:
+                    if prefix:
+                        conn.sendall(prefix)
+                    conn.sendfile(f, offset, count)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for prefix, offset, count in self._segments:
+                            if prefix:
+                                conn.sendall(prefix)
+                            for start in range(offset, offset + count, SEND_CHUNK):
+                                conn.sendall(view[start:min(start + SEND_CHUNK, offset + count)])
+                    finally:
+                        view.release()
+        if self._trailer:
+            conn.sendall(self._trailer)
+
+    def is_not_modified(self, request):
+        """
+        Evaluates ``If-None-Match`` (weak comparison), or ``If-Modified-Since``
+        when there is no ``If-None-Match``, against the validators of the file.
+
+        :rtype bool: True if the client copy is still valid.
+        """
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            etag = self.headers.get('ETag', '').replace('W/', '', 1)
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or any(tag.replace('W/', '', 1) == etag for tag in tags)
+
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since and 'Last-Modified' in self.headers:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                modified = parsedate_to_datetime(self.headers['Last-Modified'])
+                return modified <= since
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def requested_ranges(self, request, size):
+        """
+        Parses the ``Range`` header of a request, honoring ``If-Range``.
+
+        :param request (Request): the request.
+        :param size (int): size of the file.
+
+        :rtype list: inclusive ``(start, end)`` pairs, an empty list if none is
+                     satisfiable, None to serve the whole file.
+        """
+        value = request.headers.get('range', '')
+        if not value.startswith('bytes='):
+            return None
+
+        if_range = request.headers.get('if-range')
+        if if_range is not None:
+            # A weak tag never matches, a date must be the exact Last-Modified
+            if if_range.startswith('"'):
+                if if_range != self.headers.get('ETag'):
+                    return None
+            elif if_range != self.headers.get('Last-Modified'):
+                return None
+
+        specs = value[len('bytes='):].split(',')
+        if len(specs) > MAX_RANGES:
+            return None
+        ranges = []
+        for spec in specs:
+            first, dash, last = spec.strip().partition('-')
+            if not dash or not (first or last):
+                return None
+            try:
+                if first:
+                    start = int(first)
+                    end = int(last) if last else size - 1
+                else:
+                    # Suffix range: the last N bytes
+                    start = max(0, size - int(last))
+                    end = size - 1
+            except ValueError:
+                return None
+            if start > end and last and first:
+                return None
+            if start < size and start <= end:
+                ranges.append((start, min(end, size - 1)))
+        return ranges
+
+    def prepare_ranges(self, ranges, size):
+        """
+        Turns the response into ``206 Partial Content`` for the given ranges,
+        a single part or a ``multipart/byteranges`` body.
+
+        :param ranges (list): inclusive ``(start, end)`` pairs.
+        :param size (int): size of the file.
+        """
+        self.status_code = 206
+        self.reason = "Partial Content"
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+            self.headers['Content-Length'] = end - start + 1
+            self._content = self._content[start:end + 1]
+            self._segments = [(b"", start, end - start + 1)]
+            return
+
+        boundary = uuid.uuid4().hex
+        content_type = self.headers['Content-Type']
+        parts = []
+        for start, end in ranges:
+            prefix = (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n"
+                "\r\n"
+            ).encode('utf-8')
+            parts.append((prefix, start, end - start + 1))
+        self._trailer = f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+        self.headers['Content-Type'] = f"multipart/byteranges; boundary={boundary}"
+        self.headers['Content-Length'] = sum(len(p) + n for p, _, n in parts) + len(self._trailer)
+        if self._file is None:
+            self._content = b"".join(p + self._content[o:o + n] for p, o, n in parts) + self._trailer
+            self._trailer = b""
+        self._segments = parts
+
+    def build_not_modified(self, request):
+        """
+        Constructs a ``304 Not Modified`` response carrying the validators of the file.
+
+        :rtype bytes: the raw HTTP response.
+        """
+        self.status_code = 304
+        self.reason = "Not Modified"
+        for name in ('Content-Type', 'Content-Length', 'Content-Encoding', 'Accept-Ranges'):
+            self.headers.pop(name, None)
+        self._file = None
+        return self.build_response_header(request)
+
+    def build_range_not_satisfiable(self, request, size):
+        """
+        Constructs a ``416 Range Not Satisfiable`` response.
+
+        :rtype bytes: the raw HTTP response.
+        """
+        content = b"416 Range Not Satisfiable"
+        self.status_code = 416
+        self.reason = "Range Not Satisfiable"
+        self.headers['Content-Type'] = "text/plain"
+        self.headers['Content-Length'] = len(content)
+        self.headers['Content-Range'] = f"bytes */{size}"
+        self._file = None
+        return self.build_response_header(request) + content
     
     def build_unauthorized(self):
         """
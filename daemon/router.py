@@ -0,0 +1,232 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.router
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`Router <Router>` of the WeApRous routes: a prefix
+tree of path segments, so a lookup walks the segments of the request path once
+whatever the number of routes.
+
+Route syntax:
+-------------
+- ``/peers``: a static segment.
+- ``/peers/<name>``: a parameter matching one segment, given to the handler
+  in ``req.params["name"]``.
+- ``/peers/<int:port>``: a typed parameter, converted by ``int``, ``float``,
+  ``uuid`` or ``str`` (the default). Typed parameters are tried before ``str``
+  ones and static segments before both.
+- ``/files/<path:rest>``: a wildcard mount matching the remaining segments.
+
+Methods:
+--------
+``HEAD`` falls back to the ``GET`` handler (the body is dropped by the adapter),
+``OPTIONS`` is answered with the ``Allow`` header of the path, and a path
+routed for other methods only yields ``405 Method Not Allowed``.
+
+Usage Example:
+--------------
+>>> router = Router()
+>>> router.add("/peers/<name>", ["GET"], get_peer)
+>>> router.match("GET", "/peers/alice?full=1")
+(<function get_peer>, {'name': 'alice'}, None)
+
+"""
+
+import uuid
+from urllib.parse import unquote
+
+#: Converters of the typed parameters: name -> (priority, conversion).
+#: A conversion raising ValueError rejects the segment.
+CONVERTERS = {
+    "int": (0, int),
+    "float": (1, float),
+    "uuid": (2, uuid.UUID),
+    "str": (3, str),
+}
+
+def parse_segment(segment):
+    """
+    Parses one segment of a route path.
+
+    :rtype tuple: (kind, converter, name), kind is ``static``, ``param`` or ``path``.
+    """
+    if not (segment.startswith("<") and segment.endswith(">")):
+        return "static", None, segment
+    converter, _, name = segment[1:-1].rpartition(":")
+    converter = converter or "str"
+    if converter == "path":
+        return "path", None, name
+    if converter not in CONVERTERS or not name:
+        raise ValueError("Invalid route segment {}".format(segment))
+    return "param", converter, name
+
+def split_path(path):
+    """Splits a request path, without its query string, into decoded segments."""
+    return [unquote(segment) for segment in path.lstrip("/").split("/")]
+
+class Node:
+    """A node of the route tree: its children and the handlers of the path
+    ending on it."""
+
+    __slots__ = ("static", "params", "wildcard", "handlers", "names")
+
+    def __init__(self):
+        #: Segment -> child node.
+        self.static = {}
+        #: ``(priority, converter, name, child)`` sorted by priority.
+        self.params = []
+        #: ``(name, handlers)`` of a ``<path:name>`` mount, or None.
+        self.wildcard = None
+        #: Method -> handler of the routes ending here.
+        self.handlers = {}
+
+    def param_child(self, converter, name):
+        for _, conv, pname, child in self.params:
+            if conv == converter:
+                if pname != name:
+                    raise ValueError("Conflicting parameter names <{}> and <{}>".format(pname, name))
+                return child
+        child = Node()
+        self.params.append((CONVERTERS[converter][0], converter, name, child))
+        self.params.sort(key=lambda param: param[0])
+        return child
+
+class Router:
+    """The :class:`Router <Router>` object maps ``(method, path)`` to the route
+    handlers of a :class:`WeApRous <WeApRous>` app.
+
+    It also behaves as the former ``{(method, path): handler}`` dictionary:
+    ``router[("GET", "/login")] = handler`` registers a route and
+    ``router.get(("GET", "/login"))`` finds the handler of a request path.
+    """
+
+    def __init__(self):
+        self.root = Node()
+        #: ``(method, path)`` -> handler, in registration order.
+        self.table = {}
+
+    def add(self, path, methods, handler):
+        """
+        Registers a handler for a route path and methods.
+
+        :param path (str): route path, see the module documentation.
+        :param methods (list): HTTP methods of the route.
+        :param handler (function): the route handler.
+
+        :raise ValueError: the route path is invalid.
+        """
+        node = self.root
+        segments = path.lstrip("/").split("/")
+        for index, segment in enumerate(segments):
+            kind, converter, name = parse_segment(segment)
+            if kind == "static":
+                node = node.static.setdefault(segment, Node())
+            elif kind == "param":
+                node = node.param_child(converter, name)
+            else:
+                if index != len(segments) - 1:
+                    raise ValueError("<path:{}> must end the route {}".format(name, path))
+                if node.wildcard is None:
+                    node.wildcard = (name, {})
+                elif node.wildcard[0] != name:
+                    raise ValueError("Conflicting parameter names <path:{}> and <path:{}>".format(
+                        node.wildcard[0], name))
+                for method in methods:
+                    node.wildcard[1][method.upper()] = handler
+                    self.table[(method.upper(), path)] = handler
+                return
+        for method in methods:
+            node.handlers[method.upper()] = handler
+            self.table[(method.upper(), path)] = handler
+
+    def candidates(self, node, segments, index, params):
+        """Yields the ``(handlers, params)`` of every route matching the segments,
+        static segments first, then typed parameters, then wildcard mounts."""
+        if index == len(segments):
+            if node.handlers:
+                yield node.handlers, params
+            return
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            yield from self.candidates(child, segments, index + 1, params)
+        for _, converter, name, child in node.params:
+            if not segment:
+                break
+            try:
+                value = CONVERTERS[converter][1](segment)
+            except ValueError:
+                continue
+            yield from self.candidates(child, segments, index + 1, dict(params, **{name: value}))
+        if node.wildcard is not None and segment:
+            name, handlers = node.wildcard
+            yield handlers, dict(params, **{name: "/".join(segments[index:])})
+
+    def match(self, method, path):
+        """
+        Finds the handler of a request.
+
+        :param method (str): request method.
+        :param path (str): request path, a query string is ignored.
+
+        :rtype tuple: (handler, params, allowed). ``handler`` is None when no
+                      route matches the method, then ``allowed`` lists the
+                      methods of the path (None if no route matches the path).
+        """
+        segments = split_path(path.split("?", 1)[0])
+        allowed = set()
+        for handlers, params in self.candidates(self.root, segments, 0, {}):
+            handler = handlers.get(method)
+            if handler is None and method == "HEAD":
+                handler = handlers.get("GET")
+            if handler is not None:
+                return handler, params, None
+            allowed.update(handlers)
+        if not allowed:
+            return None, {}, None
+        if "GET" in allowed:
+            allowed.add("HEAD")
+        allowed.add("OPTIONS")
+        return None, {}, sorted(allowed)
+
+    def __setitem__(self, key, handler):
+        method, path = key
+        self.add(path, [method], handler)
+
+    def get(self, key, default=None):
+        handler, _, _ = self.match(*key)
+        return default if handler is None else handler
+
+    def __getitem__(self, key):
+        return self.table[key]
+
+    def __contains__(self, key):
+        return key in self.table
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self):
+        return len(self.table)
+
+    def items(self):
+        return self.table.items()
+
+    def __eq__(self, other):
+        if isinstance(other, Router):
+            return self.table == other.table
+        return self.table == other
+
+    def __repr__(self):
+        return repr(self.table)
@@ -0,0 +1,423 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.upstream
+~~~~~~~~~~~~~~~~~
+
+This module provides the upstream side of the proxy: a pool of keep-alive
+connections per backend and a reader of HTTP responses framed by Content-Length
+or chunked transfer-encoding, so a backend connection can be reused instead of
+being read until EOF.
+
+The relay functions copy a message body between two sockets as it arrives,
+through one fixed buffer per stream filled with ``recv_into``. ``sendall``
+blocks while the receiving side is slow, so the sending side is not read
+meanwhile (backpressure) and at most ``RELAY_BUFFER`` bytes are held.
+
+Requirements:
+--------------
+- socket: provide socket networking interface.
+- threading: guards the pool shared by the proxy threads.
+
+Usage Example:
+--------------
+>>> pool = ConnectionPool(max_idle=8, max_per_host=64)
+>>> sock, reused = pool.acquire("127.0.0.1", 9001)
+>>> sock.sendall(request)
+>>> response, reusable = read_response(sock)
+>>> pool.release("127.0.0.1", 9001, sock, reusable)
+
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+
+#: Idle connections kept per backend.
+MAX_IDLE = 8
+
+#: Connections (idle and in use) allowed per backend.
+MAX_PER_HOST = 64
+
+#: Seconds an idle connection is kept, below the backend keep-alive timeout.
+IDLE_TIMEOUT = 4
+
+#: Seconds allowed to connect to a backend or wait for a pool slot.
+CONNECT_TIMEOUT = 3
+
+#: Seconds allowed between two reads of a backend response.
+READ_TIMEOUT = 10
+
+#: Size of the buffer of a streaming relay.
+RELAY_BUFFER = 65536
+
+class PoolExhausted(socket.timeout):
+    """Every connection allowed to a backend stayed in use for ``connect_timeout``."""
+
+def is_alive(sock):
+    """
+    Checks without blocking that an idle connection was not closed by the peer.
+    An idle HTTP connection must have nothing to read, EOF or stray bytes mean
+    the connection cannot be reused.
+
+    :param sock (socket.socket): idle backend connection.
+
+    :rtype bool: True if the connection can carry a new request.
+    """
+    try:
+        sock.setblocking(False)
+        try:
+            sock.recv(1, socket.MSG_PEEK)
+            return False
+        except BlockingIOError:
+            return True
+        finally:
+            sock.settimeout(READ_TIMEOUT)
+    except OSError:
+        return False
+
+class HostSlot:
+    """Pool state of one backend: the idle connections and the open count."""
+
+    def __init__(self):
+        #: Idle connections as (socket, release time), most recent last.
+        self.idle = deque()
+        #: Connections currently open (idle and in use).
+        self.opened = 0
+        #: Signals a released connection to threads waiting for a slot.
+        self.cond = threading.Condition()
+
+class ConnectionPool:
+    """The :class:`ConnectionPool <ConnectionPool>` object keeps keep-alive
+    connections to the backends, keyed by ``(host, port)``.
+
+    Checkout prefers the most recently released connection, drops the ones idle
+    for longer than ``idle_timeout`` or closed by the backend, and opens a new
+    connection while fewer than ``max_per_host`` are open. Beyond that the caller
+    waits up to ``connect_timeout`` for a release.
+    """
+
+    __attrs__ = [
+        "max_idle",
+        "max_per_host",
+        "idle_timeout",
+        "connect_timeout",
+    ]
+
+    def __init__(self, max_idle=MAX_IDLE, max_per_host=MAX_PER_HOST,
+                 idle_timeout=IDLE_TIMEOUT, connect_timeout=CONNECT_TIMEOUT):
+        self.max_idle = max_idle
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host, port):
+        with self._lock:
+            slot = self._slots.get((host, port))
+            if slot is None:
+                slot = self._slots[(host, port)] = HostSlot()
+            return slot
+
+    def _evict(self, slot, now):
+        """Closes the idle connections of a slot past ``idle_timeout``, oldest first."""
+        while slot.idle and now - slot.idle[0][1] > self.idle_timeout:
+            sock, _ = slot.idle.popleft()
+            sock.close()
+            slot.opened -= 1
+
+    def acquire(self, host, port):
+        """
+        Checks out a connection to a backend.
+
+        :param host (str): IP address of the backend.
+        :param port (int): port number of the backend.
+
+        :rtype tuple: (socket, True if it is a reused connection).
+        :raise PoolExhausted: no slot was released within ``connect_timeout``.
+        :raise OSError: the backend refused the connection.
+        """
+        slot = self._slot(host, port)
+        deadline = time.monotonic() + self.connect_timeout
+        with slot.cond:
+            while True:
+                self._evict(slot, time.monotonic())
+                while slot.idle:
+                    sock, _ = slot.idle.pop()
+                    if is_alive(sock):
+                        return sock, True
+                    sock.close()
+                    slot.opened -= 1
+                if slot.opened < self.max_per_host:
+                    slot.opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not slot.cond.wait(remaining):
+                    raise PoolExhausted("No free connection to {}:{}".format(host, port))
+
+        try:
+            sock = socket.create_connection((host, port), timeout=self.connect_timeout)
+            sock.settimeout(READ_TIMEOUT)
+        except OSError:
+            with slot.cond:
+                slot.opened -= 1
+                slot.cond.notify()
+            raise
+        return sock, False
+
+    def release(self, host, port, sock, reusable=True):
+        """
+        Returns a connection to the pool, or closes it if it cannot carry another
+        request or ``max_idle`` connections are already idle.
+
+        :param host (str): IP address of the backend.
+        :param port (int): port number of the backend.
+        :param sock (socket.socket): the connection obtained from :meth:`acquire`.
+        :param reusable (bool): False if the response was not fully framed.
+        """
+        slot = self._slot(host, port)
+        with slot.cond:
+            now = time.monotonic()
+            self._evict(slot, now)
+            if reusable and len(slot.idle) < self.max_idle:
+                slot.idle.append((sock, now))
+            else:
+                sock.close()
+                slot.opened -= 1
+            slot.cond.notify()
+
+    def close(self):
+        """Closes every idle connection of the pool."""
+        with self._lock:
+            slots = list(self._slots.values())
+        for slot in slots:
+            with slot.cond:
+                while slot.idle:
+                    sock, _ = slot.idle.popleft()
+                    sock.close()
+                    slot.opened -= 1
+
+class SocketReader:
+    """Buffered reads of an HTTP message from a socket."""
+
+    def __init__(self, sock, data=b""):
+        self.sock = sock
+        self.buf = bytearray(data)
+
+    def fill(self):
+        """Receives more bytes, returns False on EOF."""
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            return False
+        self.buf += chunk
+        return True
+
+    def recv_into(self, view, size=0):
+        """Receives into ``view`` past the buffered bytes, returns 0 on EOF."""
+        return self.sock.recv_into(view, size)
+
+    def read_until(self, delim):
+        """Returns the bytes up to and including ``delim``."""
+        start = 0
+        while True:
+            index = self.buf.find(delim, start)
+            if index != -1:
+                break
+            start = max(0, len(self.buf) - len(delim) + 1)
+            if not self.fill():
+                raise ConnectionError("Connection closed inside the message")
+        end = index + len(delim)
+        data = bytes(self.buf[:end])
+        del self.buf[:end]
+        return data
+
+    def read_exact(self, size):
+        """Returns exactly ``size`` bytes."""
+        while len(self.buf) < size:
+            if not self.fill():
+                raise ConnectionError("Connection closed inside the message")
+        data = bytes(self.buf[:size])
+        del self.buf[:size]
+        return data
+
+    def read_to_eof(self):
+        """Returns every byte until the peer closes the connection."""
+        while self.fill():
+            pass
+        data = bytes(self.buf)
+        self.buf.clear()
+        return data
+
+def parse_head(head):
+    """
+    Parses the start line and headers of a request or response head.
+
+    :param head (bytes): the header block including the blank line.
+
+    :rtype tuple: (start line, dict of lower-case header names to values).
+    """
+    lines = head.decode("latin1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return lines[0], headers
+
+def status_of(start_line):
+    """Returns the status code of a response start line."""
+    return int(start_line.split(" ", 2)[1])
+
+def has_body(method, status):
+    """Returns False for the responses that never carry a body."""
+    return not (method == "HEAD" or status < 200 or status in (204, 304))
+
+def read_chunked(reader):
+    """
+    Reads a chunked body as-is, up to the last chunk and the trailers.
+
+    :param reader (SocketReader): reader positioned at the first chunk.
+
+    :rtype bytes: the raw chunked body.
+    """
+    parts = []
+    while True:
+        line = reader.read_until(b"\r\n")
+        parts.append(line)
+        size = int(line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            break
+        parts.append(reader.read_exact(size + 2))
+    while True:
+        line = reader.read_until(b"\r\n")
+        parts.append(line)
+        if line == b"\r\n":
+            break
+    return b"".join(parts)
+
+def read_response(sock, method="GET"):
+    """
+    Reads one HTTP response from a backend connection, using its framing to find
+    the end of the body instead of waiting for the connection to close.
+
+    :param sock (socket.socket): backend connection.
+    :param method (str): method of the request, HEAD responses have no body.
+
+    :rtype tuple: (raw response bytes, True if the connection can be reused).
+    :raise ConnectionError: the backend closed the connection before the end.
+    :raise ValueError: the response head or chunk framing is malformed.
+    """
+    reader = SocketReader(sock)
+    head = reader.read_until(b"\r\n\r\n")
+    start_line, headers = parse_head(head)
+    reusable = "close" not in headers.get("connection", "").lower()
+
+    if not has_body(method, status_of(start_line)):
+        body = b""
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        body = read_chunked(reader)
+    elif "content-length" in headers:
+        body = reader.read_exact(int(headers["content-length"]))
+    else:
+        body = reader.read_to_eof()
+        reusable = False
+
+    if reader.buf:
+        # Bytes past the end of the response, the connection is out of sync
+        reusable = False
+    return head + body, reusable
+
+def relay_exact(reader, dst, size, view):
+    """
+    Copies exactly ``size`` body bytes from a reader to a socket, the bytes
+    already buffered by the reader first.
+
+    :param reader (SocketReader): source of the message.
+    :param dst (socket.socket): destination socket.
+    :param size (int): number of bytes to copy.
+    :param view (memoryview): relay buffer.
+    """
+    if reader.buf:
+        count = min(size, len(reader.buf))
+        dst.sendall(reader.buf[:count])
+        del reader.buf[:count]
+        size -= count
+    while size > 0:
+        count = reader.recv_into(view, min(size, len(view)))
+        if not count:
+            raise ConnectionError("Connection closed inside the message")
+        dst.sendall(view[:count])
+        size -= count
+
+def relay_to_eof(reader, dst, view):
+    """Copies every byte from a reader to a socket until the source closes."""
+    if reader.buf:
+        dst.sendall(reader.buf)
+        reader.buf.clear()
+    while True:
+        count = reader.recv_into(view)
+        if not count:
+            return
+        dst.sendall(view[:count])
+
+def relay_chunked(reader, dst, view):
+    """Copies a chunked body as-is, chunk by chunk, up to the trailers."""
+    while True:
+        line = reader.read_until(b"\r\n")
+        dst.sendall(line)
+        size = int(line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            break
+        relay_exact(reader, dst, size + 2, view)
+    while True:
+        line = reader.read_until(b"\r\n")
+        dst.sendall(line)
+        if line == b"\r\n":
+            break
+
+def relay_body(reader, dst, headers, view, to_eof=True):
+    """
+    Copies a message body from a reader to a socket following its framing.
+
+    :param reader (SocketReader): source positioned after the message head.
+    :param dst (socket.socket): destination socket.
+    :param headers (dict): lower-case headers of the message.
+    :param view (memoryview): relay buffer.
+    :param to_eof (bool): a message without length runs until the source closes
+                          (responses), otherwise it has no body (requests).
+
+    :rtype bool: True if the body ended on its framing, False if it ran to EOF.
+    """
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        relay_chunked(reader, dst, view)
+    elif "content-length" in headers:
+        relay_exact(reader, dst, int(headers["content-length"]), view)
+    elif to_eof:
+        relay_to_eof(reader, dst, view)
+        return False
+    return True
+
+def read_body(reader, headers):
+    """
+    Reads a request body as-is following its framing, requests without
+    Content-Length or chunked encoding have no body.
+
+    :rtype bytes: the raw body.
+    """
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        return read_chunked(reader)
+    if "content-length" in headers:
+        return reader.read_exact(int(headers["content-length"]))
+    return b""
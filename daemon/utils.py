@@ -10,7 +10,7 @@
 # while attending the course
 #
 
-from urlparse import urlparse
+from urllib.parse import urlparse, unquote
 
 def get_auth_from_url(url):
     """Given a url with authentication components, extract them into a tuple of
@@ -25,4 +25,66 @@ def get_auth_from_url(url):
     except (AttributeError, TypeError):
         auth = ("", "")
 
-    return auth
\ No newline at end of file
+    return auth
+
+def get_header(message, name):
+    """Returns the value of a header in a raw HTTP message, or None.
+
+    :param message (bytes): raw HTTP message (start line, headers, body).
+    :param name (str): case-insensitive header name.
+
+    :rtype: str
+    """
+    end = message.find(b"\r\n\r\n")
+    head = message[:end] if end != -1 else message
+    key = name.lower().encode("latin1")
+    for line in head.split(b"\r\n")[1:]:
+        field, sep, value = line.partition(b":")
+        if sep and field.strip().lower() == key:
+            return value.strip().decode("latin1")
+    return None
+
+def update_headers(message, headers):
+    """Replaces headers in a raw HTTP message.
+
+    Every existing line of the given header names is removed, then the names
+    with a non-None value are appended at the end of the header block. The
+    body is left untouched.
+
+    :param message (bytes): raw HTTP message (start line, headers, body).
+    :param headers (dict): header name -> new value, None to only remove it.
+
+    :rtype: bytes
+    """
+    end = message.find(b"\r\n\r\n")
+    if end == -1:
+        return message
+    lines = message[:end].split(b"\r\n")
+    names = {name.lower().encode("latin1") for name in headers}
+    kept = [lines[0]]
+    for line in lines[1:]:
+        if line.partition(b":")[0].strip().lower() not in names:
+            kept.append(line)
+    for name, value in headers.items():
+        if value is not None:
+            kept.append("{}: {}".format(name, value).encode("latin1"))
+    return b"\r\n".join(kept) + message[end:]
+
+def status_code_of(message):
+    """Returns the integer status code of a raw HTTP response, or None."""
+    try:
+        return int(message[:message.index(b"\r\n")].split(b" ", 2)[1])
+    except (ValueError, IndexError):
+        return None
+
+def is_delimited(message):
+    """Returns True if the end of a raw HTTP response can be found without
+    closing the connection (Content-Length, chunked or a bodiless status).
+    """
+    status = status_code_of(message)
+    if status is not None and (status < 200 or status in (204, 304)):
+        return True
+    if get_header(message, "content-length") is not None:
+        return True
+    encoding = get_header(message, "transfer-encoding") or ""
+    return "chunked" in encoding.lower()
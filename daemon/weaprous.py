@@ -18,6 +18,7 @@ This module provides a WeApRous object to deploy RESTful url web app with routin
 """
 
 from .backend import create_backend
+from .router import Router
 
 class WeApRous:
     """The fully mutable :class:`WeApRous <WeApRous>` object, which is a lightweight,
@@ -40,6 +41,10 @@ class WeApRous:
       >>> def hello(headers, body):
       >>>     return {'message': 'Hello, world!'}
 
+      >>> @app.route('/peers/<name>/<int:port>', methods=['GET'])
+      >>> def peer(req):
+      >>>     return {'name': req.params['name'], 'port': req.params['port']}
+
       >>> app.run()
     """
 
@@ -49,9 +54,11 @@ class WeApRous:
 
         Sets up an empty route registry and prepares placeholders for IP and port.
         """
-        self.routes = {}
+        self.routes = Router()
         self.ip = None
         self.port = None
+        #: Backend mode given to :meth:`run`, None before the server starts.
+        self.mode = None
         return
 
     def prepare_address(self, ip, port):
@@ -68,14 +75,14 @@ class WeApRous:
         """
         Decorator to register a route handler for a specific path and HTTP methods.
 
-        :param path (str): The URL path to route.
+        :param path (str): The URL path to route, with ``<name>``, ``<int:name>``
+                     or ``<path:name>`` parameters (see :mod:`daemon.router`).
         :param methods (list): A list of HTTP methods (e.g., ['GET', 'POST']) to bind.
 
         :rtype: function - A decorator that registers the handler function.
         """
         def decorator(func):
-            for method in methods:
-                self.routes[(method.upper(), path)] = func
+            self.routes.add(path, methods, func)
 
             # Optional attach route metadata to the function
             func._route_path = path
@@ -84,18 +91,23 @@ class WeApRous:
             return func
         return decorator
 
-    def run(self):
+    def run(self, mode="thread", **options):
         """
         Start the backend server and begin handling requests.
 
         This method launches the TCP server using the configured IP and port,
         and dispatches incoming requests to the registered route handlers.
 
+        :param mode (str): backend concurrency mode, ``thread``, ``pool`` or ``asyncio``.
+                     Route handlers may be ``async def`` coroutines in every mode.
+        :param options: mode settings forwarded to :func:`create_backend`
+                        (e.g. ``pool_size``, ``queue_size``).
+
         :raise: Error if IP or port has not been configured.
         """
         if not self.ip or not self.port:
             print("Rous app need to preapre address"
                   "by calling app.prepare_address(ip,port)")
 
-        create_backend(self.ip, self.port, self.routes)
-        
+        self.mode = mode
+        create_backend(self.ip, self.port, self.routes, mode, **options)
\ No newline at end of file
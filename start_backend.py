@@ -26,6 +26,7 @@ import socket
 import argparse
 
 from daemon import create_backend
+from daemon.backend import MODES, POOL_SIZE, QUEUE_SIZE
 
 # Default port number used if none is specified via command-line arguments.
 PORT = 9000 
@@ -58,9 +59,28 @@ if __name__ == "__main__":
         default=PORT,
         help='Port number to bind the server. Default is {}.'.format(PORT)
     )
+    parser.add_argument(
+        '--mode',
+        choices=MODES,
+        default='thread',
+        help='Concurrency mode of the server. Default is thread.'
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=POOL_SIZE,
+        help='Number of worker threads in pool and asyncio modes. Default is {}.'.format(POOL_SIZE)
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=QUEUE_SIZE,
+        help='Depth of the request queue in pool and asyncio modes. Default is {}.'.format(QUEUE_SIZE)
+    )
  
     args = parser.parse_args()
     ip = args.server_ip
     port = args.server_port
 
-    create_backend(ip, port)
+    create_backend(ip, port, mode=args.mode,
+                   pool_size=args.pool_size, queue_size=args.queue_size)
@@ -1,17 +1,27 @@
 import json
 import argparse
-from db.account import select_user, create_connection
+from db.account import select_user
 from daemon.request import Request
 from daemon.response import Response
+from daemon.feed import ChangeFeed, format_event
+from daemon.registry import PeerRegistry, PEER_TTL
+from daemon.accounts import AccountStore, PoolTimeout, POOL_SIZE as DB_POOL_SIZE, CACHE_TTL
 from urllib.parse import *
 import subprocess
+import time
+import sqlite3
+import uuid
 
 # Import lớp WeApRous từ module daemon
 from daemon.weaprous import WeApRous
+from daemon.backend import MODES, POOL_SIZE, QUEUE_SIZE
 
 # Đặt một cổng mặc định cho máy chủ chat, khác với các máy chủ khác
 PORT = 8001 
 
+# Số peer tối đa của một trang /get-list?limit=
+MAX_PAGE = 1000
+
 # Khởi tạo ứng dụng WeApRous
 app = WeApRous()
 
@@ -24,8 +34,36 @@ app = WeApRous()
 #     "username_cu_peer_A": {"ip": "192.168.1.10", "port": 9001},
 #     "username_cu_peer_B": {"ip": "192.168.1.11", "port": 9002},
 # }
+#
+# Mọi thay đổi đi qua registry.register()/registry.unregister(): registry giữ
+# các chỉ mục (theo địa chỉ, kênh, heartbeat cuối) và xoá peer quá hạn TTL;
+# danh sách công khai là peers (ChangeFeed), mỗi thay đổi tăng version và được
+# ghi vào log, client theo dõi qua /watch-list (--mode thread hoặc asyncio) thay vì gọi
+# /get-list.
 # -------------------------------------------------------------------
-peer_list = {}
+# Version khởi đầu theo thời gian (ms) để version sau khi khởi động lại tracker
+# luôn lớn hơn version cũ mà client còn giữ.
+registry = PeerRegistry(feed=ChangeFeed(version=int(time.time() * 1000)))
+# Định danh của tracker, gửi kèm danh sách peer: các peer gọi tracker qua địa
+# chỉ khác nhau (127.0.0.1, IP LAN, hostname) vẫn nhận ra cùng một kênh.
+TRACKER_ID = uuid.uuid4().hex
+peers = registry.feed
+peer_list = peers.items
+
+# Tài khoản: kết nối SQLite lấy từ pool (không mở kết nối mới mỗi lần login)
+# và cache các thông tin đăng nhập đã xác thực (dạng băm) trong CACHE_TTL giây.
+ACCOUNT_DB = "db/account.db"
+
+def connect_accounts():
+    # Pool trao kết nối cho thread bất kỳ: tắt kiểm tra thread của sqlite3.
+    # db.account.create_connection chỉ nhận đường dẫn, nên mở trực tiếp bằng sqlite3.
+    return sqlite3.connect(ACCOUNT_DB, check_same_thread=False)
+
+accounts = AccountStore(connect_accounts, select_user)
+
+def is_authenticated(req):
+    """Cookie auth=true do /login đặt, cùng cách kiểm tra với /index.html."""
+    return req.cookies.get("auth", "").split(";", 1)[0].strip() == "true"
 
 
 # --- Giai đoạn 1: Client-Server (Tracker) ---
@@ -38,21 +76,23 @@ def login(req):
     username = parsed.get("username", [""])[0]
     password = parsed.get("password", [""])[0]
 
-    conn = create_connection("db/account.db")
-    auth = select_user(conn, username)
     resp = Response()
     print(f"[Server] Login attempt: {username}")
-    if auth:
-        if  password == auth[1]:
-            # build login-success response (sets cookie + returns index)
-            resp.cookies.clear()
-            resp.cookies["auth"] = "true; Path=/"
-            resp.cookies["username"] = username
-            # Ensure request points to index for building content
-            req.path = "/index.html"
-            req.method = "GET"
-            print(f"[Tracker] Login success: {username}")
-            return resp.build_response(req)
+    try:
+        valid = accounts.verify(username, password)
+    except PoolTimeout:
+        print(f"[Tracker] Login shed, account database busy: {username}")
+        return resp.build_service_unavailable()
+    if valid:
+        # build login-success response (sets cookie + returns index)
+        resp.cookies.clear()
+        resp.cookies["auth"] = "true; Path=/"
+        resp.cookies["username"] = username
+        # Ensure request points to index for building content
+        req.path = "/index.html"
+        req.method = "GET"
+        print(f"[Tracker] Login success: {username}")
+        return resp.build_response(req)
         
     print(f"[Tracker] Login failed: {username}")
     return resp.build_unauthorized()
@@ -95,11 +135,19 @@ def submit_info(req):
     
     try:
         body = req.body
-        data = parse_qs(body)
-        # data = json.loads(body)
-        peer_id = req.cookies.get("username")
-        peer_ip = data.get("ip")[0]
-        peer_port = data.get("port")[0]
+        if "application/json" in req.headers.get("content-type", ""):
+            # chat_client.py gửi JSON {"username", "ip", "port"}
+            data = json.loads(body)
+            peer_id = data.get("username") or req.cookies.get("username")
+            peer_ip = data.get("ip")
+            peer_port = data.get("port")
+            channel = data.get("channel")
+        else:
+            data = parse_qs(body)
+            peer_id = req.cookies.get("username")
+            peer_ip = data.get("ip", [None])[0]
+            peer_port = data.get("port", [None])[0]
+            channel = data.get("channel", [None])[0]
         
         # subprocess.Popen([
         #     "gnome-terminal", "--", "python3", "start_chat_server.py",
@@ -108,9 +156,11 @@ def submit_info(req):
 
         
         if peer_id and peer_ip and peer_port:
-            peer_list[peer_id] = {"ip": peer_ip, "port": peer_port}
-            print(peer_list)
-            print(f"[ChatServer] Peer đã đăng ký: {peer_id} -> {peer_ip}:{peer_port}")
+            try:
+                registry.register(peer_id, peer_ip, peer_port, channel)
+            except ValueError:
+                return Response().build_bad_request({"status": "error", "message": "Invalid port"})
+            print(f"[ChatServer] Peer đã đăng ký: {peer_id} -> {peer_ip}:{peer_port} ({len(registry)} peers)")
             resp = Response()
             return resp.build_success({"status": "success", "message": "Submit successfully."})
         else:
@@ -141,27 +191,90 @@ def submit_info(req):
 
 @app.route('/get-list', methods=['GET'])
 def get_list(req):
-    # trả dữ liệu peers
-    data = {"status": "success", "peers": peer_list}
-    body = json.dumps(data)
-    content_length = len (body)
+    """
+    Trả danh sách peer.
+
+    - ?since=<version>: chỉ trả các peer được thêm/đổi ("peers") và bị xoá
+      ("removed") sau version đó. Nếu log không còn đủ thay đổi, trả toàn bộ
+      danh sách (không có trường "since").
+    - ?limit=<n>&after=<peer>: phân trang theo thứ tự tên peer, "next" là giá
+      trị after của trang sau (null ở trang cuối).
+    - ETag là version: If-None-Match khớp thì trả 304 không có body.
+    - "tracker" là TRACKER_ID, định danh kênh trong tin gossip giữa các peer.
+    """
+    resp = Response()
     # Thêm CORS header
-    # headers = {
-    #     "Content-Type": "application/json\r\n"
-    #     "Access-Control-Allow-Origin": "*",  # hoặc chỉ định "http://127.0.0.1:9001"
-    #     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-    #     "Access-Control-Allow-Headers": "Content-Type"
-    # }
-    return (
-        "HTTP/1.1 200 OK\r\n"
-        "Content-Type: application/json\r\n"
-        f"Content-Length: {content_length}\r\n"
-        "Access-Control-Allow-Origin: *\r\n"
-        "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
-        "Access-Control-Allow-Headers: Content-Type\r\n"
-        "\r\n"
-        f"{body}"
-    ).encode("utf-8")
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Cache-Control"] = "no-cache"
+
+    try:
+        since = int(req.query["since"]) if "since" in req.query else None
+        limit = int(req.query["limit"]) if "limit" in req.query else None
+    except ValueError:
+        return resp.build_bad_request({"status": "error", "message": "since and limit must be integers"})
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE))
+
+    # Danh sách chưa đổi từ lần trước của client: 304, không dựng body
+    resp.headers["ETag"] = 'W/"{}"'.format(peers.version)
+    if resp.is_not_modified(req):
+        return resp.build_not_modified(req)
+
+    delta = peers.delta(since) if since is not None else None
+    if delta is not None:
+        version, updated, removed = delta
+        data = {"status": "success", "tracker": TRACKER_ID, "version": version, "since": since,
+                "peers": updated, "removed": removed}
+    else:
+        version, items, next_key = peers.page(req.query.get("after"), limit)
+        data = {"status": "success", "tracker": TRACKER_ID, "version": version, "peers": items}
+        if limit is not None:
+            data["next"] = next_key
+    resp.headers["ETag"] = 'W/"{}"'.format(version)
+    return resp.build_json_stream(data)
+
+@app.route('/watch-list', methods=['GET'])
+def watch_list(req):
+    """
+    Luồng Server-Sent Events các thay đổi của peer_list.
+
+    Sự kiện đầu tiên là "snapshot" (toàn bộ danh sách), sau đó là "set"
+    (peer tham gia hoặc đổi địa chỉ) và "remove" (peer rời đi), mỗi sự kiện
+    mang id là version. Khi kết nối lại, client gửi ?since=<version> (hoặc
+    header Last-Event-ID) để chỉ nhận các thay đổi bị lỡ.
+
+    Ở --mode asyncio kết nối chờ không giữ thread nào, ở --mode thread mỗi
+    kết nối vốn có thread riêng. Ở --mode pool mỗi subscriber sẽ giữ một
+    worker suốt thời gian kết nối nên trả 501: client dùng /get-list?since=.
+    """
+    if app.mode == "pool":
+        return Response().build_rejected(501, "Not Implemented")
+    since = req.headers.get("last-event-id") or req.query.get("since")
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        since = None
+
+    async def events():
+        subscription = peers.subscribe(since)
+        try:
+            async for version, op, peer_id, info in subscription:
+                if op == "heartbeat":
+                    yield ": ping\n\n"
+                elif op == "snapshot":
+                    yield format_event(op, {"peers": info, "tracker": TRACKER_ID}, version)
+                else:
+                    yield format_event(op, {"peer": peer_id, "info": info}, version)
+        finally:
+            # Client ngắt kết nối: gỡ subscriber khỏi feed ngay
+            await subscription.aclose()
+
+    resp = Response()
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    return resp.build_stream(events(), "text/event-stream")
 
 @app.route("/styles.css")
 def style(req):
@@ -211,35 +324,58 @@ def save_tracker(req):
 #     return resp.build_response(req)
 
 
-# @app.route('/logout', methods=['POST'])
-# def logout(req):
-#     """
-#     API để một peer thông báo rằng mình đã thoát (quit).
-#     Server sẽ xóa peer này khỏi peer_list.
-#     """
-#     print(f"[ChatServer] Nhận yêu cầu /logout...")
+@app.route('/logout', methods=['POST'])
+def logout(req):
+    """
+    API để một peer thông báo rằng mình đã thoát (quit).
+    Server sẽ xóa peer này khỏi peer_list.
+    """
+    print(f"[ChatServer] Nhận yêu cầu /logout...")
     
-#     try:
-#         body = req.body
-#         # Tệp httpadapter.py đã chuyển body thành chuỗi
-#         data = json.loads(body)
-#         peer_id = data.get("username")
+    try:
+        body = req.body
+        data = json.loads(body)
+        peer_id = data.get("username")
         
-#         # Kiểm tra xem peer có trong danh sách không
-#         if peer_id in peer_list:
-#             del peer_list[peer_id] # Xóa peer khỏi danh sách
-#             print(f"[ChatServer] Peer đã thoát: {peer_id}. Danh sách còn lại {len(peer_list)} peers.")
-#             return {"status": "logged_out", "peer_id": peer_id}
-#         else:
-#             print(f"[ChatServer] Peer {peer_id} yêu cầu logout nhưng không có trong danh sách.")
-#             return {"status": "error", "message": "Peer not found"}
+        # Xóa peer khỏi danh sách, các client theo dõi nhận sự kiện "remove"
+        if registry.unregister(peer_id) is not None:
+            print(f"[ChatServer] Peer đã thoát: {peer_id}. Danh sách còn lại {len(peer_list)} peers.")
+            return Response().build_success({"status": "logged_out", "peer_id": peer_id})
+        else:
+            print(f"[ChatServer] Peer {peer_id} yêu cầu logout nhưng không có trong danh sách.")
+            return Response().build_bad_request({"status": "error", "message": "Peer not found"})
             
-#     except json.JSONDecodeError:
-#         print("[ChatServer] Lỗi: Body /logout không phải là JSON hợp lệ")
-#         return {"status": "error", "message": "Invalid JSON body"}
-#     except Exception as e:
-#         print(f"[ChatServer] Lỗi /logout không xác định: {e}")
-#         return {"status": "error", "message": str(e)}
+    except json.JSONDecodeError:
+        print("[ChatServer] Lỗi: Body /logout không phải là JSON hợp lệ")
+        return Response().build_bad_request({"status": "error", "message": "Invalid JSON body"})
+    except Exception as e:
+        print(f"[ChatServer] Lỗi /logout không xác định: {e}")
+        return Response().build_internal_error({"status": "error", "message": str(e)})
+
+@app.route('/account-stats', methods=['GET'])
+def account_stats(req):
+    """
+    Số liệu của AccountStore: cache hit, số truy vấn, thời gian chờ kết nối pool.
+    Chỉ dành cho người đã đăng nhập.
+    """
+    if not is_authenticated(req):
+        return Response().build_unauthorized()
+    return Response().build_success(accounts.stats())
+
+@app.route('/heartbeat', methods=['POST'])
+def heartbeat(req):
+    """
+    API để peer báo mình vẫn hoạt động. Peer không gửi heartbeat trong
+    --peer-ttl giây bị xoá khỏi danh sách; peer không còn trong danh sách
+    nhận 400 và phải gọi lại /submit-info.
+    """
+    try:
+        data = json.loads(req.body)
+    except json.JSONDecodeError:
+        return Response().build_bad_request({"status": "error", "message": "Invalid JSON body"})
+    if registry.heartbeat(data.get("username")):
+        return Response().build_success({"status": "alive", "ttl": registry.ttl})
+    return Response().build_bad_request({"status": "error", "message": "Peer not registered"})
 
 # --- Khối khởi chạy máy chủ ---
 if __name__ == "__main__":
@@ -265,11 +401,52 @@ if __name__ == "__main__":
         default=PORT, 
         help=f'Port number to bind the server. Default is {PORT}.'
     )
+    parser.add_argument(
+        '--mode',
+        choices=MODES,
+        default='thread',
+        help='Concurrency mode of the server. Default is thread.'
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=POOL_SIZE,
+        help=f'Number of worker threads in pool and asyncio modes. Default is {POOL_SIZE}.'
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=QUEUE_SIZE,
+        help=f'Depth of the request queue in pool and asyncio modes. Default is {QUEUE_SIZE}.'
+    )
+    parser.add_argument(
+        '--db-pool-size',
+        type=int,
+        default=DB_POOL_SIZE,
+        help=f'Most account database connections open at once. Default is {DB_POOL_SIZE}.'
+    )
+    parser.add_argument(
+        '--login-cache-ttl',
+        type=int,
+        default=CACHE_TTL,
+        help=f'Seconds a verified login is trusted without the database, 0 disables. Default is {CACHE_TTL}.'
+    )
+    parser.add_argument(
+        '--peer-ttl',
+        type=int,
+        default=PEER_TTL,
+        help=f'Seconds without heartbeat after which a peer is removed. Default is {PEER_TTL}.'
+    )
  
     args = parser.parse_args()
     ip = args.server_ip
     port = args.server_port
 
+    registry.ttl = args.peer_ttl
+    accounts = AccountStore(connect_accounts, select_user,
+                            pool_size=args.db_pool_size, cache_ttl=args.login_cache_ttl)
+    registry.start_reaper()
+
     print(f"[ChatServer] Đang khởi chạy máy chủ tracker tại http://{ip}:{port}")
     app.prepare_address(ip, port)
-    app.run()
\ No newline at end of file
+    app.run(mode=args.mode, pool_size=args.pool_size, queue_size=args.queue_size)
\ No newline at end of file
@@ -32,6 +32,7 @@ Requirements:
 - httpadapter: the class for handling HTTP requests.
 - urlparse: parses URLs to extract host and port information.
 - daemon.create_proxy: initializes and starts the proxy server.
+- daemon.cache: optional response cache of the proxy.
 
 """
 
@@ -44,6 +45,7 @@ from urllib.parse import urlparse
 from collections import defaultdict
 
 from daemon import create_proxy
+from daemon.cache import ResponseCache
 
 PROXY_PORT = 8080
 
@@ -52,8 +54,23 @@ def parse_virtual_hosts(config_file):
     """
     Parses virtual host blocks from a config file.
 
+    A ``proxy_pass`` may declare the relative capacity of its backend for the
+    ``weighted``, ``least-conn``, ``ewma-latency`` and ``ip-hash`` policies::
+
+        proxy_pass http://127.0.0.1:9002 weight=3;
+
+    and the health checks of its backends: passive ejection after ``max_fails``
+    failed requests for ``fail_timeout`` seconds, and an optional active probe::
+
+        health_check /health interval=5 timeout=1;
+        max_fails 3;
+        fail_timeout 10;
+
     :config_file (str): Path to the NGINX config file.
-    :rtype list of dict: Each dict contains 'listen'and 'server_name'.
+    :rtype dict: hostname -> (proxy_pass or list of proxy_pass, dist_policy,
+                 options) where options["weights"] maps a proxy_pass to its weight
+                 and the health settings are under "health_check", "max_fails"
+                 and "fail_timeout".
     """
 
     with open(config_file, 'r') as f:
@@ -68,8 +85,14 @@ def parse_virtual_hosts(config_file):
     for host, block in host_blocks:
         proxy_map = {}
 
-        # Find all proxy_pass entries
-        proxy_passes = re.findall(r'proxy_pass\s+http://([^\s;]+);', block)
+        # Find all proxy_pass entries and their optional weight
+        proxy_passes = []
+        weights = {}
+        for target, params in re.findall(r'proxy_pass\s+http://([^\s;]+)([^;]*);', block):
+            proxy_passes.append(target)
+            weight_match = re.search(r'weight=(\d+)', params)
+            if weight_match:
+                weights[target] = int(weight_match.group(1))
         map = proxy_map.get(host,[])
         map = map + proxy_passes
         proxy_map[host] = map
@@ -89,13 +112,26 @@ def parse_virtual_hosts(config_file):
         #       the policy is applied to identify the highes matching
         #       proxy_pass
         #
+        options = {"weights": weights}
+
+        # Find the health check settings if present
+        health_match = re.search(r'health_check\s+([^\s;]+)([^;\n]*)', block)
+        if health_match:
+            health_check = {"path": health_match.group(1)}
+            for key, value in re.findall(r'(interval|timeout)=(\d+)', health_match.group(2)):
+                health_check[key] = int(value)
+            options["health_check"] = health_check
+        for key in ("max_fails", "fail_timeout"):
+            value_match = re.search(key + r'\s+(\d+)', block)
+            if value_match:
+                options[key] = int(value_match.group(1))
         if len(proxy_map.get(host,[])) == 1:
-            routes[host] = (proxy_map.get(host,[])[0], dist_policy_map)
+            routes[host] = (proxy_map.get(host,[])[0], dist_policy_map, options)
         # esle if:
         #         TODO:  apply further policy matching here
         #
         else:
-            routes[host] = (proxy_map.get(host,[]), dist_policy_map)
+            routes[host] = (proxy_map.get(host,[]), dist_policy_map, options)
 
     for key, value in routes.items():
         print (key, value)
@@ -112,11 +148,19 @@ if __name__ == "__main__":
 
     :arg --server-ip (str): IP address to bind the server (default: 127.0.0.1).
     :arg --server-port (int): Port number to bind the server (default: 9000).
+    :arg --cache-size (int): Megabytes of cached responses, 0 disables the cache (default: 0).
+    :arg --cache-dir (str): Directory keeping a copy of the cached responses (default: none).
     """
 
     parser = argparse.ArgumentParser(prog='Proxy', description='', epilog='Proxy daemon')
     parser.add_argument('--server-ip', default='0.0.0.0')
     parser.add_argument('--server-port', type=int, default=PROXY_PORT)
+    parser.add_argument('--relay', choices=('buffer', 'stream'), default='buffer',
+                        help='Forward whole messages or stream them as they arrive')
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='Megabytes of backend responses cached in memory, 0 disables the cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory keeping a copy of the cached responses')
  
     args = parser.parse_args()
     ip = args.server_ip
@@ -124,4 +168,8 @@ if __name__ == "__main__":
 
     routes = parse_virtual_hosts("config/proxy.conf")
 
-    create_proxy(ip, port, routes)
+    cache = None
+    if args.cache_size > 0:
+        cache = ResponseCache(max_bytes=args.cache_size * 1024 * 1024, disk_dir=args.cache_dir)
+
+    create_proxy(ip, port, routes, relay=args.relay, cache=cache)